@@ -1,4 +1,6 @@
 import asyncio
+import copy
+import functools
 import json
 import os
 import shutil
@@ -7,6 +9,7 @@ import threading
 import time
 import traceback
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Union
 
@@ -15,6 +18,9 @@ from pydantic import BaseModel
 from starlette.websockets import WebSocketState
 
 from .core import OpenInterpreter
+from .utils import lmc_framing
+from .utils.ack_window import AckWindow
+from .utils.session_manager import SessionBusy, SessionManager
 
 last_start_time = 0
 
@@ -41,6 +47,65 @@ except:
 complete_message = {"role": "server", "type": "status", "content": "complete"}
 
 
+async def run_in_thread(function, *args, **kwargs):
+    """
+    Runs a blocking call in its own thread, so it doesn't hold up the event loop (or other calls like it).
+    """
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, functools.partial(function, *args, **kwargs)
+        )
+    finally:
+        executor.shutdown(wait=False)
+
+
+async def iterate_in_thread(generator):
+    """
+    Iterates a blocking generator in its own thread, so it doesn't hold up the event loop.
+    Like iterating it directly, it only advances when its next item is asked for.
+    """
+    executor = ThreadPoolExecutor(max_workers=1)
+    loop = asyncio.get_running_loop()
+    done = object()
+    try:
+        while True:
+            item = await loop.run_in_executor(executor, next, generator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        # Once the item that's being made (if this was cancelled) is done
+        executor.submit(generator.close)
+        executor.shutdown(wait=False)
+
+
+# What belongs to one conversation, rather than being a setting, so it isn't copied to new sessions
+SESSION_STATE = (
+    "messages",
+    "responding",
+    "last_messages_count",
+    "conversation_filename",
+    "id",
+)
+
+
+def copy_settings(source, target, skip=(), also=()):
+    """
+    Copies the plain (JSON-like) public attributes of `source` to `target`, and the attributes in `also`.
+    """
+    plain = (str, int, float, bool, type(None), list, dict, tuple)
+    names = [
+        name
+        for name, value in vars(source).items()
+        if not name.startswith("_") and name not in skip and isinstance(value, plain)
+    ]
+    for name in names:
+        setattr(target, name, copy.deepcopy(getattr(source, name)))
+    for name in also:
+        setattr(target, name, getattr(source, name))
+
+
 class AsyncInterpreter(OpenInterpreter):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -55,13 +120,37 @@ class AsyncInterpreter(OpenInterpreter):
         self.require_acknowledge = (
             os.getenv("INTERPRETER_REQUIRE_ACKNOWLEDGE", "False").lower() == "true"
         )
-        self.acknowledged_outputs = []
+        # With require_acknowledge, how many outputs can wait for their acknowledgement at once (and how long for)
+        self.acknowledge_window = int(os.getenv("INTERPRETER_ACKNOWLEDGE_WINDOW", 32))
+        self.acknowledge_timeout = float(
+            os.getenv("INTERPRETER_ACKNOWLEDGE_TIMEOUT", 2)
+        )
 
-        self.server = Server(self)
+        self._server = None  # Made when it's first used, see `server`
 
         # For the 01. This lets the OAI compatible server accumulate context before responding.
         self.context_mode = False
 
+    @property
+    def server(self):
+        if self._server is None:
+            self._server = Server(self)
+        return self._server
+
+    @server.setter
+    def server(self, value):
+        self._server = value
+
+    def new_session(self):
+        """
+        A new interpreter for a server session, with this one's settings but none of its state.
+        """
+        session = AsyncInterpreter()
+        copy_settings(self, session, skip=SESSION_STATE)
+        copy_settings(self.llm, session.llm, also=("model", "_completions"))
+        copy_settings(self.computer, session.computer)
+        return session
+
     async def input(self, chunk):
         """
         Accumulates LMC chunks onto interpreter.messages.
@@ -72,7 +161,7 @@ class AsyncInterpreter(OpenInterpreter):
             # If the user is starting something, the interpreter should stop.
             if self.respond_thread is not None and self.respond_thread.is_alive():
                 self.stop_event.set()
-                self.respond_thread.join()
+                await run_in_thread(self.respond_thread.join)
             self.accumulate(chunk)
         elif "content" in chunk:
             self.accumulate(chunk)
@@ -89,7 +178,7 @@ class AsyncInterpreter(OpenInterpreter):
                 if command == "stop":
                     # Any start flag would have stopped it a moment ago, but to be sure:
                     self.stop_event.set()
-                    self.respond_thread.join()
+                    await run_in_thread(self.respond_thread.join)
                     return
                 if command == "go":
                     # This is to approve code.
@@ -294,9 +383,41 @@ def authenticate_function(key):
         return key == api_key
 
 
-def create_router(async_interpreter):
+def create_router(async_interpreter, sessions=None):
+    """
+    Requests with a session id (an X-Session-ID header, or a "session" with the websocket's auth message)
+    get that session's interpreter from `sessions`. Requests without one use `async_interpreter`.
+    """
     router = APIRouter()
 
+    if sessions is None:
+        sessions = SessionManager(async_interpreter.new_session)
+
+    async def open_session(session_id):
+        """
+        Starts using the session with this id, or returns None if there's no id (`async_interpreter` is used).
+        """
+        if not session_id:
+            return None
+        try:
+            # In a thread, as a new session can have to wait for its interpreter to be made
+            return await run_in_thread(sessions.open, session_id)
+        except SessionBusy as e:
+            raise HTTPException(status_code=429, detail=str(e))
+
+    def release_session(session):
+        if session is not None:
+            sessions.release(session)
+
+    async def interpreter_for(request):
+        """
+        The interpreter of a request's session, for requests that only look at it or change its settings.
+        """
+        session_id = request.headers.get("X-Session-ID")
+        if not session_id:
+            return async_interpreter
+        return await run_in_thread(sessions.interpreter, session_id)
+
     @router.get("/heartbeat")
     async def heartbeat():
         return {"status": "alive"}
@@ -436,22 +557,105 @@ def create_router(async_interpreter):
 
     @router.websocket("/")
     async def websocket_endpoint(websocket: WebSocket):
-        await websocket.accept()
+        # Clients can ask for compact framing (see lmc_framing) with a subprotocol
+        subprotocol = lmc_framing.choose_subprotocol(
+            websocket.scope.get("subprotocols", [])
+        )
+        compact = subprotocol is not None
+        await websocket.accept(subprotocol=subprotocol)
+
+        # The session can also be given with the auth message, as {"auth": key, "session": id}
+        session_id = websocket.headers.get(
+            "X-Session-ID"
+        ) or websocket.query_params.get("session")
+        require_auth = os.getenv("INTERPRETER_REQUIRE_AUTH") != "False"
+        session = None
+        interpreter = async_interpreter
+        # Set once we know which interpreter this connection talks to
+        session_opened = asyncio.Event()
+        window = (
+            None  # Outputs waiting to be acknowledged, if the interpreter requires that
+        )
+        next_output = None  # A pending interpreter.output(), kept between batches so no output is lost
+
+        async def transmit(output):
+            if not compact:
+                await websocket.send_text(json.dumps(output))
+                return
+            data = lmc_framing.encode_frame(output)
+            if isinstance(data, bytes):
+                await websocket.send_bytes(data)
+            else:
+                await websocket.send_text(data)
+
+        async def next_outputs():
+            """
+            The next output, and with compact framing, the others that arrive soon after it.
+            """
+            nonlocal next_output
+            if next_output is None:
+                next_output = asyncio.ensure_future(interpreter.output())
+            outputs = [await next_output]
+            next_output = None
+            if not compact:
+                return outputs
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + lmc_framing.FLUSH_INTERVAL
+            waiting = lmc_framing.size(outputs[0])
+            while (
+                not lmc_framing.should_flush(outputs[-1])
+                and waiting < lmc_framing.FLUSH_SIZE
+                and loop.time() < deadline
+            ):
+                next_output = asyncio.ensure_future(interpreter.output())
+                # (Unlike wait_for, this doesn't cancel it if it's not done)
+                done, _ = await asyncio.wait(
+                    [next_output], timeout=deadline - loop.time()
+                )
+                if not done:
+                    break
+                outputs.append(next_output.result())
+                next_output = None
+                waiting += lmc_framing.size(outputs[-1])
+            return outputs
+
+        async def use_session(session_id):
+            nonlocal session, interpreter, window
+            if session_id:
+                try:
+                    session = await run_in_thread(sessions.open, session_id)
+                except SessionBusy as e:
+                    await websocket.send_text(
+                        json.dumps(
+                            {"role": "server", "type": "error", "content": str(e)}
+                        )
+                    )
+                    await websocket.close()
+                    return False
+                interpreter = session.interpreter
+            if interpreter.require_acknowledge:
+                window = AckWindow(
+                    transmit,
+                    size=interpreter.acknowledge_window,
+                    timeout=interpreter.acknowledge_timeout,
+                )
+            session_opened.set()
+            return True
 
         try:  # solving it ;)/ # killian super wrote this
 
             async def receive_input():
                 authenticated = False
+                if not require_auth and not await use_session(session_id):
+                    return
                 while True:
                     try:
                         if websocket.client_state != WebSocketState.CONNECTED:
                             return
                         data = await websocket.receive()
 
-                        if (
-                            not authenticated
-                            and os.getenv("INTERPRETER_REQUIRE_AUTH") != "False"
-                        ):
+                        if not authenticated and require_auth:
                             if "text" in data:
                                 data = json.loads(data["text"])
                                 if "auth" in data:
@@ -459,6 +663,10 @@ def create_router(async_interpreter):
                                         data["auth"]
                                     ):
                                         authenticated = True
+                                        if not await use_session(
+                                            data.get("session", session_id)
+                                        ):
+                                            return
                                         await websocket.send_text(
                                             json.dumps({"auth": True})
                                         )
@@ -469,17 +677,12 @@ def create_router(async_interpreter):
                         if data.get("type") == "websocket.receive":
                             if "text" in data:
                                 data = json.loads(data["text"])
-                                if (
-                                    async_interpreter.require_acknowledge
-                                    and "ack" in data
-                                ):
-                                    async_interpreter.acknowledged_outputs.append(
-                                        data["ack"]
-                                    )
+                                if window is not None and "ack" in data:
+                                    window.acknowledge(data["ack"])
                                     continue
                             elif "bytes" in data:
                                 data = data["bytes"]
-                            await async_interpreter.input(data)
+                            await interpreter.input(data)
                         elif data.get("type") == "websocket.disconnect":
                             print("Client wants to disconnect, that's fine..")
                             return
@@ -506,30 +709,45 @@ def create_router(async_interpreter):
                         print("\n\n--- (ERROR ABOVE) ---\n\n")
 
             async def send_output():
+                await session_opened.wait()
                 while True:
                     if websocket.client_state != WebSocketState.CONNECTED:
                         return
                     try:
                         # First, try to send any unsent messages
-                        while async_interpreter.unsent_messages:
-                            output = async_interpreter.unsent_messages[0]
-                            if async_interpreter.debug:
+                        while interpreter.unsent_messages:
+                            output = interpreter.unsent_messages[0]
+                            if interpreter.debug:
                                 print("This was unsent, sending it again:", output)
 
+                            if compact:
+                                (output,) = lmc_framing.frames([output])
                             success = await send_message(output)
                             if success:
-                                async_interpreter.unsent_messages.popleft()
-
-                        # If we've sent all unsent messages, get a new output
-                        if not async_interpreter.unsent_messages:
-                            output = await async_interpreter.output()
-                            success = await send_message(output)
-                            if not success:
-                                async_interpreter.unsent_messages.append(output)
-                                if async_interpreter.debug:
-                                    print(
-                                        f"Added message to unsent_messages queue after failed attempts: {output}"
+                                interpreter.unsent_messages.popleft()
+
+                        # If we've sent all unsent messages, get new outputs
+                        if not interpreter.unsent_messages:
+                            outputs = await next_outputs()
+                            if compact:
+                                outputs = lmc_framing.frames(outputs)
+                            for i, output in enumerate(outputs):
+                                try:
+                                    success = await send_message(output)
+                                except asyncio.CancelledError:
+                                    # The client left while this waited for room in the window
+                                    interpreter.unsent_messages.extend(
+                                        lmc_framing.unbatch(outputs[i:])
+                                    )
+                                    raise
+                                if not success:
+                                    interpreter.unsent_messages.extend(
+                                        lmc_framing.unbatch([output])
                                     )
+                                    if interpreter.debug:
+                                        print(
+                                            f"Added message to unsent_messages queue after failed attempts: {output}"
+                                        )
 
                     except Exception as e:
                         error = traceback.format_exc() + "\n" + str(e)
@@ -538,8 +756,8 @@ def create_router(async_interpreter):
                             "type": "error",
                             "content": error,
                         }
-                        async_interpreter.unsent_messages.append(error_message)
-                        async_interpreter.unsent_messages.append(complete_message)
+                        interpreter.unsent_messages.append(error_message)
+                        interpreter.unsent_messages.append(complete_message)
                         print("\n\n--- ERROR (will be sent when possible): ---\n\n")
                         print(error)
                         print(
@@ -547,15 +765,20 @@ def create_router(async_interpreter):
                         )
 
             async def send_message(output):
-                if isinstance(output, dict) and "id" in output:
-                    id = output["id"]
-                else:
-                    id = shortuuid.uuid()
-                    if (
-                        isinstance(output, dict)
-                        and async_interpreter.require_acknowledge
-                    ):
-                        output["id"] = id
+                if window is not None and isinstance(output, dict):
+                    if "id" not in output:
+                        # A copy, as some outputs (like complete_message) are shared
+                        output = dict(output, id=shortuuid.uuid())
+                    if interpreter.debug:
+                        print("Sending this over the websocket:", output)
+                    try:
+                        # This only waits if the window is full, not for the acknowledgement
+                        await window.send(output["id"], output)
+                        return True
+                    except Exception as e:
+                        print(f"Failed to send output: {output}")
+                        print(f"Error: {str(e)}")
+                        return False
 
                 for attempt in range(20):
                     # time.sleep(0.5)
@@ -570,30 +793,9 @@ def create_router(async_interpreter):
                             await websocket.send_bytes(output)
                             return True  # Haven't set up ack for this
                         else:
-                            if async_interpreter.require_acknowledge:
-                                output["id"] = id
-                            if async_interpreter.debug:
+                            if interpreter.debug:
                                 print("Sending this over the websocket:", output)
-                            await websocket.send_text(json.dumps(output))
-
-                        if async_interpreter.require_acknowledge:
-                            acknowledged = False
-                            for _ in range(100):
-                                if id in async_interpreter.acknowledged_outputs:
-                                    async_interpreter.acknowledged_outputs.remove(id)
-                                    acknowledged = True
-                                    if async_interpreter.debug:
-                                        print("This output was acknowledged:", output)
-                                    break
-                                await asyncio.sleep(0.0001)
-
-                            if acknowledged:
-                                return True
-                            else:
-                                if async_interpreter.debug:
-                                    print("Acknowledgement not received for:", output)
-                                return False
-                        else:
+                            await transmit(output)
                             return True
 
                     except Exception as e:
@@ -605,7 +807,7 @@ def create_router(async_interpreter):
                         await asyncio.sleep(0.01)
 
                 # If we've reached this point, we've failed to send after 100 attempts
-                if output not in async_interpreter.unsent_messages:
+                if output not in interpreter.unsent_messages:
                     print("Failed to send message:", output)
                 else:
                     print(
@@ -615,7 +817,13 @@ def create_router(async_interpreter):
 
                 return False
 
-            await asyncio.gather(receive_input(), send_output())
+            # (send_output waits until we know which interpreter's output to send)
+            send_task = asyncio.ensure_future(send_output())
+            try:
+                await receive_input()
+            finally:
+                # The client is gone, so there's nobody to send output to
+                send_task.cancel()
 
         except Exception as e:
             error = traceback.format_exc() + "\n" + str(e)
@@ -624,23 +832,36 @@ def create_router(async_interpreter):
                 "type": "error",
                 "content": error,
             }
-            async_interpreter.unsent_messages.append(error_message)
-            async_interpreter.unsent_messages.append(complete_message)
+            interpreter.unsent_messages.append(error_message)
+            interpreter.unsent_messages.append(complete_message)
             print("\n\n--- ERROR (will be sent when possible): ---\n\n")
             print(error)
             print("\n\n--- (ERROR ABOVE WILL BE SENT WHEN POSSIBLE) ---\n\n")
+        finally:
+            if window is not None:
+                # Sent, but maybe not received. They're sent again on the next connection
+                unacknowledged = lmc_framing.unbatch(window.close())
+                interpreter.unsent_messages.extendleft(reversed(unacknowledged))
+            if next_output is not None:
+                if next_output.done() and not next_output.cancelled():
+                    interpreter.unsent_messages.append(next_output.result())
+                else:
+                    next_output.cancel()
+            release_session(session)
 
     # TODO
     @router.post("/")
-    async def post_input(payload: Dict[str, Any]):
+    async def post_input(payload: Dict[str, Any], request: Request):
         try:
-            async_interpreter.input(payload)
+            interpreter = await interpreter_for(request)
+            await interpreter.input(payload)
             return {"status": "success"}
         except Exception as e:
             return {"error": str(e)}, 500
 
     @router.post("/settings")
-    async def set_settings(payload: Dict[str, Any]):
+    async def set_settings(payload: Dict[str, Any], request: Request):
+        interpreter = await interpreter_for(request)
         for key, value in payload.items():
             print("Updating settings...")
             # print(f"Updating settings: {key} = {value}")
@@ -649,27 +870,28 @@ def create_router(async_interpreter):
                     return {
                         "error": f"The setting {key} is not modifiable through the server due to security constraints."
                     }, 403
-                if hasattr(async_interpreter, key):
+                if hasattr(interpreter, key):
                     for sub_key, sub_value in value.items():
-                        if hasattr(getattr(async_interpreter, key), sub_key):
-                            setattr(getattr(async_interpreter, key), sub_key, sub_value)
+                        if hasattr(getattr(interpreter, key), sub_key):
+                            setattr(getattr(interpreter, key), sub_key, sub_value)
                         else:
                             return {
                                 "error": f"Sub-setting {sub_key} not found in {key}"
                             }, 404
                 else:
                     return {"error": f"Setting {key} not found"}, 404
-            elif hasattr(async_interpreter, key):
-                setattr(async_interpreter, key, value)
+            elif hasattr(interpreter, key):
+                setattr(interpreter, key, value)
             else:
                 return {"error": f"Setting {key} not found"}, 404
 
         return {"status": "success"}
 
     @router.get("/settings/{setting}")
-    async def get_setting(setting: str):
-        if hasattr(async_interpreter, setting):
-            setting_value = getattr(async_interpreter, setting)
+    async def get_setting(setting: str, request: Request):
+        interpreter = await interpreter_for(request)
+        if hasattr(interpreter, setting):
+            setting_value = getattr(interpreter, setting)
             try:
                 return json.dumps({setting: setting_value})
             except TypeError:
@@ -680,13 +902,14 @@ def create_router(async_interpreter):
     if os.getenv("INTERPRETER_INSECURE_ROUTES", "").lower() == "true":
 
         @router.post("/run")
-        async def run_code(payload: Dict[str, Any]):
+        async def run_code(payload: Dict[str, Any], request: Request):
             language, code = payload.get("language"), payload.get("code")
             if not (language and code):
                 return {"error": "Both 'language' and 'code' are required."}, 400
             try:
                 print(f"Running {language}:", code)
-                output = async_interpreter.computer.run(language, code)
+                interpreter = await interpreter_for(request)
+                output = await run_in_thread(interpreter.computer.run, language, code)
                 print("Output:", output)
                 return {"output": output}
             except Exception as e:
@@ -696,7 +919,7 @@ def create_router(async_interpreter):
         async def upload_file(file: UploadFile = File(...), path: str = Form(...)):
             try:
                 with open(path, "wb") as output_file:
-                    shutil.copyfileobj(file.file, output_file)
+                    await run_in_thread(shutil.copyfileobj, file.file, output_file)
                 return {"status": "success"}
             except Exception as e:
                 return {"error": str(e)}, 500
@@ -722,11 +945,22 @@ def create_router(async_interpreter):
         max_tokens: Optional[int] = None
         temperature: Optional[float] = None
         stream: Optional[bool] = False
+        user: Optional[
+            str
+        ] = None  # Used as the session id, if there's no X-Session-ID header
+
+    async def openai_compatible_generator(run_code, interpreter, session):
+        try:
+            async for chunk in _openai_compatible_generator(run_code, interpreter):
+                yield chunk
+        finally:
+            release_session(session)
 
-    async def openai_compatible_generator(run_code):
+    async def _openai_compatible_generator(run_code, interpreter):
         if run_code:
             print("Running code.\n")
-            for i, chunk in enumerate(async_interpreter._respond_and_store()):
+            i = 0
+            async for chunk in iterate_in_thread(interpreter._respond_and_store()):
                 if "content" in chunk:
                     print(chunk["content"], end="")  # Sorry! Shitty display for now
                 if "start" in chunk:
@@ -753,6 +987,7 @@ def create_router(async_interpreter):
                         "choices": [{"delta": {"content": output_content}}],
                     }
                     yield f"data: {json.dumps(output_chunk)}\n\n"
+                i += 1
 
             return
 
@@ -766,16 +1001,13 @@ def create_router(async_interpreter):
             "Can you respond?",
             "Please reply.",
         ]:
-            for i, chunk in enumerate(
-                async_interpreter.chat(message=message, stream=True, display=True)
+            i = 0
+            async for chunk in iterate_in_thread(
+                interpreter.chat(message=message, stream=True, display=True)
             ):
-                await asyncio.sleep(0)  # Yield control to the event loop
                 made_chunk = True
 
-                if (
-                    chunk["type"] == "confirmation"
-                    and async_interpreter.auto_run == False
-                ):
+                if chunk["type"] == "confirmation" and interpreter.auto_run == False:
                     await asyncio.sleep(0)
                     output_content = "Do you want to run this code?"
                     output_chunk = {
@@ -788,7 +1020,7 @@ def create_router(async_interpreter):
                     yield f"data: {json.dumps(output_chunk)}\n\n"
                     break
 
-                if async_interpreter.stop_event.is_set():
+                if interpreter.stop_event.is_set():
                     break
 
                 output_content = None
@@ -812,12 +1044,28 @@ def create_router(async_interpreter):
                         "choices": [{"delta": {"content": output_content}}],
                     }
                     yield f"data: {json.dumps(output_chunk)}\n\n"
+                i += 1
 
             if made_chunk:
                 break
 
     @router.post("/openai/chat/completions")
-    async def chat_completion(request: ChatCompletionRequest):
+    async def chat_completion(request: ChatCompletionRequest, http_request: Request):
+        session = await open_session(
+            http_request.headers.get("X-Session-ID") or request.user
+        )
+        streaming = False
+        try:
+            interpreter = session.interpreter if session else async_interpreter
+            response = await _chat_completion(request, interpreter, session)
+            streaming = isinstance(response, StreamingResponse)
+            return response
+        finally:
+            # A streamed response is still using the session, until it's done
+            if not streaming:
+                release_session(session)
+
+    async def _chat_completion(request, interpreter, session):
         global last_start_time
 
         # Convert to LMC
@@ -828,36 +1076,36 @@ def create_router(async_interpreter):
 
         if last_message.content == "{STOP}":
             # Handle special STOP token
-            async_interpreter.stop_event.set()
-            time.sleep(5)
-            async_interpreter.stop_event.clear()
+            interpreter.stop_event.set()
+            await asyncio.sleep(5)
+            interpreter.stop_event.clear()
             return
 
         if last_message.content in ["{CONTEXT_MODE_ON}", "{REQUIRE_START_ON}"]:
-            async_interpreter.context_mode = True
+            interpreter.context_mode = True
             return
 
         if last_message.content in ["{CONTEXT_MODE_OFF}", "{REQUIRE_START_OFF}"]:
-            async_interpreter.context_mode = False
+            interpreter.context_mode = False
             return
 
         if last_message.content == "{AUTO_RUN_ON}":
-            async_interpreter.auto_run = True
+            interpreter.auto_run = True
             return
 
         if last_message.content == "{AUTO_RUN_OFF}":
-            async_interpreter.auto_run = False
+            interpreter.auto_run = False
             return
 
         run_code = False
         if (
-            async_interpreter.messages
-            and async_interpreter.messages[-1]["type"] == "code"
+            interpreter.messages
+            and interpreter.messages[-1]["type"] == "code"
             and last_message.content.lower().strip(".!?").strip() == "yes"
         ):
             run_code = True
         elif type(last_message.content) == str:
-            async_interpreter.messages.append(
+            interpreter.messages.append(
                 {
                     "role": "user",
                     "type": "message",
@@ -868,7 +1116,7 @@ def create_router(async_interpreter):
         elif type(last_message.content) == list:
             for content in last_message.content:
                 if content["type"] == "text":
-                    async_interpreter.messages.append(
+                    interpreter.messages.append(
                         {"role": "user", "type": "message", "content": str(content)}
                     )
                     print(">", content)
@@ -886,7 +1134,7 @@ def create_router(async_interpreter):
 
                     data = url.split("base64,")[1]
                     format = "base64." + url.split(";")[0].split("/")[1]
-                    async_interpreter.messages.append(
+                    interpreter.messages.append(
                         {
                             "role": "user",
                             "type": "image",
@@ -896,17 +1144,17 @@ def create_router(async_interpreter):
                     )
 
         else:
-            if async_interpreter.context_mode:
+            if interpreter.context_mode:
                 # In context mode, we only respond if we received a {START} message
                 # Otherwise, we're just accumulating context
                 if last_message.content == "{START}":
-                    if async_interpreter.messages[-1]["content"] == "{START}":
+                    if interpreter.messages[-1]["content"] == "{START}":
                         # Remove that {START} message that would have just been added
-                        async_interpreter.messages = async_interpreter.messages[:-1]
+                        interpreter.messages = interpreter.messages[:-1]
                     last_start_time = time.time()
                     if (
-                        async_interpreter.messages
-                        and async_interpreter.messages[-1].get("role") != "user"
+                        interpreter.messages
+                        and interpreter.messages[-1].get("role") != "user"
                     ):
                         return
                 else:
@@ -923,19 +1171,22 @@ def create_router(async_interpreter):
                 if last_message.content == "{START}":
                     # This just sometimes happens I guess
                     # Remove that {START} message that would have just been added
-                    async_interpreter.messages = async_interpreter.messages[:-1]
+                    interpreter.messages = interpreter.messages[:-1]
                     return
 
-        async_interpreter.stop_event.set()
-        time.sleep(0.1)
-        async_interpreter.stop_event.clear()
+        interpreter.stop_event.set()
+        await asyncio.sleep(0.1)
+        interpreter.stop_event.clear()
 
         if request.stream:
             return StreamingResponse(
-                openai_compatible_generator(run_code), media_type="application/x-ndjson"
+                openai_compatible_generator(run_code, interpreter, session),
+                media_type="application/x-ndjson",
             )
         else:
-            messages = async_interpreter.chat(message=".", stream=False, display=True)
+            messages = await run_in_thread(
+                interpreter.chat, message=".", stream=False, display=True
+            )
             content = messages[-1]["content"]
             return {
                 "id": "200",
@@ -954,7 +1205,23 @@ class Server:
 
     def __init__(self, async_interpreter, host=None, port=None):
         self.app = FastAPI()
-        router = create_router(async_interpreter)
+        # Sessions' interpreters start with `async_interpreter`'s settings (as they were when the pool was filled)
+        warm_languages = os.getenv("INTERPRETER_SESSION_WARM_LANGUAGES", "python")
+        self.sessions = SessionManager(
+            async_interpreter.new_session,
+            pool_size=int(os.getenv("INTERPRETER_SESSION_POOL_SIZE", 2)),
+            max_concurrent=int(os.getenv("INTERPRETER_SESSION_MAX_CONCURRENT", 1)),
+            idle_timeout=float(os.getenv("INTERPRETER_SESSION_IDLE_TIMEOUT", 3600)),
+            max_live_kernels=int(os.getenv("INTERPRETER_SESSION_MAX_KERNELS", 8)),
+            warm_languages=[
+                language.strip()
+                for language in warm_languages.split(",")
+                if language.strip()
+            ],
+        )
+        # Spares and sessions have languages running, which shouldn't outlive the server
+        self.app.add_event_handler("shutdown", self.sessions.close_all)
+        router = create_router(async_interpreter, self.sessions)
         self.authenticate = authenticate_function
 
         # Add authentication middleware
@@ -1016,6 +1283,9 @@ class Server:
         else:
             print(f"Server will run at http://{self.host}:{self.port}")
 
+        # So the first sessions don't wait for their interpreters
+        self.sessions.fill()
+
         self.uvicorn_server.run()
 
         # for _ in range(retries):
@@ -1,6 +1,8 @@
 import inspect
 import json
+import os
 
+from ..utils.prompt_cache import cached, make_key, package_version
 from .ai.ai import Ai
 from .browser.browser import Browser
 from .calendar.calendar import Calendar
@@ -59,7 +61,7 @@ class Computer:
         )  # Should mirror interpreter.max_output
 
         computer_tools = "\n".join(
-            self._get_all_computer_tools_signature_and_description()
+            self._get_cached_computer_tools_signature_and_description()
         )
 
         self.system_message = f"""
@@ -121,6 +123,36 @@ Do not import the computer module, or any of its sub-modules. They are already i
                 tools_signature_and_description.append(formatted_info)
         return tools_signature_and_description
 
+    def _get_cached_computer_tools_signature_and_description(self):
+        """
+        Same as `_get_all_computer_tools_signature_and_description`, but only computed once per set of tool classes.
+        It's cached on disk too, keyed by package version (and the tools' source files, for development installs).
+        """
+        tool_classes = tuple(
+            tool.__class__ for tool in self._get_all_computer_tools_list()
+        )
+
+        def load_or_compute():
+            key_parts = [package_version()]
+            for tool_class in tool_classes:
+                source_file = inspect.getsourcefile(tool_class)
+                key_parts.append(
+                    [
+                        tool_class.__module__,
+                        tool_class.__qualname__,
+                        os.path.getmtime(source_file) if source_file else None,
+                    ]
+                )
+            return cached(
+                "computer_tools",
+                make_key(*key_parts),
+                self._get_all_computer_tools_signature_and_description,
+                persist=True,
+            )
+
+        # Within a process, the classes themselves are enough of a key
+        return cached("computer_tools_by_class", tool_classes, load_or_compute)
+
     def _extract_tool_info(self, tool):
         """
         Helper function to extract the signature and description of a tool's methods.
@@ -1,4 +1,3 @@
-import base64
 import io
 import os
 import platform
@@ -7,12 +6,13 @@ import subprocess
 import time
 import warnings
 from contextlib import redirect_stdout
-from io import BytesIO
 
 import requests
+from IPython.display import Image as DisplayImage
 from IPython.display import display
 from PIL import Image
 
+from ...utils.image_cache import image_cache
 from ...utils.lazy_import import lazy_import
 from ..utils.recipient_utils import format_to_recipient
 
@@ -204,12 +204,12 @@ class Display:
             screenshot = screenshot.convert("RGB")
 
         if show:
-            # Show the image using IPython display
+            # Show the image using IPython display. The PNG is cached, so it's reused if the screenshot is sent anywhere else
             if isinstance(screenshot, list):
                 for img in screenshot:
-                    display(img)
+                    display(DisplayImage(data=image_cache.encode(img), format="png"))
             else:
-                display(screenshot)
+                display(DisplayImage(data=image_cache.encode(screenshot), format="png"))
 
         return screenshot  # this will be a list of combine_screens == False
 
@@ -254,13 +254,10 @@ class Display:
                 if screenshot == None:
                     screenshot = self.screenshot(show=False)
 
-                # Downscale the screenshot to 1920x1080
-                screenshot = screenshot.resize((1920, 1080))
-
-                # Convert the screenshot to base64
-                buffered = BytesIO()
-                screenshot.save(buffered, format="PNG")
-                screenshot_base64 = base64.b64encode(buffered.getvalue()).decode()
+                # Downscale the screenshot to 1920x1080, and convert it to base64
+                screenshot_base64 = image_cache.encode(
+                    screenshot, size=(1920, 1080), as_base64=True
+                )
 
                 try:
                     response = requests.post(
@@ -283,9 +280,7 @@ class Display:
 
         if not self.computer.offline:
             # Convert the screenshot to base64
-            buffered = BytesIO()
-            screenshot.save(buffered, format="PNG")
-            screenshot_base64 = base64.b64encode(buffered.getvalue()).decode()
+            screenshot_base64 = image_cache.encode(screenshot, as_base64=True)
 
             try:
                 response = requests.post(
@@ -315,9 +310,7 @@ class Display:
 
         if not self.computer.offline:
             # Convert the screenshot to base64
-            buffered = BytesIO()
-            screenshot.save(buffered, format="PNG")
-            screenshot_base64 = base64.b64encode(buffered.getvalue()).decode()
+            screenshot_base64 = image_cache.encode(screenshot, as_base64=True)
 
             try:
                 response = requests.post(
@@ -0,0 +1,89 @@
+"""
+Runs inside the Jupyter kernel (JupyterLanguage loads it there by path, so it only uses the standard library).
+
+Reports which line of the running cell is executing, as "active_line" messages on the kernel's output channel,
+parented to the execution, without changing the cell or its output. A thread samples the main thread's stack every
+`interval` seconds, so tracking costs nothing per line, even in a tight loop.
+"""
+
+import re
+import sys
+import threading
+import time
+
+# The filenames cells are compiled with: IPython's "<ipython-input-3-11f6ad8ec52a>",
+# and ipykernel's "/tmp/ipykernel_5558/2354412189.py"
+CELL_FILENAME = re.compile(r"^<ipython-input-\d+-[0-9a-f]+>$|ipykernel_\d+[/\\]\d+\.py$")
+
+
+def find_active_line(frame):
+    """
+    The line of the running cell that the innermost `frame` is on, or None if it isn't running a cell.
+    Inside a function defined in the cell, that's the line in the function.
+    """
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        caller = frame.f_back
+        # IPython's run_code exec()s the cell, so the frame it calls is the cell's.
+        # It calls IPython's own code too (like showtraceback, once the cell raises), which isn't a cell
+        if (
+            caller is not None
+            and caller.f_code.co_name == "run_code"
+            and caller.f_code.co_filename.endswith("interactiveshell.py")
+            and CELL_FILENAME.search(frame.f_code.co_filename)
+        ):
+            cell_filename = frame.f_code.co_filename
+            for cell_frame in frames:
+                if cell_frame.f_code.co_filename == cell_filename:
+                    return cell_frame.f_lineno
+        frame = caller
+    return None
+
+
+class ActiveLineReporter:
+    def __init__(self, shell, interval=0.1):
+        """
+        Call this in the kernel's main thread, which is the one that runs cells.
+        """
+        self.shell = shell
+        self.interval = interval
+        self._thread_id = threading.get_ident()
+        self._parent = None
+        self._running = threading.Event()
+        shell.events.register("pre_run_cell", self._pre_run_cell)
+        shell.events.register("post_run_cell", self._post_run_cell)
+        threading.Thread(target=self._report, daemon=True).start()
+
+    def _pre_run_cell(self, info):
+        self._parent = self.shell.parent_header
+        self._running.set()
+
+    def _post_run_cell(self, result):
+        self._running.clear()
+
+    def _report(self):
+        last_reported = None
+        while True:
+            self._running.wait()
+            time.sleep(self.interval)
+            parent = self._parent
+            frame = sys._current_frames().get(self._thread_id)
+            line = find_active_line(frame) if self._running.is_set() else None
+            del frame
+
+            if line is None:
+                continue
+            msg_id = parent.get("header", {}).get("msg_id")
+            if (msg_id, line) == last_reported:
+                continue
+            last_reported = (msg_id, line)
+
+            kernel = self.shell.kernel
+            kernel.session.send(
+                kernel.iopub_socket,
+                "active_line",
+                {"line": line},
+                parent=parent,
+                ident=kernel._topic("active_line"),
+            )
@@ -1,7 +1,78 @@
+import json
+import os
 import re
 
 from .subprocess_language import SubprocessLanguage
 
+# Runs code sent as JSON lines on stdin, in the global context (like the REPL, without its prompts and echoes),
+# and reports over the control channel.
+# The runner's own names are kept in a closure, so user code can't clash with them. The active line reporter
+# is the one global it adds, under a symbol. Like the REPL path (which wraps code in a try block), each run is a block,
+# so top level `let` and `const` can be declared again in a later run
+control_runner = r"""
+(() => {
+  const fs = require("fs");
+  const readline = require("readline");
+  const util = require("util");
+  const vm = require("vm");
+
+  const controlFd = Number(process.env.INTERPRETER_CONTROL_FD);
+  let runId = null;
+
+  function frame(message) {
+    const body = Buffer.from(JSON.stringify(message));
+    const header = Buffer.alloc(4);
+    header.writeUInt32BE(body.length);
+    fs.writeSync(controlFd, Buffer.concat([header, body]));
+  }
+
+  globalThis[Symbol.for("interpreter.active_line")] = (line) =>
+    frame({ event: "active_line", id: runId, line });
+
+  // Like the REPL, an error thrown later (in a callback) is printed instead of ending the process
+  process.on("uncaughtException", (error) => console.log(error));
+
+  async function execute(run) {
+    runId = run.id;
+    let exitCode = 0;
+    try {
+      const code = run.path ? fs.readFileSync(run.path, "utf8") : run.code;
+      let result;
+      try {
+        result = vm.runInThisContext(`{\n${code}\n}`);
+      } catch (error) {
+        if (!(error instanceof SyntaxError && error.message.includes("await"))) {
+          throw error;
+        }
+        // Top level await
+        result = vm.runInThisContext(`(async () => {\n${code}\n})()`);
+      }
+      if (result && typeof result.then === "function") {
+        result = await result;
+      }
+      if (result !== undefined) {
+        console.log(util.inspect(result));
+      }
+    } catch (error) {
+      console.log(error);
+      exitCode = 1;
+    }
+    // Once the output is written, so it's read before the end
+    await new Promise((resolve) => process.stdout.write("", resolve));
+    frame({ event: "end", id: run.id, exit_code: exitCode });
+  }
+
+  let running = Promise.resolve();
+  readline.createInterface({ input: process.stdin }).on("line", (line) => {
+    const run = JSON.parse(line);
+    running = running.then(() => execute(run));
+  });
+})();
+""".strip()
+
+# Reports an active line to the control runner
+report_active_line = 'globalThis[Symbol.for("interpreter.active_line")]'
+
 
 class JavaScript(SubprocessLanguage):
     file_extension = "js"
@@ -10,10 +81,30 @@ class JavaScript(SubprocessLanguage):
     def __init__(self):
         super().__init__()
         self.start_cmd = ["node", "-i"]
+        self.control_start_cmd = ["node", "-e", control_runner]
 
     def preprocess_code(self, code):
         return preprocess_javascript(code)
 
+    def preprocess_control_code(self, code):
+        # Same as preprocess_javascript, this would break code that spans lines
+        nothing_multiline = not any(char in code for char in ["{", "}", "[", "]"])
+        if (
+            nothing_multiline
+            and os.environ.get("INTERPRETER_ACTIVE_LINE_DETECTION", "True").lower()
+            == "true"
+        ):
+            code = "\n".join(
+                f"{report_active_line}({i});\n{line}"
+                for i, line in enumerate(code.split("\n"), 1)
+            )
+        return code
+
+    def control_command(self, run_id, code=None, path=None):
+        if path:
+            return json.dumps({"id": run_id, "path": path})
+        return json.dumps({"id": run_id, "code": code})
+
     def line_postprocessor(self, line):
         # Node's interactive REPL outputs a billion things
         # So we clean it up:
@@ -33,6 +33,10 @@ if "ipykernel_launcher" in sys.argv:
     sys.exit(0)
 
 
+# Put on an execution's queue once the kernel is idle after it
+END_OF_EXECUTION = object()
+
+
 class JupyterLanguage(BaseLanguage):
     file_extension = "py"
     name = "Python"
@@ -49,8 +53,16 @@ class JupyterLanguage(BaseLanguage):
             time.sleep(0.1)
         time.sleep(0.5)
 
-        self.listener_thread = None
-        self.finish_flag = False
+        # The kernel's output messages, routed by the msg_id of the execution they belong to. msg_id -> queue
+        self._executions = {}
+        self._executions_lock = threading.Lock()
+        # The msg_id of the execution the kernel is running right now, if any
+        self._running = None
+        self._closed = False
+        self.dispatcher_thread = threading.Thread(
+            target=self._dispatch_iopub, daemon=True
+        )
+        self.dispatcher_thread.start()
 
         # DISABLED because sometimes this bypasses sending it up to us for some reason!
         # Give it our same matplotlib backend
@@ -69,6 +81,24 @@ matplotlib.use('{backend}')
         code = """
 %matplotlib inline
 import matplotlib.pyplot as plt
+""".strip()
+
+        for _ in self.run(code):
+            pass
+
+        # Report the running line from inside the kernel, so the code and its output are left as they are
+        reporter_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "active_line_reporter.py"
+        )
+        code = f"""
+def _start_active_line_reporter():
+    import importlib.util
+    spec = importlib.util.spec_from_file_location("active_line_reporter", {reporter_path!r})
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.ActiveLineReporter(get_ipython())
+_start_active_line_reporter()
+del _start_active_line_reporter
 """.strip()
 
         for _ in self.run(code):
@@ -83,16 +113,16 @@ import matplotlib.pyplot as plt
         # self.run(code)
 
     def terminate(self):
-        self.kc.stop_channels()
+        self._closed = True
         self.km.shutdown_kernel()
+        # The dispatcher has to stop reading before its channel is closed
+        self.dispatcher_thread.join()
+        self.kc.stop_channels()
 
     def run(self, code):
         while not self.kc.is_alive():
             time.sleep(0.1)
 
-        self.last_output_time = time.time()
-        self.last_output_message_time = time.time()
-
         ################################################################
         ### OFFICIAL OPEN INTERPRETER GOVERNMENT ISSUE SKILL LIBRARY ###
         ################################################################
@@ -113,7 +143,6 @@ import matplotlib.pyplot as plt
         #         with open(f"{skill_library_path}/{filename}.py", "w") as file:
         #             file.write(function_code)
 
-        self.finish_flag = False
         try:
             try:
                 preprocessed_code = self.preprocess_code(code)
@@ -121,237 +150,239 @@ import matplotlib.pyplot as plt
                 # Any errors produced here are our fault.
                 # Also, for python, you don't need them! It's just for active_line and stuff. Just looks pretty.
                 preprocessed_code = code
-            message_queue = queue.Queue()
-            self._execute_code(preprocessed_code, message_queue)
-            yield from self._capture_output(message_queue)
+            msg_id, message_queue = self._execute_code(preprocessed_code)
+            yield from self._capture_output(msg_id, message_queue)
         except GeneratorExit:
             raise  # gotta pass this up!
         except:
             content = traceback.format_exc()
             yield {"type": "console", "format": "output", "content": content}
 
-    def _execute_code(self, code, message_queue):
-        def iopub_message_listener():
-            max_retries = 100
+    def _execute_code(self, code):
+        """
+        Sends code to the kernel. Returns its msg_id, and the queue its output messages will be routed to.
+        """
+        message_queue = queue.Queue()
+        # Registered under the lock, so the dispatcher can't get a message for it before its queue exists.
+        # Executions are independent, so one that errors (or is interrupted) shouldn't abort the ones queued behind it
+        with self._executions_lock:
+            msg_id = self.kc.execute(code, stop_on_error=False)
+            self._executions[msg_id] = message_queue
+        return msg_id, message_queue
+
+    def _dispatch_iopub(self):
+        """
+        Reads the kernel's output messages for as long as it runs, and routes each one to the queue of the execution that sent it.
+        The kernel going idle after an execution ends it.
+        """
+        max_retries = 100
+        while not self._closed:
+            try:
+                # The timeout is only so this notices `terminate`. Messages are handled as soon as they arrive.
+                msg = self.kc.iopub_channel.get_msg(timeout=0.5)
+            except queue.Empty:
+                continue
+            except Exception as e:
+                if self._closed:
+                    break
+                max_retries -= 1
+                if max_retries < 0:
+                    break
+                print("Jupyter error, retrying:", str(e))
+                continue
+
+            if DEBUG_MODE:
+                print("-----------" * 10)
+                print("Message received:", msg["content"])
+                print("-----------" * 10)
+
+            msg_id = msg["parent_header"].get("msg_id")
+            with self._executions_lock:
+                message_queue = self._executions.get(msg_id)
+                if msg["msg_type"] == "status":
+                    if msg["content"]["execution_state"] == "busy":
+                        self._running = msg_id
+                    elif self._running == msg_id:
+                        self._running = None
+
+            if message_queue is None:
+                # Not an execution, or one nobody is waiting on anymore
+                continue
+            if (
+                msg["msg_type"] == "status"
+                and msg["content"]["execution_state"] == "idle"
+            ):
+                message_queue.put(END_OF_EXECUTION)
+            else:
+                message_queue.put(msg)
+
+        # Nothing more is coming, so don't leave anyone waiting
+        with self._executions_lock:
+            for message_queue in self._executions.values():
+                message_queue.put(END_OF_EXECUTION)
+
+    def _capture_output(self, msg_id, message_queue):
+        last_output_time = last_output_message_time = time.time()
+        try:
             while True:
-                # If self.finish_flag = True, and we didn't set it (we do below), we need to stop. That's our "stop"
-                if self.finish_flag == True:
-                    if DEBUG_MODE:
-                        print("interrupting kernel!!!!!")
-                    self.km.interrupt_kernel()
-                    return
                 # For async usage
                 if (
                     hasattr(self.computer.interpreter, "stop_event")
                     and self.computer.interpreter.stop_event.is_set()
                 ):
-                    self.km.interrupt_kernel()
-                    self.finish_flag = True
-                    return
+                    self._interrupt(msg_id)
+                    break
+
                 try:
+                    # Returns as soon as a message arrives. The timeout is only so the checks here still happen while it's quiet.
+                    msg = message_queue.get(timeout=0.5)
+                except queue.Empty:
                     input_patience = int(
                         os.environ.get("INTERPRETER_TERMINAL_INPUT_PATIENCE", 15)
                     )
                     if (
-                        time.time() - self.last_output_time > input_patience
-                        and time.time() - self.last_output_message_time > input_patience
+                        time.time() - last_output_time > input_patience
+                        and time.time() - last_output_message_time > input_patience
                     ):
-                        self.last_output_message_time = time.time()
-
-                        text = f"{self.computer.interpreter.messages}\n\nThe program above has been running for over 15 seconds. It might require user input. Are there keystrokes that the user should type in, to proceed after the last command?"
-                        if time.time() - self.last_output_time > 500:
-                            text += f" If you think the process is frozen, or that the user wasn't expect it to run for this long (it has been {time.time() - self.last_output_time} seconds since last output) then say <input>CTRL-C</input>."
-
-                        messages = [
-                            {
-                                "role": "system",
-                                "type": "message",
-                                "content": "You are an expert programming assistant. You will help the user determine if they should enter input into the terminal, per the user's requests. If you think the user would want you to type something into stdin, enclose it in <input></input> XML tags, like <input>y</input> to type 'y'.",
-                            },
-                            {"role": "user", "type": "message", "content": text},
-                        ]
-                        params = {
-                            "messages": messages,
-                            "model": self.computer.interpreter.llm.model,
-                            "stream": True,
-                            "temperature": 0,
-                        }
-                        if self.computer.interpreter.llm.api_key:
-                            params["api_key"] = self.computer.interpreter.llm.api_key
-
-                        response = ""
-                        for chunk in litellm.completion(**params):
-                            content = chunk.choices[0].delta.content
-                            if type(content) == str:
-                                response += content
-
-                        # Parse the response for input tags
-                        input_match = re.search(r"<input>(.*?)</input>", response)
-                        if input_match:
-                            user_input = input_match.group(1)
-                            # Check if the user input is CTRL-C
-                            self.finish_flag = True
-                            if user_input.upper() == "CTRL-C":
-                                self.finish_flag = True
-                            else:
-                                self.kc.input(user_input)
-
-                    msg = self.kc.iopub_channel.get_msg(timeout=0.05)
-                    self.last_output_time = time.time()
-                except queue.Empty:
-                    continue
-                except Exception as e:
-                    max_retries -= 1
-                    if max_retries < 0:
-                        raise
-                    print("Jupyter error, retrying:", str(e))
+                        last_output_message_time = time.time()
+                        self._ask_for_input(msg_id, time.time() - last_output_time)
                     continue
 
-                if DEBUG_MODE:
-                    print("-----------" * 10)
-                    print("Message received:", msg["content"])
-                    print("-----------" * 10)
-
-                if (
-                    msg["header"]["msg_type"] == "status"
-                    and msg["content"]["execution_state"] == "idle"
-                ):
-                    # Set finish_flag and return when the kernel becomes idle
+                if msg is END_OF_EXECUTION:
                     if DEBUG_MODE:
-                        print("from thread: kernel is idle")
-                    self.finish_flag = True
-                    return
-
-                content = msg["content"]
-
-                if msg["msg_type"] == "stream":
-                    line, active_line = self.detect_active_line(content["text"])
-                    if active_line:
-                        message_queue.put(
-                            {
-                                "type": "console",
-                                "format": "active_line",
-                                "content": active_line,
-                            }
-                        )
-                    message_queue.put(
-                        {"type": "console", "format": "output", "content": line}
-                    )
-                elif msg["msg_type"] == "error":
-                    content = "\n".join(content["traceback"])
-                    # Remove color codes
-                    ansi_escape = re.compile(r"\x1B\[[0-?]*[ -/]*[@-~]")
-                    content = ansi_escape.sub("", content)
-                    message_queue.put(
-                        {
-                            "type": "console",
-                            "format": "output",
-                            "content": content,
-                        }
-                    )
-                elif msg["msg_type"] in ["display_data", "execute_result"]:
-                    data = content["data"]
-                    if "image/png" in data:
-                        message_queue.put(
-                            {
-                                "type": "image",
-                                "format": "base64.png",
-                                "content": data["image/png"],
-                            }
-                        )
-                    elif "image/jpeg" in data:
-                        message_queue.put(
-                            {
-                                "type": "image",
-                                "format": "base64.jpeg",
-                                "content": data["image/jpeg"],
-                            }
-                        )
-                    elif "text/html" in data:
-                        message_queue.put(
-                            {
-                                "type": "code",
-                                "format": "html",
-                                "content": data["text/html"],
-                            }
-                        )
-                    elif "text/plain" in data:
-                        message_queue.put(
-                            {
-                                "type": "console",
-                                "format": "output",
-                                "content": data["text/plain"],
-                            }
-                        )
-                    elif "application/javascript" in data:
-                        message_queue.put(
-                            {
-                                "type": "code",
-                                "format": "javascript",
-                                "content": data["application/javascript"],
-                            }
-                        )
+                        print("we're done")
+                    break
+                last_output_time = time.time()
 
-        self.listener_thread = threading.Thread(target=iopub_message_listener)
-        # self.listener_thread.daemon = True
-        self.listener_thread.start()
-
-        if DEBUG_MODE:
-            print(
-                "thread is on:", self.listener_thread.is_alive(), self.listener_thread
-            )
-
-        self.kc.execute(code)
-
-    def detect_active_line(self, line):
-        if "##active_line" in line:
-            # Split the line by "##active_line" and grab the last element
-            last_active_line = line.split("##active_line")[-1]
-            # Split the last active line by "##" and grab the first element
-            try:
-                active_line = int(last_active_line.split("##")[0])
-            except:
-                active_line = 0
-            # Remove all ##active_line{number}##\n
-            line = re.sub(r"##active_line\d+##\n", "", line)
-            return line, active_line
-        return line, None
-
-    def _capture_output(self, message_queue):
-        while True:
-            time.sleep(0.1)
-
-            # For async usage
-            if (
-                hasattr(self.computer.interpreter, "stop_event")
-                and self.computer.interpreter.stop_event.is_set()
-            ):
-                self.finish_flag = True
-                break
-
-            if self.listener_thread:
-                try:
-                    output = message_queue.get(timeout=0.1)
+                for output in self._message_to_chunks(msg):
                     if DEBUG_MODE:
                         print(output)
                     yield output
-
-                except queue.Empty:
-                    if self.finish_flag:
-                        time.sleep(0.1)
-
-                        try:
-                            output = message_queue.get(timeout=0.1)
-                            if DEBUG_MODE:
-                                print(output)
-                            yield output
-                        except queue.Empty:
-                            if DEBUG_MODE:
-                                print("we're done")
-                            break
+        except GeneratorExit:
+            # Nobody wants the rest of its output, so stop it
+            self._interrupt(msg_id)
+            raise
+        finally:
+            with self._executions_lock:
+                self._executions.pop(msg_id, None)
+
+    def _interrupt(self, msg_id=None):
+        """
+        Interrupts the kernel if it's running the execution `msg_id` (or any execution, if None).
+        Other executions waiting their turn aren't affected.
+        """
+        with self._executions_lock:
+            running = self._running
+        if running is not None and msg_id in (None, running):
+            if DEBUG_MODE:
+                print("interrupting kernel!!!!!")
+            self.km.interrupt_kernel()
+
+    def _ask_for_input(self, msg_id, seconds_since_output):
+        """
+        Asks the LLM whether a program that has gone quiet is waiting for input, and types it in if so.
+        """
+        text = f"{self.computer.interpreter.messages}\n\nThe program above has been running for over 15 seconds. It might require user input. Are there keystrokes that the user should type in, to proceed after the last command?"
+        if seconds_since_output > 500:
+            text += f" If you think the process is frozen, or that the user wasn't expect it to run for this long (it has been {seconds_since_output} seconds since last output) then say <input>CTRL-C</input>."
+
+        messages = [
+            {
+                "role": "system",
+                "type": "message",
+                "content": "You are an expert programming assistant. You will help the user determine if they should enter input into the terminal, per the user's requests. If you think the user would want you to type something into stdin, enclose it in <input></input> XML tags, like <input>y</input> to type 'y'.",
+            },
+            {"role": "user", "type": "message", "content": text},
+        ]
+        params = {
+            "messages": messages,
+            "model": self.computer.interpreter.llm.model,
+            "stream": True,
+            "temperature": 0,
+        }
+        if self.computer.interpreter.llm.api_key:
+            params["api_key"] = self.computer.interpreter.llm.api_key
+
+        response = ""
+        for chunk in litellm.completion(**params):
+            content = chunk.choices[0].delta.content
+            if type(content) == str:
+                response += content
+
+        # Parse the response for input tags
+        input_match = re.search(r"<input>(.*?)</input>", response)
+        if input_match:
+            user_input = input_match.group(1)
+            # Check if the user input is CTRL-C
+            if user_input.upper() == "CTRL-C":
+                self._interrupt(msg_id)
+            else:
+                self.kc.input(user_input)
+
+    def _message_to_chunks(self, msg):
+        """
+        The LMC chunks for one of the kernel's output messages.
+        """
+        content = msg["content"]
+
+        if msg["msg_type"] == "active_line":
+            # Sent by active_line_reporter.py
+            if (
+                os.environ.get("INTERPRETER_ACTIVE_LINE_DETECTION", "True").lower()
+                == "true"
+            ):
+                yield {
+                    "type": "console",
+                    "format": "active_line",
+                    "content": content["line"],
+                }
+        elif msg["msg_type"] == "stream":
+            yield {"type": "console", "format": "output", "content": content["text"]}
+        elif msg["msg_type"] == "error":
+            content = "\n".join(content["traceback"])
+            # Remove color codes
+            ansi_escape = re.compile(r"\x1B\[[0-?]*[ -/]*[@-~]")
+            content = ansi_escape.sub("", content)
+            yield {
+                "type": "console",
+                "format": "output",
+                "content": content,
+            }
+        elif msg["msg_type"] in ["display_data", "execute_result"]:
+            data = content["data"]
+            if "image/png" in data:
+                yield {
+                    "type": "image",
+                    "format": "base64.png",
+                    "content": data["image/png"],
+                }
+            elif "image/jpeg" in data:
+                yield {
+                    "type": "image",
+                    "format": "base64.jpeg",
+                    "content": data["image/jpeg"],
+                }
+            elif "text/html" in data:
+                yield {
+                    "type": "code",
+                    "format": "html",
+                    "content": data["text/html"],
+                }
+            elif "text/plain" in data:
+                yield {
+                    "type": "console",
+                    "format": "output",
+                    "content": data["text/plain"],
+                }
+            elif "application/javascript" in data:
+                yield {
+                    "type": "code",
+                    "format": "javascript",
+                    "content": data["application/javascript"],
+                }
 
     def stop(self):
-        self.finish_flag = True
+        self._interrupt()
 
     def preprocess_code(self, code):
         return preprocess_python(code)
@@ -359,111 +390,23 @@ import matplotlib.pyplot as plt
 
 def preprocess_python(code):
     """
-    Add active line markers
-    Wrap in a try except
+    Strip the code, keeping its line numbers the same (other than leading blank lines), so active lines match it
     """
 
     code = code.strip()
 
-    # Add print commands that tell us what the active line is
-    # but don't do this if any line starts with ! or %
-    if (
-        not any(line.strip().startswith(("!", "%")) for line in code.split("\n"))
-        and os.environ.get("INTERPRETER_ACTIVE_LINE_DETECTION", "True").lower()
-        == "true"
-    ):
-        code = add_active_line_prints(code)
-
     # Wrap in a try except (DISABLED)
     # code = wrap_in_try_except(code)
 
-    # Remove any whitespace lines, as this will break indented blocks
-    # (are we sure about this? test this)
+    # Empty any whitespace lines, as this will break indented blocks
+    # (they're emptied rather than removed, so line numbers don't shift)
     code_lines = code.split("\n")
-    code_lines = [c for c in code_lines if c.strip() != ""]
+    code_lines = [c if c.strip() != "" else "" for c in code_lines]
     code = "\n".join(code_lines)
 
     return code
 
 
-def add_active_line_prints(code):
-    """
-    Add print statements indicating line numbers to a python string.
-    """
-    # Replace newlines and comments with pass statements, so the line numbers are accurate (ast will remove them otherwise)
-    code_lines = code.split("\n")
-    in_multiline_string = False
-    for i in range(len(code_lines)):
-        line = code_lines[i]
-        if '"""' in line or "'''" in line:
-            in_multiline_string = not in_multiline_string
-        if not in_multiline_string and (line.strip().startswith("#") or line == ""):
-            whitespace = len(line) - len(line.lstrip(" "))
-            code_lines[i] = " " * whitespace + "pass"
-    processed_code = "\n".join(code_lines)
-    try:
-        tree = ast.parse(processed_code)
-    except:
-        # If you can't parse the processed version, try the unprocessed version before giving up
-        tree = ast.parse(code)
-    transformer = AddLinePrints()
-    new_tree = transformer.visit(tree)
-    return ast.unparse(new_tree)
-
-
-class AddLinePrints(ast.NodeTransformer):
-    """
-    Transformer to insert print statements indicating the line number
-    before every executable line in the AST.
-    """
-
-    def insert_print_statement(self, line_number):
-        """Inserts a print statement for a given line number."""
-        return ast.Expr(
-            value=ast.Call(
-                func=ast.Name(id="print", ctx=ast.Load()),
-                args=[ast.Constant(value=f"##active_line{line_number}##")],
-                keywords=[],
-            )
-        )
-
-    def process_body(self, body):
-        """Processes a block of statements, adding print calls."""
-        new_body = []
-
-        # In case it's not iterable:
-        if not isinstance(body, list):
-            body = [body]
-
-        for sub_node in body:
-            if hasattr(sub_node, "lineno"):
-                new_body.append(self.insert_print_statement(sub_node.lineno))
-            new_body.append(sub_node)
-
-        return new_body
-
-    def visit(self, node):
-        """Overridden visit to transform nodes."""
-        new_node = super().visit(node)
-
-        # If node has a body, process it
-        if hasattr(new_node, "body"):
-            new_node.body = self.process_body(new_node.body)
-
-        # If node has an orelse block (like in for, while, if), process it
-        if hasattr(new_node, "orelse") and new_node.orelse:
-            new_node.orelse = self.process_body(new_node.orelse)
-
-        # Special case for Try nodes as they have multiple blocks
-        if isinstance(new_node, ast.Try):
-            for handler in new_node.handlers:
-                handler.body = self.process_body(handler.body)
-            if new_node.finalbody:
-                new_node.finalbody = self.process_body(new_node.finalbody)
-
-        return new_node
-
-
 def wrap_in_try_except(code):
     # Add import traceback
     code = "import traceback\n" + code
@@ -70,4 +70,5 @@ cat("##end_of_execution##\\n");
         return None
 
     def detect_end_of_execution(self, line):
-        return "##end_of_execution##" in line or "##execution_error##" in line
+        # Not "##execution_error##", the error message comes after it (and the end marker after that)
+        return "##end_of_execution##" in line
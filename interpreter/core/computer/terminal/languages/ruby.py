@@ -1,7 +1,58 @@
+import json
 import re
 from pathlib import Path
 from .subprocess_language import SubprocessLanguage
 
+# Runs code sent as JSON lines on stdin at the top level (like irb, without its echoes), and reports over the control channel.
+# A thread samples the active line from the main thread's backtrace every 0.1s, so the code isn't changed
+control_runner = r"""
+require "json"
+
+$stdout.sync = true
+$stderr.sync = true
+$__oi_control = IO.new(Integer(ENV["INTERPRETER_CONTROL_FD"]), "wb")
+$__oi_lock = Mutex.new
+$__oi_id = nil
+
+def __oi_frame(message)
+  body = JSON.generate(message)
+  $__oi_lock.synchronize do
+    $__oi_control.write([body.bytesize].pack("N") + body)
+    $__oi_control.flush
+  end
+end
+
+if ENV.fetch("INTERPRETER_ACTIVE_LINE_DETECTION", "True").downcase == "true"
+  Thread.new do
+    reported = nil
+    loop do
+      sleep 0.1
+      location = (Thread.main.backtrace_locations || []).find { |l| l.path == "(code)" }
+      next if location.nil?
+      current = [$__oi_id, location.lineno]
+      next if current == reported
+      reported = current
+      __oi_frame({ event: "active_line", id: current[0], line: current[1] })
+    end
+  end
+end
+
+$stdin.each_line do |line|
+  run = JSON.parse(line)
+  $__oi_id = run["id"]
+  exit_code = 0
+  begin
+    code = run["path"] ? File.read(run["path"]) : run["code"]
+    result = eval(code, TOPLEVEL_BINDING, "(code)", 1)
+    puts result.inspect unless result.nil?
+  rescue StandardError, ScriptError => e
+    puts "#{e.class}: #{e.message}"
+    exit_code = 1
+  end
+  __oi_frame({ event: "end", id: run["id"], exit_code: exit_code })
+end
+""".strip()
+
 
 class Ruby(SubprocessLanguage):
     file_extension = "rb"
@@ -10,6 +61,12 @@ class Ruby(SubprocessLanguage):
     def __init__(self):
         super().__init__()
         self.start_cmd = ["irb"] 
+        self.control_start_cmd = ["ruby", "-e", control_runner]
+
+    def control_command(self, run_id, code=None, path=None):
+        if path:
+            return json.dumps({"id": run_id, "path": path})
+        return json.dumps({"id": run_id, "code": code})
 
     def preprocess_code(self, code):
         """
@@ -29,20 +86,21 @@ class Ruby(SubprocessLanguage):
         processed_code = "\n".join(processed_lines)
 
         # Wrap in a tryCatch for error handling and add end of execution marker
-        processed_code = f"""
-begin
+        # (No blank lines before or after, irb would echo them after the end of execution marker)
+        processed_code = f"""begin
   {processed_code}
 rescue => e
   puts "##execution_error##\\n" + e.message
 ensure
   puts "##end_of_execution##\\n"
-end
-"""
+end"""
         self.code_line_count = len(processed_code.split("\n"))
         #print(processed_code)
         return processed_code
 
     def line_postprocessor(self, line):
+        if line.strip() == "Switch to inspect mode.":  # Startup message
+            return None
         # If the line count attribute is set and non-zero, decrement and skip the line
         if hasattr(self, "code_line_count") and self.code_line_count > 0:
             self.code_line_count -= 1
@@ -57,4 +115,5 @@ end
         return None
 
     def detect_end_of_execution(self, line):
-        return "##end_of_execution##" in line or "##execution_error##" in line
\ No newline at end of file
+        # Not "##execution_error##", the error message comes after it (and the end marker after that)
+        return "##end_of_execution##" in line
\ No newline at end of file
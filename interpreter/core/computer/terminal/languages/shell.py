@@ -1,6 +1,7 @@
 import os
 import platform
 import re
+import shlex
 
 from .subprocess_language import SubprocessLanguage
 
@@ -20,10 +21,34 @@ class Shell(SubprocessLanguage):
             self.start_cmd = ["cmd.exe"]
         else:
             self.start_cmd = [os.environ.get("SHELL", "bash")]
+            # These can write control channel frames with builtins alone
+            if os.path.basename(self.start_cmd[0]) in ["bash", "zsh"]:
+                self.control_start_cmd = self.start_cmd
 
     def preprocess_code(self, code):
         return preprocess_shell(code)
 
+    def preprocess_control_code(self, code):
+        if (
+            not has_multiline_commands(code)
+            and os.environ.get("INTERPRETER_ACTIVE_LINE_DETECTION", "True").lower()
+            == "true"
+        ):
+            lines = code.split("\n")
+            code = "\n".join(
+                f"__oi_line {index}\n{line}" for index, line in enumerate(lines, 1)
+            )
+        return code
+
+    def control_command(self, run_id, code=None, path=None):
+        if path:
+            code = f". {shlex.quote(path)}"
+        # Defined every time, in case the code replaced them
+        return f"""{control_functions}
+__oi_id={run_id}
+{code}
+__oi_end $?"""
+
     def line_postprocessor(self, line):
         return line
 
@@ -36,6 +61,17 @@ class Shell(SubprocessLanguage):
         return "##end_of_execution##" in line
 
 
+# Write control channel frames (4 byte length, then JSON) to $INTERPRETER_CONTROL_FD
+control_functions = r"""
+__oi_frame() {
+  printf -v __oi_header '\\%03o\\%03o\\%03o\\%03o' $(( ${#1} >> 24 & 255 )) $(( ${#1} >> 16 & 255 )) $(( ${#1} >> 8 & 255 )) $(( ${#1} & 255 ))
+  printf "$__oi_header%s" "$1" >&"$INTERPRETER_CONTROL_FD"
+}
+__oi_line() { __oi_frame "{\"event\": \"active_line\", \"id\": $__oi_id, \"line\": $1}"; }
+__oi_end() { __oi_frame "{\"event\": \"end\", \"id\": $__oi_id, \"exit_code\": $1}"; }
+""".strip()
+
+
 def preprocess_shell(code):
     """
     Add active line markers
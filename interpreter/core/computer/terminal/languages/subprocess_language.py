@@ -1,15 +1,63 @@
+import codecs
+import json
 import os
 import queue
 import re
+import selectors
+import struct
 import subprocess
+import tempfile
 import threading
-import time
 import traceback
 
 from ..base_language import BaseLanguage
 
+# Put on the output queue after the last output of a run (or when the process exits)
+END_OF_EXECUTION = object()
+
+# Languages with a control channel get the fd it's written to in this environment variable
+CONTROL_FD_ENV = "INTERPRETER_CONTROL_FD"
+
+
+def encode_frame(message):
+    """
+    A control channel frame: the length of the JSON message as 4 big-endian bytes, then the message.
+    """
+    body = json.dumps(message).encode("utf-8")
+    return struct.pack(">I", len(body)) + body
+
+
+class FrameReader:
+    """
+    Turns the bytes read from a control channel back into messages.
+    """
+
+    def __init__(self):
+        self.buffer = b""
+
+    def feed(self, data):
+        """
+        Returns the messages completed by `data`. Partial frames are kept until the rest arrives.
+        """
+        self.buffer += data
+        messages = []
+        while len(self.buffer) >= 4:
+            (length,) = struct.unpack(">I", self.buffer[:4])
+            if len(self.buffer) < 4 + length:
+                break
+            body = self.buffer[4 : 4 + length]
+            self.buffer = self.buffer[4 + length :]
+            try:
+                messages.append(json.loads(body))
+            except ValueError:
+                pass
+        return messages
+
 
 class SubprocessLanguage(BaseLanguage):
+    # Code longer than this is written to a file, and the process is told to run that, when there's a control channel
+    file_payload_size = 16 * 1024
+
     def __init__(self):
         self.start_cmd = []
         self.process = None
@@ -17,6 +65,16 @@ class SubprocessLanguage(BaseLanguage):
         self.output_queue = queue.Queue()
         self.done = threading.Event()
 
+        # Languages that can report over a control channel set this, and implement `control_command`.
+        # The process is then started with it (on POSIX), and gets a pipe's fd in $INTERPRETER_CONTROL_FD.
+        # It writes frames (see `encode_frame`) to the pipe: {"event": "active_line", "id": run_id, "line": n}
+        # while it runs, and {"event": "end", "id": run_id, "exit_code": code} when it's done, after flushing its output.
+        # Output is then streamed as it's read, and never parsed for markers.
+        self.control_start_cmd = None
+        self._run_id = 0
+        # The exit code of the last run, if it was reported over the control channel
+        self.exit_code = None
+
     def detect_active_line(self, line):
         return None
 
@@ -32,14 +90,39 @@ class SubprocessLanguage(BaseLanguage):
         which can be detected by detect_end_of_execution.
 
         Optionally, add active line markers for detect_active_line.
+
+        (Not used with a control channel, see `control_command`.)
         """
         return code
 
+    def preprocess_control_code(self, code):
+        """
+        Optionally, add code that reports active lines over the control channel.
+        """
+        return code
+
+    def control_command(self, run_id, code=None, path=None):
+        """
+        What to write to the process to run `code` (or the file at `path`, when the code is long) over a control channel.
+        The run's frames should have `run_id` as their "id".
+        Languages that don't override this use the marker protocol, even if they set `control_start_cmd`.
+        """
+        raise NotImplementedError
+
+    @property
+    def uses_control_channel(self):
+        return (
+            bool(self.control_start_cmd)
+            and type(self).control_command is not SubprocessLanguage.control_command
+            and os.name == "posix"
+        )
+
     def terminate(self):
         if self.process:
+            # stdout is closed by its reader once the process has exited. Closing it here, while it's being read,
+            # could let the reader take the output of the next process to get the same file descriptor
             self.process.terminate()
             self.process.stdin.close()
-            self.process.stdout.close()
 
     def start_process(self):
         if self.process:
@@ -47,11 +130,17 @@ class SubprocessLanguage(BaseLanguage):
 
         my_env = os.environ.copy()
         my_env["PYTHONIOENCODING"] = "utf-8"
+
+        if self.uses_control_channel:
+            self._start_process_with_control_channel(my_env)
+            return
+        # stderr goes through stdout, so one reader sees everything in the order it was written,
+        # and nothing written before the end of execution marker can arrive after it
         self.process = subprocess.Popen(
             self.start_cmd,
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
             text=True,
             bufsize=0,
             universal_newlines=True,
@@ -60,23 +149,153 @@ class SubprocessLanguage(BaseLanguage):
             errors="replace",
         )
         threading.Thread(
-            target=self.handle_stream_output,
-            args=(self.process.stdout, False),
+            target=self._read_output,
+            args=(self.process,),
             daemon=True,
         ).start()
+
+    def _start_process_with_control_channel(self, env):
+        read_fd, write_fd = os.pipe()
+        env[CONTROL_FD_ENV] = str(write_fd)
+        try:
+            # Binary, output is streamed in chunks as it's read rather than line by line
+            self.process = subprocess.Popen(
+                self.control_start_cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                bufsize=0,
+                env=env,
+                pass_fds=(write_fd,),
+            )
+        except:
+            os.close(read_fd)
+            raise
+        finally:
+            # Only the process writes to it, so it's closed when the process exits
+            os.close(write_fd)
         threading.Thread(
-            target=self.handle_stream_output,
-            args=(self.process.stderr, True),
+            target=self._read_output_and_control,
+            args=(self.process, read_fd),
             daemon=True,
         ).start()
 
-    def run(self, code):
-        retry_count = 0
-        max_retries = 3
+    def _read_output(self, process):
+        try:
+            self.handle_stream_output(process.stdout)
+        finally:
+            process.stdout.close()
+            # The process exited, so nothing else is coming (unless it was replaced by a new one)
+            if process is self.process:
+                self.output_queue.put(END_OF_EXECUTION)
+
+    def _read_output_and_control(self, process, control_fd):
+        """
+        Streams a process's output, and acts on the frames it writes to its control channel.
+        Both are read on this one thread, so the output written before a run's end frame is sent before its end.
+
+        Output and frames come through two pipes, so when both are waiting, which was written first can't be known.
+        Active lines are ordered against output by how they're written (see `reported_run` below), which is right
+        for code that runs line by line. Output written outside that order, like from a background thread or a child
+        process, can be sent next to the wrong active line. End frames don't have this problem, as the process flushes
+        its output before writing them.
+        """
+        output_fd = process.stdout.fileno()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        frames = FrameReader()
+        selector = selectors.DefaultSelector()
+        selector.register(output_fd, selectors.EVENT_READ)
+        selector.register(control_fd, selectors.EVENT_READ)
+
+        def read_output():
+            """
+            Sends on what's waiting to be read. Returns False once the process has closed its output.
+            """
+            data = os.read(output_fd, 65536)
+            content = decoder.decode(data, final=not data)
+            if content:
+                self.output_queue.put(
+                    {"type": "console", "format": "output", "content": content}
+                )
+            return bool(data)
+
+        def output_waiting():
+            return any(key.fd == output_fd for key, _ in selector.select(timeout=0))
+
+        # The run whose first active line has been sent on. A run's first frame is written before any of its output,
+        # and every later line's frame is written after the output of the line before it
+        reported_run = None
 
+        try:
+            while True:
+                ready = [key.fd for key, _ in selector.select()]
+                if output_fd in ready and (
+                    control_fd not in ready or reported_run == self._run_id
+                ):
+                    if not read_output():
+                        return
+                if control_fd not in ready:
+                    continue
+
+                data = os.read(control_fd, 65536)
+                if not data:
+                    # Closed by the process, but its output may still be going
+                    selector.unregister(control_fd)
+                    continue
+                for message in frames.feed(data):
+                    if message.get("id") != self._run_id:
+                        # From an earlier run that was stopped
+                        continue
+                    if message.get("event") == "active_line":
+                        if reported_run == self._run_id:
+                            # The output of the line before it
+                            while output_waiting():
+                                if not read_output():
+                                    return
+                        reported_run = self._run_id
+                        self.output_queue.put(
+                            {
+                                "type": "console",
+                                "format": "active_line",
+                                "content": message["line"],
+                            }
+                        )
+                    elif message.get("event") == "end":
+                        # Everything it wrote before this is already waiting to be read
+                        while output_waiting():
+                            if not read_output():
+                                return
+                        self.exit_code = message.get("exit_code")
+                        self.output_queue.put(END_OF_EXECUTION)
+                        self.done.set()
+        except (OSError, ValueError):
+            # The pipes were closed under us
+            pass
+        finally:
+            selector.close()
+            os.close(control_fd)
+            process.stdout.close()
+            # The process exited, so nothing else is coming (unless it was replaced by a new one)
+            if process is self.process:
+                self.output_queue.put(END_OF_EXECUTION)
+
+    def run(self, code):
         # Setup
+        path = None
         try:
-            code = self.preprocess_code(code)
+            if self.uses_control_channel:
+                self._run_id += 1
+                code = self.preprocess_control_code(code)
+                if len(code) > self.file_payload_size:
+                    # Sent by reference instead of through stdin
+                    fd, path = tempfile.mkstemp(suffix="." + self.file_extension)
+                    with os.fdopen(fd, "w", encoding="utf-8") as file:
+                        file.write(code)
+                    code = self.control_command(self._run_id, path=path)
+                else:
+                    code = self.control_command(self._run_id, code=code)
+            else:
+                code = self.preprocess_code(code)
             if not self.process:
                 self.start_process()
         except:
@@ -85,16 +304,34 @@ class SubprocessLanguage(BaseLanguage):
                 "format": "output",
                 "content": traceback.format_exc(),
             }
+            if path:
+                os.remove(path)
             return
 
+        try:
+            yield from self._send_and_stream(code)
+        finally:
+            if path:
+                os.remove(path)
+
+    def _send_and_stream(self, code):
+        retry_count = 0
+        max_retries = 3
+
         while retry_count <= max_retries:
             if self.verbose:
                 print(f"(after processing) Running processed code:\n{code}\n---")
 
             self.done.clear()
+            # Anything left over is from an earlier run that was stopped before it finished
+            while not self.output_queue.empty():
+                self.output_queue.get_nowait()
 
             try:
-                self.process.stdin.write(code + "\n")
+                if self.uses_control_channel:
+                    self.process.stdin.write((code + "\n").encode("utf-8"))
+                else:
+                    self.process.stdin.write(code + "\n")
                 self.process.stdin.flush()
                 break
             except:
@@ -119,25 +356,14 @@ class SubprocessLanguage(BaseLanguage):
                     }
                     return
 
+        # Output is yielded as soon as it's read, until the end of execution marker (or frame)
         while True:
-            if not self.output_queue.empty():
-                yield self.output_queue.get()
-            else:
-                time.sleep(0.1)
-            try:
-                output = self.output_queue.get(timeout=0.3)  # Waits for 0.3 seconds
-                yield output
-            except queue.Empty:
-                if self.done.is_set():
-                    # Try to yank 3 more times from it... maybe there's something in there...
-                    # (I don't know if this actually helps. Maybe we just need to yank 1 more time)
-                    for _ in range(3):
-                        if not self.output_queue.empty():
-                            yield self.output_queue.get()
-                        time.sleep(0.2)
-                    break
-
-    def handle_stream_output(self, stream, is_error_stream):
+            output = self.output_queue.get()
+            if output is END_OF_EXECUTION:
+                break
+            yield output
+
+    def handle_stream_output(self, stream):
         try:
             for line in iter(stream.readline, ""):
                 if self.verbose:
@@ -170,16 +396,7 @@ class SubprocessLanguage(BaseLanguage):
                         self.output_queue.put(
                             {"type": "console", "format": "output", "content": line}
                         )
-                    self.done.set()
-                elif is_error_stream and "KeyboardInterrupt" in line:
-                    self.output_queue.put(
-                        {
-                            "type": "console",
-                            "format": "output",
-                            "content": "KeyboardInterrupt",
-                        }
-                    )
-                    time.sleep(0.1)
+                    self.output_queue.put(END_OF_EXECUTION)
                     self.done.set()
                 else:
                     self.output_queue.put(
@@ -0,0 +1,96 @@
+"""
+Spare, already started language instances, so a language is ready the moment it's needed,
+even right after a reset (which terminates the instances in use).
+
+The pool keeps `size` spares of every language that has been started, refilled in the background.
+"""
+
+import atexit
+import threading
+import weakref
+
+_pools = weakref.WeakSet()
+
+
+@atexit.register
+def _close_pools():
+    for pool in list(_pools):
+        pool.close()
+
+
+class RuntimePool:
+    def __init__(self, start, size=0):
+        """
+        `start(lang_class)` creates and starts an instance of a language.
+        """
+        self.start = start
+        self.size = size
+        self._spares = {}  # lang_class -> [instance, ...]
+        self._filling = set()  # lang_classes being refilled
+        self._closed = False
+        self._lock = threading.Lock()
+        _pools.add(self)
+
+    def take(self, lang_class):
+        """
+        Returns a spare instance of a language, or None if there isn't one. Call `fill` to replace it.
+        """
+        with self._lock:
+            spares = self._spares.get(lang_class)
+            return spares.pop(0) if spares else None
+
+    def fill(self, lang_class):
+        """
+        Starts spares of a language in the background, until there are `size` of them.
+        """
+        with self._lock:
+            if (
+                self._closed
+                or lang_class in self._filling
+                or len(self._spares.get(lang_class, [])) >= self.size
+            ):
+                return
+            self._filling.add(lang_class)
+        threading.Thread(target=self._fill, args=(lang_class,), daemon=True).start()
+
+    def _fill(self, lang_class):
+        try:
+            while True:
+                with self._lock:
+                    if (
+                        self._closed
+                        or len(self._spares.get(lang_class, [])) >= self.size
+                    ):
+                        return
+                instance = self.start(lang_class)
+                with self._lock:
+                    if not self._closed:
+                        self._spares.setdefault(lang_class, []).append(instance)
+                        continue
+                # Closed while it was starting
+                instance.terminate()
+                return
+        except Exception:
+            # Non-essential, languages are started on demand if there's no spare
+            pass
+        finally:
+            with self._lock:
+                self._filling.discard(lang_class)
+
+    def close(self):
+        """
+        Terminates the spares. Nothing is started after this.
+        """
+        with self._lock:
+            self._closed = True
+            spares = [
+                instance
+                for instances in self._spares.values()
+                for instance in instances
+            ]
+            self._spares = {}
+        for instance in spares:
+            try:
+                instance.terminate()
+            except Exception:
+                pass
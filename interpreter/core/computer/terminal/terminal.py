@@ -1,9 +1,10 @@
-import json
+import getpass
 import os
-import time
 import subprocess
-import getpass
+import threading
+import time
 
+from ...utils.output_spool import OutputSpool
 from ..utils.recipient_utils import parse_for_recipient
 from .languages.applescript import AppleScript
 from .languages.html import HTML
@@ -15,6 +16,7 @@ from .languages.r import R
 from .languages.react import React
 from .languages.ruby import Ruby
 from .languages.shell import Shell
+from .runtime_pool import RuntimePool
 
 # Should this be renamed to OS or System?
 
@@ -46,6 +48,36 @@ class Terminal:
             Java,
         ]
         self._active_languages = {}
+        # Languages started for a session, so code can run alongside the default ones. session -> {language: instance}
+        self._sessions = {}
+        # Languages being started in the background by `warm_up`. language -> thread
+        self._starting = {}
+        self._starting_lock = threading.Lock()
+        # Spare, already started languages. See `pool_size`
+        self._pool = RuntimePool(self._new_language)
+
+        # The full output of the last code run (messages only hold a truncated version)
+        self.last_output = None
+        self.last_output_path = None
+
+    @property
+    def pool_size(self):
+        """
+        How many spare instances of each language to keep started, so languages are ready right away (even after a reset).
+        Spares are only kept for languages that have been used. 0 (the default) keeps none.
+        """
+        return self._pool.size
+
+    @pool_size.setter
+    def pool_size(self, size):
+        self._pool.size = size
+
+    @property
+    def active_languages(self):
+        """
+        The names of the languages that are started (not counting spares).
+        """
+        return list(self._active_languages)
 
     def sudo_install(self, package):
         try:
@@ -70,6 +102,25 @@ class Terminal:
 
         return True
 
+    def get_last_output(self, start=0, end=None):
+        """
+        Returns characters start to end of the last code output, which is truncated in messages. Use this to page through large outputs.
+        """
+        if self.last_output is not None:
+            return self.last_output.read(start, end)
+        if self.last_output_path:
+            return OutputSpool.open(self.last_output_path).read(start, end)
+        return ""
+
+    def _store_last_output(self, spool):
+        """
+        Replaces the last output with a finished `OutputSpool`, deleting the previous one.
+        """
+        spool.close()
+        if self.last_output is not None:
+            self.last_output.delete()
+        self.last_output = spool
+
     def get_language(self, language):
         for lang in self.languages:
             if language.lower() == lang.name.lower() or (
@@ -79,7 +130,11 @@ class Terminal:
                 return lang
         return None
 
-    def run(self, language, code, stream=False, display=False):
+    def run(self, language, code, stream=False, display=False, session=None):
+        """
+        Runs code. With a `session`, it runs on that session's own language instances instead of the default ones,
+        so it doesn't share state with (or wait for) code running elsewhere. End the session with `end_session`.
+        """
         # Check if this is an apt install command
         if language == "shell" and code.strip().startswith("apt install"):
             package = code.split()[-1]
@@ -88,7 +143,20 @@ class Terminal:
             else:
                 return [{"type": "console", "format": "output", "content": f"Failed to install package {package}."}]
 
-        if language == "python":
+        if language == "python" and session is not None:
+            if (
+                self.computer.import_computer_api
+                and "computer" in code
+                and language not in self._sessions.get(session, {})
+                and os.getenv("INTERPRETER_COMPUTER_API", "True") != "False"
+            ):
+                # A new instance, so it needs its own access to the computer
+                for _ in self._streaming_run(
+                    language, import_computer_api_code, session=session
+                ):
+                    pass
+
+        elif language == "python":
             if (
                 self.computer.import_computer_api
                 and not self.computer._has_imported_computer_api
@@ -108,35 +176,26 @@ class Terminal:
                 self.computer._has_imported_skills = True
                 self.computer.skills.import_skills()
 
-            # This won't work because truncated code is stored in interpreter.messages :/
-            # If the full code was stored, we could do this:
-            if False and "get_last_output()" in code:
-                if "# We wouldn't want to have maximum recursion depth!" in code:
-                    # We just tried to run this, in a moment.
-                    pass
-                else:
-                    code_outputs = [
-                        m
-                        for m in self.computer.interpreter.messages
-                        if m["role"] == "computer"
-                        and "content" in m
-                        and m["content"] != ""
-                    ]
-                    if len(code_outputs) > 0:
-                        last_output = code_outputs[-1]["content"]
-                    else:
-                        last_output = ""
-                    last_output = json.dumps(last_output)
-
-                    self.computer.run(
-                        "python",
-                        f"# We wouldn't want to have maximum recursion depth!\nimport json\ndef get_last_output():\n    return '''{last_output}'''",
-                    )
+            # Point the kernel's computer at the last output, so it can page through it
+            if (
+                "get_last_output" in code
+                and self.computer._has_imported_computer_api
+                and self.last_output is not None
+                and "computer.terminal.last_output_path" not in code
+            ):
+                self.computer.run(
+                    "python",
+                    f"computer.terminal.last_output_path = {self.last_output.path!r}",
+                )
 
         if stream == False:
             # If stream == False, *pull* from _streaming_run.
             output_messages = []
-            for chunk in self._streaming_run(language, code, display=display):
+            # Content is collected in lists and joined once at the end, rather than with +=
+            output_contents = []
+            for chunk in self._streaming_run(
+                language, code, display=display, session=session
+            ):
                 if chunk.get("format") != "active_line":
                     # Should we append this to the last message, or make a new one?
                     if (
@@ -144,26 +203,97 @@ class Terminal:
                         and output_messages[-1].get("type") == chunk["type"]
                         and output_messages[-1].get("format") == chunk["format"]
                     ):
-                        output_messages[-1]["content"] += chunk["content"]
+                        output_contents[-1].append(chunk["content"])
                     else:
                         output_messages.append(chunk)
+                        output_contents.append([chunk["content"]])
+            for message, contents in zip(output_messages, output_contents):
+                if len(contents) > 1:
+                    message["content"] = "".join(contents)
             return output_messages
 
         elif stream == True:
             # If stream == True, replace this with _streaming_run.
-            return self._streaming_run(language, code, display=display)
-
-    def _streaming_run(self, language, code, display=False):
-        if language not in self._active_languages:
-            # Get the language. Pass in self.computer *if it takes a single argument*
-            # but pass in nothing if not. This makes custom languages easier to add / understand.
-            lang_class = self.get_language(language)
-            if lang_class.__init__.__code__.co_argcount > 1:
-                self._active_languages[language] = lang_class(self.computer)
+            return self._streaming_run(language, code, display=display, session=session)
+
+    def warm_up(self, language):
+        """
+        Starts a language in the background, so it's ready by the time code is run in it.
+        respond() calls this as soon as it knows the language of a code block the LLM is still writing.
+        """
+        if language in self._active_languages or self.get_language(language) is None:
+            return
+        with self._starting_lock:
+            if language in self._starting:
+                return
+            thread = threading.Thread(
+                target=self._warm_up, args=(language,), daemon=True
+            )
+            self._starting[language] = thread
+        thread.start()
+
+    def _warm_up(self, language):
+        try:
+            if language not in self._active_languages:
+                self._active_languages[language] = self._start_language(language)
+        except Exception:
+            # Non-essential, it'll be started (and the error raised) when code is run
+            pass
+        finally:
+            with self._starting_lock:
+                del self._starting[language]
+
+    def _wait_for_warm_up(self, language=None):
+        with self._starting_lock:
+            if language is None:
+                threads = list(self._starting.values())
             else:
-                self._active_languages[language] = lang_class()
+                threads = (
+                    [self._starting[language]] if language in self._starting else []
+                )
+        for thread in threads:
+            thread.join()
+
+    def _start_language(self, language):
+        """
+        A spare instance of the language from the pool, or a new one.
+        """
+        lang_class = self.get_language(language)
+        instance = self._pool.take(lang_class) or self._new_language(lang_class)
+        # Refilled after, so a spare doesn't slow down the start of the one that's needed now
+        self._pool.fill(lang_class)
+        return instance
+
+    def _new_language(self, lang_class):
+        # Pass in self.computer *if it takes a single argument*
+        # but pass in nothing if not. This makes custom languages easier to add / understand.
+        if lang_class.__init__.__code__.co_argcount > 1:
+            instance = lang_class(self.computer)
+        else:
+            instance = lang_class()
+        # Subprocess languages would otherwise start their process on their first run
+        if (
+            hasattr(instance, "start_process")
+            and getattr(instance, "start_cmd", None)
+            and instance.process is None
+        ):
+            try:
+                instance.start_process()
+            except Exception:
+                # run() will try again, and report the error
+                pass
+        return instance
+
+    def _streaming_run(self, language, code, display=False, session=None):
+        if session is None:
+            active_languages = self._active_languages
+            self._wait_for_warm_up(language)
+        else:
+            active_languages = self._sessions.setdefault(session, {})
+        if language not in active_languages:
+            active_languages[language] = self._start_language(language)
         try:
-            for chunk in self._active_languages[language].run(code):
+            for chunk in active_languages[language].run(code):
                 # self.format_to_recipient can format some messages as having a certain recipient.
                 # Here we add that to the LMC messages:
                 if chunk["type"] == "console" and chunk.get("format") == "output":
@@ -191,17 +321,53 @@ class Terminal:
                     print(chunk["content"], end="")
 
         except GeneratorExit:
-            self.stop()
+            if session is None:
+                self.stop()
+            else:
+                for language in active_languages.values():
+                    language.stop()
 
     def stop(self):
         for language in self._active_languages.values():
             language.stop()
+        for session_languages in list(self._sessions.values()):
+            for language in list(session_languages.values()):
+                language.stop()
+
+    @staticmethod
+    def _terminate_languages(languages):
+        for language in languages:
+            language.terminate()
+
+    def end_session(self, session):
+        """
+        Terminates the languages started for a session.
+        """
+        for language in self._sessions.pop(session, {}).values():
+            language.terminate()
 
     def terminate(self):
+        self._wait_for_warm_up()
+        for session in list(self._sessions.keys()):
+            self.end_session(session)
+
+        languages = []
         for language_name in list(self._active_languages.keys()):
             language = self._active_languages[language_name]
             if (
                 language
             ):  # Not sure why this is None sometimes. We should look into this
-                language.terminate()
+                languages.append(language)
             del self._active_languages[language_name]
+
+        if self.pool_size:
+            # Spares will take their place, so there's no need to wait for them to shut down
+            threading.Thread(
+                target=self._terminate_languages, args=(languages,), daemon=True
+            ).start()
+        else:
+            self._terminate_languages(languages)
+
+        if self.last_output is not None:
+            self.last_output.delete()
+            self.last_output = None
@@ -1,11 +1,10 @@
 import base64
 import contextlib
-import io
 import os
-import tempfile
 
 from PIL import Image
 
+from ...utils.image_cache import image_cache
 from ...utils.lazy_import import lazy_import
 from ..utils.computer_vision import pytesseract_get_text
 
@@ -67,50 +66,23 @@ class Vision:
         Gets OCR of image.
         """
 
+        # easyocr reads encoded images as bytes, so nothing needs to be written to a file
         if lmc:
             if "base64" in lmc["format"]:
-                # # Extract the extension from the format, default to 'png' if not specified
-                # if "." in lmc["format"]:
-                #     extension = lmc["format"].split(".")[-1]
-                # else:
-                #     extension = "png"
-                # Save the base64 content as a temporary file
-                img_data = base64.b64decode(lmc["content"])
-                with tempfile.NamedTemporaryFile(
-                    delete=False, suffix=".png"
-                ) as temp_file:
-                    temp_file.write(img_data)
-                    temp_file_path = temp_file.name
-
-                # Set path to the path of the temporary file
-                path = temp_file_path
-
+                image = base64.b64decode(lmc["content"])
             elif lmc["format"] == "path":
-                # Convert to base64
-                path = lmc["content"]
+                image = lmc["content"]
         elif base_64:
-            # Save the base64 content as a temporary file
-            img_data = base64.b64decode(base_64)
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-                temp_file.write(img_data)
-                temp_file_path = temp_file.name
-
-            # Set path to the path of the temporary file
-            path = temp_file_path
+            image = base64.b64decode(base_64)
         elif path:
-            pass
+            image = path
         elif pil_image:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-                pil_image.save(temp_file, format="PNG")
-                temp_file_path = temp_file.name
-
-            # Set path to the path of the temporary file
-            path = temp_file_path
+            image = image_cache.encode(pil_image)
 
         try:
             if not self.easyocr:
                 self.load(load_moondream=False)
-            result = self.easyocr.readtext(path)
+            result = self.easyocr.readtext(image)
             text = " ".join([item[1] for item in result])
             return text.strip()
         except ImportError:
@@ -151,16 +123,14 @@ class Vision:
                 #     extension = "png"
 
                 # Decode the base64 image
-                img_data = base64.b64decode(lmc["content"])
-                img = Image.open(io.BytesIO(img_data))
+                img = image_cache.open_base64(lmc["content"])
 
             elif lmc["format"] == "path":
                 # Convert to base64
                 image_path = lmc["content"]
                 img = Image.open(image_path)
         elif base_64:
-            img_data = base64.b64decode(base_64)
-            img = Image.open(io.BytesIO(img_data))
+            img = image_cache.open_base64(base_64)
         elif path:
             img = Image.open(path)
         elif pil_image:
@@ -2,7 +2,6 @@
 This file defines the Interpreter class.
 It's the main file. `from interpreter import interpreter` will import an instance of this class.
 """
-import json
 import os
 import threading
 import time
@@ -16,9 +15,14 @@ from ..terminal_interface.utils.oi_dir import oi_dir
 from .computer.computer import Computer
 from .default_system_message import default_system_message
 from .llm.llm import Llm
+from .render_message import RenderCache
 from .respond import respond
+from .utils.conversation_index import ConversationIndex
+from .utils.conversation_journal import ConversationJournal, journal_path
+from .utils.normalize_images import ingest_image
+from .utils.streaming_message import StreamingMessage
 from .utils.telemetry import send_telemetry
-from .utils.truncate_output import truncate_output
+from .utils.truncate_output import OutputTruncator, truncate_output
 
 
 class OpenInterpreter:
@@ -85,6 +89,9 @@ class OpenInterpreter:
         self.messages = [] if messages is None else messages
         self.responding = False
         self.last_messages_count = 0
+        # Outputs of {{ }} blocks in the system message
+        self.render_cache = RenderCache()
+        self._static_system_message = None  # Kept by prompt_cache.static_system_message
 
         # Settings
         self.offline = offline
@@ -100,6 +107,9 @@ class OpenInterpreter:
         self.contribute_conversation = contribute_conversation
         self.plain_text_display = plain_text_display
         self.highlight_active_line = True  # additional setting to toggle active line highlighting. Defaults to True
+        self.render_evaluator = "kernel"  # Where {{ }} blocks run. "local" runs them in this process, so they don't wait behind user code
+        self.parallel_tool_calls = False  # Run the tool calls of a turn concurrently, on separate language instances (with auto_run)
+        self.normalize_images = True  # Downscale and re-encode images as they're added to messages, and replace repeats with references
 
         # Loop messages
         self.loop = loop
@@ -110,6 +120,8 @@ class OpenInterpreter:
         self.conversation_history = conversation_history
         self.conversation_filename = conversation_filename
         self.conversation_history_path = conversation_history_path
+        self._conversation_journal = None
+        self._conversation_index = None
 
         # OS control mode related attributes
         self.os = os
@@ -280,14 +292,40 @@ class OpenInterpreter:
                 # Check if the directory exists, if not, create it
                 if not os.path.exists(self.conversation_history_path):
                     os.makedirs(self.conversation_history_path)
-                # Write or overwrite the file
-                with open(
-                    os.path.join(
-                        self.conversation_history_path, self.conversation_filename
-                    ),
-                    "w",
-                ) as f:
-                    json.dump(self.messages, f)
+                # Append what changed to the conversation's journal
+                conversation_path = os.path.join(
+                    self.conversation_history_path, self.conversation_filename
+                )
+                if (
+                    self._conversation_journal is None
+                    or self._conversation_journal.path
+                    != journal_path(conversation_path)
+                ):
+                    if self._conversation_journal is not None:
+                        self._conversation_journal.close()
+                    self._conversation_journal = ConversationJournal(conversation_path)
+                changed, truncated_to = self._conversation_journal.save(self.messages)
+
+                # Keep the conversation index (used for listing and searching) up to date
+                try:
+                    if (
+                        self._conversation_index is None
+                        or self._conversation_index.directory
+                        != self.conversation_history_path
+                    ):
+                        self._conversation_index = ConversationIndex(
+                            self.conversation_history_path
+                        )
+                    self._conversation_index.update(
+                        os.path.basename(self._conversation_journal.path),
+                        self.messages,
+                        changed,
+                        truncated_to,
+                    )
+                except Exception:
+                    # Non-essential, the index can be rebuilt from the files
+                    if self.debug:
+                        raise
             return
 
         raise Exception(
@@ -301,6 +339,9 @@ class OpenInterpreter:
         """
         self.verbose = False
 
+        # {{ }} blocks are re-rendered each turn, as what they show (like the active window) can change between turns
+        self.render_cache.invalidate()
+
         # Utility function
         def is_ephemeral(chunk):
             """
@@ -312,8 +353,53 @@ class OpenInterpreter:
                 return True
             return False
 
+        # The message we're streaming chunks into. Its content is only joined when it's read or finished.
+        streaming_message = None
+
+        def finalize_streaming_message():
+            """
+            Swaps the message we were streaming into for a plain dict, now that it's done.
+            """
+            nonlocal streaming_message
+            if streaming_message is None:
+                return
+            # It's almost always the last message, but the terminal interface can append after it
+            for i in range(len(self.messages) - 1, -1, -1):
+                if self.messages[i] is streaming_message:
+                    self.messages[i] = streaming_message.finalize()
+                    break
+            streaming_message = None
+
+        def store_new_message(chunk):
+            nonlocal streaming_message
+            finalize_streaming_message()
+            if chunk["type"] == "image":
+                if self.normalize_images:
+                    chunk = ingest_image(chunk, self.messages, self.llm)
+                self.messages.append(chunk)
+                return
+            if not isinstance(chunk.get("content"), str):
+                self.messages.append(chunk)
+                return
+            truncator = None
+            if chunk["type"] == "console" and chunk.get("format") == "output":
+                truncator = OutputTruncator(
+                    self.max_output,
+                    add_scrollbars=self.computer.import_computer_api,  # I consider scrollbars to be a computer API thing
+                )
+            streaming_message = StreamingMessage(chunk, truncator=truncator)
+            self.messages.append(streaming_message)
+
         last_flag_base = None
 
+        # Images the user added since the last response
+        if self.normalize_images:
+            for i, message in enumerate(self.messages):
+                if message.get("type") == "image" and "image_hash" not in message:
+                    self.messages[i] = ingest_image(
+                        message, self.messages[:i], self.llm
+                    )
+
         try:
             for chunk in respond(self):
                 # For async usage
@@ -331,14 +417,16 @@ class OpenInterpreter:
                 ):
                     # If output wasn't yet produced, add an empty output
                     if self.messages[-1]["role"] != "computer":
-                        self.messages.append(
-                            {
-                                "role": "computer",
-                                "type": "console",
-                                "format": "output",
-                                "content": "",
-                            }
-                        )
+                        finalize_streaming_message()
+                        empty_output = {
+                            "role": "computer",
+                            "type": "console",
+                            "format": "output",
+                            "content": "",
+                        }
+                        if "tool_call_id" in chunk:
+                            empty_output["tool_call_id"] = chunk["tool_call_id"]
+                        self.messages.append(empty_output)
 
                 # Handle the special "confirmation" chunk, which neither triggers a flag or creates a message
                 if chunk["type"] == "confirmation":
@@ -376,23 +464,41 @@ class OpenInterpreter:
                             and chunk["format"] == last_flag_base["format"]
                         )
                     )
+                    and last_flag_base.get("tool_call_id") == chunk.get("tool_call_id")
                 ):
                     # If they match, append the chunk's content to the current message's content
                     # (Except active_line, which shouldn't be stored)
                     if not is_ephemeral(chunk):
-                        if any(
+                        # Each image is its own message
+                        if chunk["type"] == "image" or any(
                             [
                                 (property in self.messages[-1])
                                 and (
                                     self.messages[-1].get(property)
                                     != chunk.get(property)
                                 )
-                                for property in ["role", "type", "format"]
+                                for property in [
+                                    "role",
+                                    "type",
+                                    "format",
+                                    "tool_call_id",
+                                ]
                             ]
                         ):
-                            self.messages.append(chunk)
+                            store_new_message(chunk)
+                        elif self.messages[-1] is streaming_message:
+                            streaming_message.append(chunk["content"])
                         else:
                             self.messages[-1]["content"] += chunk["content"]
+                            if (
+                                chunk["type"] == "console"
+                                and chunk["format"] == "output"
+                            ):
+                                self.messages[-1]["content"] = truncate_output(
+                                    self.messages[-1]["content"],
+                                    self.max_output,
+                                    add_scrollbars=self.computer.import_computer_api,
+                                )
                 else:
                     # If they don't match, yield a end message for the last message type and a start message for the new one
                     if last_flag_base:
@@ -404,32 +510,33 @@ class OpenInterpreter:
                     if "format" in chunk and chunk["type"] != "console":
                         last_flag_base["format"] = chunk["format"]
 
+                    # Each of several tool calls (and its output) is its own block
+                    if "tool_call_id" in chunk:
+                        last_flag_base["tool_call_id"] = chunk["tool_call_id"]
+
                     yield {**last_flag_base, "start": True}
 
                     # Add the chunk as a new message
                     if not is_ephemeral(chunk):
-                        self.messages.append(chunk)
+                        store_new_message(chunk)
 
                 # Yield the chunk itself
                 yield chunk
 
-                # Truncate output if it's console output
-                if chunk["type"] == "console" and chunk["format"] == "output":
-                    self.messages[-1]["content"] = truncate_output(
-                        self.messages[-1]["content"],
-                        self.max_output,
-                        add_scrollbars=self.computer.import_computer_api,  # I consider scrollbars to be a computer API thing
-                    )
+            finalize_streaming_message()
 
             # Yield a final end flag
             if last_flag_base:
                 yield {**last_flag_base, "end": True}
         except GeneratorExit:
             raise  # gotta pass this up!
+        finally:
+            finalize_streaming_message()
 
     def reset(self):
         self.computer.terminate()  # Terminates all languages
         self.computer._has_imported_computer_api = False  # Flag reset
+        self.render_cache.invalidate()
         self.messages = []
         self.last_messages_count = 0
 
@@ -18,13 +18,18 @@ import time
 import uuid
 
 import requests
-import tokentrim as tt
+from tokentrim.model_map import MODEL_MAX_TOKENS
 
+from ...terminal_interface.utils.local_storage_path import get_storage_path
+from ..utils.normalize_images import REFERENCE_FORMAT, resolve_image_references
+from ..utils.prompt_cache import static_system_message_tokens
 from .run_text_llm import run_text_llm
 
 # from .run_function_calling_llm import run_function_calling_llm
 from .run_tool_calling_llm import run_tool_calling_llm
+from .utils.completion_cache import get_completion_cache
 from .utils.convert_to_openai_messages import convert_to_openai_messages
+from .utils.trim_messages import trim_messages
 
 # Create or get the logger
 logger = logging.getLogger("LiteLLM")
@@ -72,6 +77,12 @@ class Llm:
         self.api_key = None
         self.api_version = None
         self._is_loaded = False
+        self.max_image_size = None  # Images are downscaled to this (longest side, in pixels). None picks a size for the model
+        self.completion_cache = None  # "on" replays deterministic completions that were made before. "record" and "replay" are for tests (see completion_cache.py)
+        self.completion_cache_path = get_storage_path("completion_cache")
+        self._converted_messages = (
+            {}
+        )  # Lets convert_to_openai_messages skip messages it's already converted
 
         # Budget manager powered by LiteLLM
         self.max_budget = None
@@ -146,9 +157,14 @@ class Llm:
             except:
                 self.supports_vision = False
 
-        # Trim image messages if they're there
-        image_messages = [msg for msg in messages if msg["type"] == "image"]
+        # Trim image messages if they're there (references to earlier images aren't counted, they're tiny)
+        image_messages = [
+            msg
+            for msg in messages
+            if msg["type"] == "image" and msg.get("format") != REFERENCE_FORMAT
+        ]
         if self.supports_vision:
+            untrimmed_messages = list(messages)
             if self.interpreter.os:
                 # Keep only the last two images if the interpreter is running in OS mode
                 if len(image_messages) > 1:
@@ -164,6 +180,8 @@ class Llm:
                         if self.interpreter.verbose:
                             print("Removing image message!")
                 # Idea: we could set detail: low for the middle messages, instead of deleting them
+            # An image that was trimmed out is sent in place of the first reference to it
+            messages = resolve_image_references(messages, untrimmed_messages)
         elif self.supports_vision == False and self.vision_renderer:
             for img_msg in image_messages:
                 if img_msg["format"] != "description":
@@ -202,6 +220,8 @@ class Llm:
                         img_msg["format"] = "description"
                         img_msg["content"] = ""
 
+        system_content = messages[0]["content"]
+
         # Convert to OpenAI messages format
         messages = convert_to_openai_messages(
             messages,
@@ -209,6 +229,7 @@ class Llm:
             vision=self.supports_vision,
             shrink_images=self.interpreter.shrink_images,
             interpreter=self.interpreter,
+            cache=self._converted_messages,
         )
 
         system_message = messages[0]["content"]
@@ -216,42 +237,41 @@ class Llm:
 
         # Trim messages
         try:
+            # The static system message's count is kept with it, so it isn't counted again
+            system_tokens = None
+            static = getattr(self.interpreter, "_static_system_message", None)
+            if static is not None and system_content is static.content:
+                system_tokens = static_system_message_tokens(self.interpreter, model)
+
+            # Console outputs sent as user messages start like this
+            output_prefixes = [
+                self.interpreter.code_output_template.split("{content}")[0],
+                self.interpreter.empty_code_output_template,
+            ]
             if self.context_window and self.max_tokens:
                 trim_to_be_this_many_tokens = (
                     self.context_window - self.max_tokens - 25
                 )  # arbitrary buffer
-                messages = tt.trim(
-                    messages,
-                    system_message=system_message,
-                    max_tokens=trim_to_be_this_many_tokens,
-                )
             elif self.context_window and not self.max_tokens:
                 # Just trim to the context window if max_tokens not set
-                messages = tt.trim(
-                    messages,
-                    system_message=system_message,
-                    max_tokens=self.context_window,
-                )
+                trim_to_be_this_many_tokens = self.context_window
+            elif model in MODEL_MAX_TOKENS:
+                trim_to_be_this_many_tokens = int(MODEL_MAX_TOKENS[model] * 0.75)
             else:
-                try:
-                    messages = tt.trim(
-                        messages, system_message=system_message, model=model
-                    )
-                except:
-                    if len(messages) == 1:
-                        if self.interpreter.in_terminal_interface:
-                            self.interpreter.display_message(
-                                """
+                if len(messages) == 1:
+                    if self.interpreter.in_terminal_interface:
+                        self.interpreter.display_message(
+                            """
 **We were unable to determine the context window of this model.** Defaulting to 8000.
 
 If your model can handle more, run `interpreter --context_window {token limit} --max_tokens {max tokens per response}`.
 
 Continuing...
+                        """
+                        )
+                    else:
+                        self.interpreter.display_message(
                             """
-                            )
-                        else:
-                            self.interpreter.display_message(
-                                """
 **We were unable to determine the context window of this model.** Defaulting to 8000.
 
 If your model can handle more, run `self.context_window = {token limit}`.
@@ -259,11 +279,17 @@ If your model can handle more, run `self.context_window = {token limit}`.
 Also please set `self.max_tokens = {max tokens per response}`.
 
 Continuing...
-                            """
-                            )
-                    messages = tt.trim(
-                        messages, system_message=system_message, max_tokens=8000
-                    )
+                        """
+                        )
+                trim_to_be_this_many_tokens = 8000
+            messages = trim_messages(
+                messages,
+                system_message=system_message,
+                max_tokens=trim_to_be_this_many_tokens,
+                output_prefixes=output_prefixes,
+                model=model,
+                system_tokens=system_tokens,
+            )
         except:
             # If we're trimming messages, this won't work.
             # If we're trimming from a model we don't know, this won't work.
@@ -329,6 +355,21 @@ Continuing...
         else:
             yield from run_text_llm(self, params)
 
+    @property
+    def completions(self):
+        """
+        The completions "endpoint", through the completion cache if it's on.
+        """
+        if not self.completion_cache:
+            return self._completions
+        cache = get_completion_cache(self.completion_cache_path)
+        completions, mode = self._completions, self.completion_cache
+        return lambda **params: cache.stream(completions, params, mode)
+
+    @completions.setter
+    def completions(self, value):
+        self._completions = value
+
     # If you change model, set _is_loaded to false
     @property
     def model(self):
@@ -1,5 +1,4 @@
-from .utils.merge_deltas import merge_deltas
-from .utils.parse_partial_json import parse_partial_json
+from .utils.incremental_json import IncrementalJsonParser
 
 function_schema = {
     "name": "execute",
@@ -37,9 +36,10 @@ def run_function_calling_llm(llm, request_params):
 
     ## Convert output to LMC format
 
-    accumulated_deltas = {}
+    # The function call's name, and a parser that reads its arguments as they stream in
+    function_name = ""
+    arguments_parser = IncrementalJsonParser()
     language = None
-    code = ""
     function_call_detected = False
 
     accumulated_review = ""
@@ -51,8 +51,6 @@ def run_function_calling_llm(llm, request_params):
             continue
 
         delta = chunk["choices"][0]["delta"]
-        # Accumulate deltas
-        accumulated_deltas = merge_deltas(accumulated_deltas, delta)
 
         if "content" in delta and delta["content"]:
             if function_call_detected:
@@ -90,76 +88,61 @@ def run_function_calling_llm(llm, request_params):
             else:
                 yield {"type": "message", "content": delta["content"]}
 
-        if (
-            accumulated_deltas.get("function_call")
-            and "arguments" in accumulated_deltas["function_call"]
-            and accumulated_deltas["function_call"]["arguments"]
-        ):
+        function_call = dict(delta).get("function_call")
+        if not function_call:
+            continue
+        function_call = dict(function_call)
+        function_name += function_call.get("name") or ""
+        arguments = function_call.get("arguments") or ""
+
+        if arguments:
             function_call_detected = True
-            if (
-                "name" in accumulated_deltas["function_call"]
-                and accumulated_deltas["function_call"]["name"] == "execute"
-            ):
-                arguments = accumulated_deltas["function_call"]["arguments"]
-                arguments = parse_partial_json(arguments)
-
-                if arguments:
-                    if (
-                        language is None
-                        and "language" in arguments
-                        and "code"
-                        in arguments  # <- This ensures we're *finished* typing language, as opposed to partially done
-                        and arguments["language"]
-                    ):
-                        language = arguments["language"]
-
-                    if language is not None and "code" in arguments:
-                        # Calculate the delta (new characters only)
-                        code_delta = arguments["code"][len(code) :]
-                        # Update the code
-                        code = arguments["code"]
-                        # Yield the delta
-                        if code_delta:
-                            yield {
-                                "type": "code",
-                                "format": language,
-                                "content": code_delta,
-                            }
-                else:
+            if function_name == "execute":
+                if arguments_parser.failed:
+                    continue
+                new = arguments_parser.feed(arguments)
+
+                if arguments_parser.failed:
                     if llm.interpreter.verbose:
                         print("Arguments not a dict.")
+                    continue
+
+                if language is None:
+                    # Only once it's finished, as opposed to partially typed
+                    if not arguments_parser.complete.get("language"):
+                        continue
+                    language = arguments_parser.complete["language"]
+                    # Including any code that came before it
+                    code_delta = arguments_parser.get("code", "")
+                else:
+                    code_delta = new.get("code", "")
+
+                if isinstance(code_delta, str) and code_delta:
+                    yield {
+                        "type": "code",
+                        "format": language,
+                        "content": code_delta,
+                    }
 
             # Common hallucinations
-            elif "name" in accumulated_deltas["function_call"] and (
-                accumulated_deltas["function_call"]["name"] == "python"
-                or accumulated_deltas["function_call"]["name"] == "functions"
-            ):
+            elif function_name == "python" or function_name == "functions":
                 if llm.interpreter.verbose:
                     print("Got direct python call")
                 if language is None:
                     language = "python"
 
-                if language is not None:
-                    # Pull the code string straight out of the "arguments" string
-                    code_delta = accumulated_deltas["function_call"]["arguments"][
-                        len(code) :
-                    ]
-                    # Update the code
-                    code = accumulated_deltas["function_call"]["arguments"]
-                    # Yield the delta
-                    if code_delta:
-                        yield {
-                            "type": "code",
-                            "format": language,
-                            "content": code_delta,
-                        }
+                # The arguments are the code
+                yield {
+                    "type": "code",
+                    "format": language,
+                    "content": arguments,
+                }
 
-            else:
+            elif function_name:
                 # If name exists and it's not "execute" or "python" or "functions", who knows what's going on.
-                if "name" in accumulated_deltas["function_call"]:
-                    yield {
-                        "type": "code",
-                        "format": "python",
-                        "content": accumulated_deltas["function_call"]["name"],
-                    }
-                    return
+                yield {
+                    "type": "code",
+                    "format": "python",
+                    "content": function_name,
+                }
+                return
@@ -1,3 +1,6 @@
+from .utils.markdown_fences import FenceParser
+
+
 def run_text_llm(llm, params):
     ## Setup
 
@@ -13,8 +16,8 @@ def run_text_llm(llm, params):
 
     ## Convert output to LMC format
 
-    inside_code_block = False
-    accumulated_block = ""
+    fences = FenceParser()
+    # The language of the code block we're in, or None if it won't be run
     language = None
 
     for chunk in llm.completions(**params):
@@ -30,46 +33,37 @@ def run_text_llm(llm, params):
         if content == None:
             continue
 
-        accumulated_block += content
+        for event, text in fences.feed(content):
+            if event == "message":
+                yield {"type": "message", "content": text}
 
-        if accumulated_block.endswith("`"):
-            # We might be writing "```" one token at a time.
-            continue
+            elif event == "code_start":
+                language = code_block_language(llm, text)
+
+            elif event == "code" and language:
+                yield {"type": "code", "format": language, "content": text}
+
+            elif event == "code_end" and language:
+                # The code is run before the LLM says anything else
+                return
+
+    for event, text in fences.end():
+        if event == "message":
+            yield {"type": "message", "content": text}
+        elif event == "code" and language:
+            yield {"type": "code", "format": language, "content": text}
+
+
+def code_block_language(llm, info):
+    """
+    The language to run a code block in, from the line after its opening fence. None if it shouldn't be run.
+    """
+    if info == "":
+        # Default to python if not specified
+        if llm.interpreter.os == False:
+            return "python"
+        # OS mode does this frequently. Takes notes with markdown code blocks
+        return None
 
-        # Did we just enter a code block?
-        if "```" in accumulated_block and not inside_code_block:
-            inside_code_block = True
-            accumulated_block = accumulated_block.split("```")[1]
-
-        # Did we just exit a code block?
-        if inside_code_block and "```" in accumulated_block:
-            return
-
-        # If we're in a code block,
-        if inside_code_block:
-            # If we don't have a `language`, find it
-            if language is None and "\n" in accumulated_block:
-                language = accumulated_block.split("\n")[0]
-
-                # Default to python if not specified
-                if language == "":
-                    if llm.interpreter.os == False:
-                        language = "python"
-                    elif llm.interpreter.os == False:
-                        # OS mode does this frequently. Takes notes with markdown code blocks
-                        language = "text"
-                else:
-                    # Removes hallucinations containing spaces or non letters.
-                    language = "".join(char for char in language if char.isalpha())
-
-            # If we do have a `language`, send it out
-            if language:
-                yield {
-                    "type": "code",
-                    "format": language,
-                    "content": content.replace(language, ""),
-                }
-
-        # If we're not in a code block, send the output as a message
-        if not inside_code_block:
-            yield {"type": "message", "content": content}
+    # Removes hallucinations containing spaces or non letters.
+    return "".join(char for char in info if char.isalpha()) or None
@@ -1,8 +1,8 @@
 import os
 import re
+import uuid
 
-from .utils.merge_deltas import merge_deltas
-from .utils.parse_partial_json import parse_partial_json
+from .utils.incremental_json import IncrementalJsonParser
 
 tool_schema = {
     "type": "function",
@@ -62,6 +62,47 @@ def process_messages(messages):
                     {"role": "tool", "tool_call_id": tool_id, "content": ""}
                 )
 
+        elif message.get("tool_calls"):
+            processed_messages.append(message)
+
+            # Add an empty tool response if there isn't one
+            tool_id = message["tool_calls"][0]["id"]
+            if not (
+                i + 1 < len(messages)
+                and messages[i + 1].get("role") == "tool"
+                and messages[i + 1].get("tool_call_id") == tool_id
+            ):
+                processed_messages.append(
+                    {"role": "tool", "tool_call_id": tool_id, "content": ""}
+                )
+
+        elif message.get("role") == "tool" and not (
+            processed_messages
+            and processed_messages[-1].get("tool_calls")
+            and processed_messages[-1]["tool_calls"][0]["id"]
+            == message.get("tool_call_id")
+        ):
+            # An orphaned tool response (its tool call was trimmed away, or it's a second output of the same call)
+            last_tool_id += 1
+            tool_id = f"toolu_{last_tool_id}"
+
+            processed_messages.append(
+                {
+                    "role": "assistant",
+                    "tool_calls": [
+                        {
+                            "id": tool_id,
+                            "type": "function",
+                            "function": {
+                                "name": "execute",
+                                "arguments": "# Automated tool call to fetch more output, triggered by the user.",
+                            },
+                        }
+                    ],
+                }
+            )
+            processed_messages.append({**message, "tool_call_id": tool_id})
+
         elif message.get("role") == "function":
             # This handles orphaned function responses
             last_tool_id += 1
@@ -98,6 +139,55 @@ def process_messages(messages):
     return processed_messages
 
 
+def parse_tool_call(llm, call, arguments):
+    """
+    Yields the new code in a partially streamed tool call, as LMC code chunks.
+    `arguments` is the newly streamed part of the call's arguments. `call` holds the call's name and parser.
+    """
+    if call["name"] == "python" or call["name"] == "functions":
+        if call["language"] is None:
+            call["language"] = "python"
+
+        # The arguments are the code
+        if arguments:
+            yield {
+                "type": "code",
+                "format": call["language"],
+                "content": arguments,
+                "tool_call_id": call["id"],
+            }
+        return
+
+    if not arguments or call["parser"].failed:
+        return
+
+    parser = call["parser"]
+    new = parser.feed(arguments)
+
+    if parser.failed:
+        if llm.interpreter.verbose:
+            print("Arguments not a dict.")
+        return
+
+    if call["language"] is None:
+        # Only once it's finished, as opposed to partially typed
+        if not parser.complete.get("language"):
+            return
+        call["language"] = parser.complete["language"]
+        # Including any code that came before it
+        code_delta = parser.get("code", "")
+    else:
+        code_delta = new.get("code", "")
+
+    if isinstance(code_delta, str) and code_delta:
+        yield {
+            "type": "code",
+            "format": call["language"],
+            "content": code_delta,
+            "tool_call_id": call["id"],
+        }
+
+
 def run_tool_calling_llm(llm, request_params):
     ## Setup
 
@@ -167,9 +257,7 @@ def run_tool_calling_llm(llm, request_params):
 
     ## Convert output to LMC format
 
-    accumulated_deltas = {}
-    language = None
-    code = ""
+    tool_calls = {}  # index -> the state of each tool call the model is making
     function_call_detected = False
     accumulated_review = ""
     review_category = None
@@ -182,22 +270,30 @@ def run_tool_calling_llm(llm, request_params):
 
         delta = chunk["choices"][0]["delta"]
 
-        # Convert tool call into function call, which we have great parsing logic for below
+        # Models can make several tool calls in one turn. Each one's code is yielded with its tool_call_id
         if "tool_calls" in delta and delta["tool_calls"]:
             function_call_detected = True
 
-            # import pdb; pdb.set_trace()
-            if len(delta["tool_calls"]) > 0 and delta["tool_calls"][0].function:
-                delta = {
-                    # "id": delta["tool_calls"][0],
-                    "function_call": {
-                        "name": delta["tool_calls"][0].function.name,
-                        "arguments": delta["tool_calls"][0].function.arguments,
-                    }
-                }
-
-        # Accumulate deltas
-        accumulated_deltas = merge_deltas(accumulated_deltas, delta)
+            if any(tool_call.function for tool_call in delta["tool_calls"]):
+                for tool_call in delta["tool_calls"]:
+                    if not tool_call.function:
+                        continue
+                    index = getattr(tool_call, "index", None) or 0
+                    if index not in tool_calls:
+                        tool_calls[index] = {
+                            # Some providers don't send ids, but we need one to tell the calls apart
+                            "id": tool_call.id or f"call_{uuid.uuid4().hex[:24]}",
+                            "name": "",
+                            "language": None,
+                            # Parses the arguments as they stream in, so they aren't re-parsed for every delta
+                            "parser": IncrementalJsonParser(),
+                        }
+                    call = tool_calls[index]
+                    call["name"] += tool_call.function.name or ""
+                    yield from parse_tool_call(
+                        llm, call, tool_call.function.arguments or ""
+                    )
+                continue
 
         if "content" in delta and delta["content"]:
             if function_call_detected:
@@ -247,64 +343,6 @@ def run_tool_calling_llm(llm, request_params):
             else:
                 yield {"type": "message", "content": delta["content"]}
 
-        if (
-            accumulated_deltas.get("function_call")
-            and "name" in accumulated_deltas["function_call"]
-            and (
-                accumulated_deltas["function_call"]["name"] == "python"
-                or accumulated_deltas["function_call"]["name"] == "functions"
-            )
-        ):
-            if language is None:
-                language = "python"
-
-            # Pull the code string straight out of the "arguments" string
-            code_delta = accumulated_deltas["function_call"]["arguments"][len(code) :]
-            # Update the code
-            code = accumulated_deltas["function_call"]["arguments"]
-            # Yield the delta
-            if code_delta:
-                yield {
-                    "type": "code",
-                    "format": language,
-                    "content": code_delta,
-                }
-
-        if (
-            accumulated_deltas.get("function_call")
-            and "arguments" in accumulated_deltas["function_call"]
-            and accumulated_deltas["function_call"]["arguments"]
-        ):
-            if "arguments" in accumulated_deltas["function_call"]:
-                arguments = accumulated_deltas["function_call"]["arguments"]
-                arguments = parse_partial_json(arguments)
-
-                if arguments:
-                    if (
-                        language is None
-                        and "language" in arguments
-                        and "code"
-                        in arguments  # <- This ensures we're *finished* typing language, as opposed to partially done
-                        and arguments["language"]
-                    ):
-                        language = arguments["language"]
-
-                    if language is not None and "code" in arguments:
-                        # Calculate the delta (new characters only)
-                        code_delta = arguments["code"][len(code) :]
-                        # Update the code
-                        code = arguments["code"]
-                        # Yield the delta
-                        if code_delta:
-                            yield {
-                                "type": "code",
-                                "format": language,
-                                "content": code_delta,
-                            }
-                else:
-                    if llm.interpreter.verbose:
-                        print("Arguments not a dict.")
-
     if os.getenv("INTERPRETER_REQUIRE_AUTHENTICATION", "False").lower() == "true":
         print("function_call_detected", function_call_detected)
         print("accumulated_review", accumulated_review)
@@ -0,0 +1,266 @@
+"""
+An on-disk cache of streamed completions, so a request that's been made before can be replayed instead of sent.
+
+Requests are keyed by a hash of their params (without the API key, and with numbers like 0 and 0.0 made the same).
+Each recording is a JSONL file: a header line, then one line per chunk, which are replayed in order.
+Identical requests made at the same time only go to the LLM once. The others read its chunks as they arrive.
+
+Modes:
+"on"      Deterministic requests (an explicit temperature of 0) are replayed if they've been recorded, otherwise recorded.
+"record"  Every request goes to the LLM, and is recorded (replacing an earlier recording).
+"replay"  Every request is replayed. A request that wasn't recorded raises CompletionCacheMiss.
+
+A stream that's closed before it ends (e.g. by run_text_llm, once a code block is written) is recorded up to there,
+but marked incomplete. "on" treats it as not recorded, and "replay" raises CompletionCacheMiss if it's read past its end.
+Identical requests that are made at the same time share one stream from the LLM, which is only closed early
+once none of them want more of it.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+MODES = ("on", "record", "replay")
+
+# Params that don't change what the LLM replies
+IGNORED_PARAMS = ("api_key", "stream", "num_retries")
+
+
+class CompletionCacheMiss(Exception):
+    pass
+
+
+def request_key(params):
+    """
+    A hash of the params of a request, the same for requests that would get the same reply.
+    """
+
+    def normalize(value):
+        if isinstance(value, dict):
+            return {k: normalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [normalize(v) for v in value]
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+
+    params = {k: v for k, v in params.items() if k not in IGNORED_PARAMS}
+    text = json.dumps(
+        normalize(params), sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def is_deterministic(params):
+    # Without a temperature, the provider's default is used, which often isn't 0
+    return params.get("temperature") == 0
+
+
+def dump_chunk(chunk):
+    """
+    A line of a recording. LiteLLM's chunks are recorded as their fields, and rebuilt when they're replayed.
+    """
+    if isinstance(chunk, dict):
+        return json.dumps({"chunk": chunk}, default=str)
+    return json.dumps({"chunk": chunk.model_dump(), "litellm": True}, default=str)
+
+
+def load_chunk(line):
+    record = json.loads(line)
+    if not record.get("litellm"):
+        return record["chunk"]
+    try:
+        from litellm.types.utils import ModelResponseStream
+    except ImportError:
+        # Older LiteLLM
+        import litellm
+
+        return litellm.ModelResponse(stream=True, **record["chunk"])
+    return ModelResponseStream(**record["chunk"])
+
+
+class _InFlight:
+    """
+    A request that's being streamed from the LLM, shared by everyone making it.
+    Chunks are pulled from the LLM by whichever reader needs the next one first, so the stream goes on
+    for as long as any reader wants it (even if the one that started it has stopped).
+    """
+
+    def __init__(self, completions, params):
+        self.completions = completions
+        self.params = params
+        self.source = None
+        self.lines = []
+        self.readers = 0  # Counted by CompletionCache, under its lock
+        self.pulling = False
+        self.done = False
+        self.complete = False
+        self.error = None
+        self.condition = threading.Condition()
+
+    def read(self):
+        i = 0
+        while True:
+            with self.condition:
+                while i >= len(self.lines) and not self.done and self.pulling:
+                    self.condition.wait()
+                if i < len(self.lines):
+                    line = self.lines[i]
+                elif self.error is not None:
+                    raise self.error
+                elif self.done:
+                    return
+                else:
+                    line = None
+                    self.pulling = True
+
+            if line is not None:
+                i += 1
+                yield load_chunk(line)
+                continue
+
+            try:
+                if self.source is None:
+                    self.source = iter(self.completions(**self.params))
+                chunk = next(self.source)
+            except StopIteration:
+                self._finish(complete=True)
+                return
+            except BaseException as e:
+                self._finish(error=e)
+                raise
+            with self.condition:
+                self.lines.append(dump_chunk(chunk))
+                self.pulling = False
+                self.condition.notify_all()
+            i += 1
+            yield chunk
+
+    def close(self):
+        """
+        Stops streaming from the LLM, if it hasn't finished. Called once nobody is reading.
+        """
+        with self.condition:
+            if self.done:
+                return
+            self.done = True
+        close = getattr(self.source, "close", None)
+        if close is not None:
+            close()
+
+    def _finish(self, complete=False, error=None):
+        with self.condition:
+            self.done = True
+            self.complete = complete
+            self.error = error
+            self.pulling = False
+            self.condition.notify_all()
+
+
+class CompletionCache:
+    def __init__(self, path):
+        self.path = path
+        self._in_flight = {}  # key -> _InFlight
+        self._lock = threading.Lock()
+
+    def recording_path(self, key):
+        return os.path.join(self.path, key[:2], key + ".jsonl")
+
+    def stream(self, completions, params, mode="on"):
+        """
+        Streams the reply to a request, from its recording or from `completions` (depending on `mode`).
+        """
+        if mode not in MODES:
+            raise ValueError(
+                f"The completion cache can be {', '.join(MODES)}, not {mode!r}"
+            )
+        if mode == "on" and not is_deterministic(params):
+            yield from completions(**params)
+            return
+
+        key = request_key(params)
+        path = self.recording_path(key)
+
+        with self._lock:
+            in_flight = self._in_flight.get(key)
+            recorded = None
+            if in_flight is None and mode != "record":
+                recorded = self._recorded(path)
+                if mode == "on" and recorded is False:
+                    # It was cut short, so it's only as good as not recorded
+                    recorded = None
+            if recorded is None:
+                if in_flight is None and mode != "replay":
+                    in_flight = self._in_flight[key] = _InFlight(completions, params)
+                if in_flight is not None:
+                    in_flight.readers += 1
+
+        if recorded is not None:
+            yield from self._replay(path)
+            return
+        if in_flight is None:
+            raise CompletionCacheMiss(
+                f"No completion was recorded for this request (in {self.path})."
+            )
+
+        try:
+            yield from in_flight.read()
+        finally:
+            with self._lock:
+                in_flight.readers -= 1
+                last = in_flight.readers == 0
+                if last:
+                    del self._in_flight[key]
+            if last:
+                in_flight.close()
+                if in_flight.error is None and in_flight.lines:
+                    try:
+                        self._write(path, in_flight.lines, in_flight.complete)
+                    except Exception:
+                        # Non-essential, it just won't be replayed
+                        pass
+
+    def _recorded(self, path):
+        """
+        None if there's no recording at `path`, otherwise whether it's complete.
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return bool(json.loads(f.readline()).get("complete"))
+        except (OSError, ValueError):
+            return None
+
+    def _replay(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            complete = json.loads(f.readline()).get("complete")
+            for line in f:
+                yield load_chunk(line)
+        if not complete:
+            raise CompletionCacheMiss(
+                f"The recording of this request ends early, as its stream was closed before it finished ({path})."
+            )
+
+    def _write(self, path, lines, complete):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written to a temporary file first, so a recording is never read half written
+        fd, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"complete": complete}) + "\n")
+                for line in lines:
+                    f.write(line + "\n")
+            os.replace(temporary_path, path)
+        except:
+            os.remove(temporary_path)
+            raise
+
+
+@functools.lru_cache(maxsize=None)
+def get_completion_cache(path):
+    """
+    The cache at `path`, shared by every Llm using it so identical requests from any of them are coalesced.
+    """
+    return CompletionCache(path)
@@ -1,9 +1,9 @@
 import base64
-import io
 import json
 import sys
 
-from PIL import Image
+from ...utils.image_cache import image_cache
+from ...utils.normalize_images import REFERENCE_FORMAT
 
 
 def convert_to_openai_messages(
@@ -12,9 +12,12 @@ def convert_to_openai_messages(
     vision=False,
     shrink_images=True,
     interpreter=None,
+    cache=None,
 ):
     """
     Converts LMC messages into OpenAI messages
+
+    Pass the same `cache` dict on every call, and messages that haven't changed since the last call aren't converted again.
     """
     new_messages = []
 
@@ -31,227 +34,56 @@ def convert_to_openai_messages(
 
     #     messages = [message for message in messages if message.get("type") != "code"]
 
-    for message in messages:
-        # Is this for thine eyes?
-        if "recipient" in message and message["recipient"] != "assistant":
-            continue
-
-        new_message = {}
-
-        if message["type"] == "message":
-            new_message["role"] = message[
-                "role"
-            ]  # This should never be `computer`, right?
-
-            if message["role"] == "user" and (
-                message == [m for m in messages if m["role"] == "user"][-1]
-                or interpreter.always_apply_user_message_template
-            ):
-                # Only add the template for the last message?
-                new_message["content"] = interpreter.user_message_template.replace(
-                    "{content}", message["content"]
-                )
-            else:
-                new_message["content"] = message["content"]
-
-        elif message["type"] == "code":
-            new_message["role"] = "assistant"
-            if function_calling:
-                new_message["function_call"] = {
-                    "name": "execute",
-                    "arguments": json.dumps(
-                        {"language": message["format"], "code": message["content"]}
-                    ),
-                    # parsed_arguments isn't actually an OpenAI thing, it's an OI thing.
-                    # but it's soo useful!
-                    # "parsed_arguments": {
-                    #     "language": message["format"],
-                    #     "code": message["content"],
-                    # },
-                }
-                # Add empty content to avoid error "openai.error.InvalidRequestError: 'content' is a required property - 'messages.*'"
-                # especially for the OpenAI service hosted on Azure
-                new_message["content"] = ""
-            else:
-                new_message[
-                    "content"
-                ] = f"""```{message["format"]}\n{message["content"]}\n```"""
-
-        elif message["type"] == "console" and message["format"] == "output":
-            if function_calling:
-                new_message["role"] = "function"
-                new_message["name"] = "execute"
-                if "content" not in message:
-                    print("What is this??", content)
-                if type(message["content"]) != str:
-                    if interpreter.debug:
-                        print("\n\n\nStrange chunk found:", message, "\n\n\n")
-                    message["content"] = str(message["content"])
-                if message["content"].strip() == "":
-                    new_message[
-                        "content"
-                    ] = "No output"  # I think it's best to be explicit, but we should test this.
-                else:
-                    new_message["content"] = message["content"]
-
-            else:
-                # This should be experimented with.
-                if interpreter.code_output_sender == "user":
-                    if message["content"].strip() == "":
-                        content = interpreter.empty_code_output_template
-                    else:
-                        content = interpreter.code_output_template.replace(
-                            "{content}", message["content"]
-                        )
-
-                    new_message["role"] = "user"
-                    new_message["content"] = content
-                elif interpreter.code_output_sender == "assistant":
-                    new_message["role"] = "assistant"
-                    new_message["content"] = (
-                        "\n```output\n" + message["content"] + "\n```"
-                    )
-
-        elif message["type"] == "image":
-            if message.get("format") == "description":
-                new_message["role"] = message["role"]
-                new_message["content"] = message["content"]
-            else:
-                if vision == False:
-                    # If no vision, we only support the format of "description"
-                    continue
-
-                if "base64" in message["format"]:
-                    # Extract the extension from the format, default to 'png' if not specified
-                    if "." in message["format"]:
-                        extension = message["format"].split(".")[-1]
-                    else:
-                        extension = "png"
-
-                    encoded_string = message["content"]
-
-                elif message["format"] == "path":
-                    # Convert to base64
-                    image_path = message["content"]
-                    extension = image_path.split(".")[-1]
-
-                    with open(image_path, "rb") as image_file:
-                        encoded_string = base64.b64encode(image_file.read()).decode(
-                            "utf-8"
-                        )
+    settings = (function_calling, vision, shrink_images)
+    if interpreter:
+        settings += (
+            interpreter.code_output_sender,
+            interpreter.code_output_template,
+            interpreter.empty_code_output_template,
+        )
+    converted = {}
 
-                else:
-                    # Probably would be better to move this to a validation pass
-                    # Near core, through the whole messages object
-                    if "format" not in message:
-                        raise Exception("Format of the image is not specified.")
-                    else:
-                        raise Exception(
-                            f"Unrecognized image format: {message['format']}"
-                        )
-
-                content = f"data:image/{extension};base64,{encoded_string}"
-
-                if shrink_images:
-                    # Shrink to less than 5mb
-
-                    # Calculate size
-                    content_size_bytes = sys.getsizeof(str(content))
-
-                    # Convert the size to MB
-                    content_size_mb = content_size_bytes / (1024 * 1024)
-
-                    # If the content size is greater than 5 MB, resize the image
-                    if content_size_mb > 5:
-                        # Decode the base64 image
-                        img_data = base64.b64decode(encoded_string)
-                        img = Image.open(io.BytesIO(img_data))
-
-                        # Run in a loop to make SURE it's less than 5mb
-                        for _ in range(10):
-                            # Calculate the scale factor needed to reduce the image size to 4.9 MB
-                            scale_factor = (4.9 / content_size_mb) ** 0.5
-
-                            # Calculate the new dimensions
-                            new_width = int(img.width * scale_factor)
-                            new_height = int(img.height * scale_factor)
-
-                            # Resize the image
-                            img = img.resize((new_width, new_height))
-
-                            # Convert the image back to base64
-                            buffered = io.BytesIO()
-                            img.save(buffered, format=extension)
-                            encoded_string = base64.b64encode(
-                                buffered.getvalue()
-                            ).decode("utf-8")
-
-                            # Set the content
-                            content = f"data:image/{extension};base64,{encoded_string}"
-
-                            # Recalculate the size of the content in bytes
-                            content_size_bytes = sys.getsizeof(str(content))
-
-                            # Convert the size to MB
-                            content_size_mb = content_size_bytes / (1024 * 1024)
-
-                            if content_size_mb < 5:
-                                break
-                        else:
-                            print(
-                                "Attempted to shrink the image but failed. Sending to the LLM anyway."
-                            )
-
-                new_message = {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {"url": content, "detail": "low"},
-                        }
-                    ],
-                }
+    last_user_message = None
+    for message in messages:
+        if message["role"] == "user":
+            last_user_message = message
 
-                if message["role"] == "computer":
-                    new_message["content"].append(
-                        {
-                            "type": "text",
-                            "text": "This image is the result of the last tool output. What does it mean / are we done?",
-                        }
-                    )
-                if message.get("format") == "path":
-                    if any(
-                        content.get("type") == "text"
-                        for content in new_message["content"]
-                    ):
-                        for content in new_message["content"]:
-                            if content.get("type") == "text":
-                                content["text"] += (
-                                    "\nThis image is at this path: "
-                                    + message["content"]
-                                )
-                    else:
-                        new_message["content"].append(
-                            {
-                                "type": "text",
-                                "text": "This image is at this path: "
-                                + message["content"],
-                            }
-                        )
+    for message in messages:
+        version = _message_version(message)
+        key = (id(message), settings, version)
+        if cache is not None and key in cache and cache[key][0] is message:
+            new_message = cache[key][1]
+        else:
+            new_message = _convert_message(
+                message, function_calling, vision, shrink_images, interpreter
+            )
+        if version is not None:
+            # Holding the message keeps its id from being reused while it's cached
+            converted[key] = (message, new_message)
 
-        elif message["type"] == "file":
-            new_message = {"role": "user", "content": message["content"]}
-        elif message["type"] == "error":
-            print("Ignoring 'type' == 'error' messages.")
+        if new_message is None:
             continue
-        else:
-            raise Exception(f"Unable to convert this message type: {message}")
+        new_message = dict(new_message)
 
-        if isinstance(new_message["content"], str):
-            new_message["content"] = new_message["content"].strip()
+        if (
+            message["type"] == "message"
+            and message["role"] == "user"
+            and (
+                message is last_user_message
+                or interpreter.always_apply_user_message_template
+            )
+        ):
+            new_message["content"] = interpreter.user_message_template.replace(
+                "{content}", message["content"]
+            ).strip()
 
         new_messages.append(new_message)
 
+    if cache is not None:
+        # Only the messages from this call are kept
+        cache.clear()
+        cache.update(converted)
+
     if function_calling == False:
         combined_messages = []
         current_role = None
@@ -287,3 +119,240 @@ def convert_to_openai_messages(
         new_messages = combined_messages
 
     return new_messages
+
+
+def _message_version(message):
+    """
+    Changes whenever the message does. None if it can't be told, so the message is always converted.
+    """
+    content = message.get("content")
+    if not isinstance(content, str):
+        return None
+    return (
+        message.get("type"),
+        message.get("role"),
+        message.get("format"),
+        message.get("recipient"),
+        message.get("tool_call_id"),
+        len(content),
+        hash(content),
+    )
+
+
+def _convert_message(message, function_calling, vision, shrink_images, interpreter):
+    """
+    Converts one LMC message into an OpenAI message, or None if it shouldn't be sent
+    """
+    # Is this for thine eyes?
+    if "recipient" in message and message["recipient"] != "assistant":
+        return None
+
+    new_message = {}
+
+    if message["type"] == "message":
+        new_message["role"] = message["role"]  # This should never be `computer`, right?
+        # The user message template is added by convert_to_openai_messages, as it depends on the other messages
+        new_message["content"] = message["content"]
+
+    elif message["type"] == "code":
+        new_message["role"] = "assistant"
+        if function_calling:
+            new_message["function_call"] = {
+                "name": "execute",
+                "arguments": json.dumps(
+                    {"language": message["format"], "code": message["content"]}
+                ),
+                # parsed_arguments isn't actually an OpenAI thing, it's an OI thing.
+                # but it's soo useful!
+                # "parsed_arguments": {
+                #     "language": message["format"],
+                #     "code": message["content"],
+                # },
+            }
+            if message.get("tool_call_id"):
+                # This was one of several tool calls the model made in a turn, so it keeps its id
+                new_message["tool_calls"] = [
+                    {
+                        "id": message["tool_call_id"],
+                        "type": "function",
+                        "function": new_message.pop("function_call"),
+                    }
+                ]
+            # Add empty content to avoid error "openai.error.InvalidRequestError: 'content' is a required property - 'messages.*'"
+            # especially for the OpenAI service hosted on Azure
+            new_message["content"] = ""
+        else:
+            new_message[
+                "content"
+            ] = f"""```{message["format"]}\n{message["content"]}\n```"""
+
+    elif message["type"] == "console" and message["format"] == "output":
+        if function_calling:
+            new_message["role"] = "function"
+            new_message["name"] = "execute"
+            if "content" not in message:
+                print("What is this??", content)
+            if type(message["content"]) != str:
+                if interpreter.debug:
+                    print("\n\n\nStrange chunk found:", message, "\n\n\n")
+                message["content"] = str(message["content"])
+            if message["content"].strip() == "":
+                new_message[
+                    "content"
+                ] = "No output"  # I think it's best to be explicit, but we should test this.
+            else:
+                new_message["content"] = message["content"]
+            if message.get("tool_call_id"):
+                new_message["role"] = "tool"
+                new_message["tool_call_id"] = message["tool_call_id"]
+                del new_message["name"]
+
+        else:
+            # This should be experimented with.
+            if interpreter.code_output_sender == "user":
+                if message["content"].strip() == "":
+                    content = interpreter.empty_code_output_template
+                else:
+                    content = interpreter.code_output_template.replace(
+                        "{content}", message["content"]
+                    )
+
+                new_message["role"] = "user"
+                new_message["content"] = content
+            elif interpreter.code_output_sender == "assistant":
+                new_message["role"] = "assistant"
+                new_message["content"] = "\n```output\n" + message["content"] + "\n```"
+
+    elif message["type"] == "image":
+        if message.get("format") == "description":
+            new_message["role"] = message["role"]
+            new_message["content"] = message["content"]
+        elif message.get("format") == REFERENCE_FORMAT:
+            # It's the same as an earlier image, which the model has already seen
+            new_message["role"] = "user"
+            new_message[
+                "content"
+            ] = "(This image is the same as an earlier one, so it isn't sent again.)"
+        else:
+            if vision == False:
+                # If no vision, we only support the format of "description"
+                return None
+
+            if "base64" in message["format"]:
+                # Extract the extension from the format, default to 'png' if not specified
+                if "." in message["format"]:
+                    extension = message["format"].split(".")[-1]
+                else:
+                    extension = "png"
+
+                encoded_string = message["content"]
+
+            elif message["format"] == "path":
+                # Convert to base64
+                image_path = message["content"]
+                extension = image_path.split(".")[-1]
+
+                with open(image_path, "rb") as image_file:
+                    encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
+
+            else:
+                # Probably would be better to move this to a validation pass
+                # Near core, through the whole messages object
+                if "format" not in message:
+                    raise Exception("Format of the image is not specified.")
+                else:
+                    raise Exception(f"Unrecognized image format: {message['format']}")
+
+            content = f"data:image/{extension};base64,{encoded_string}"
+
+            if shrink_images:
+                # Shrink to less than 5mb
+
+                # Calculate size
+                content_size_bytes = sys.getsizeof(str(content))
+
+                # Convert the size to MB
+                content_size_mb = content_size_bytes / (1024 * 1024)
+
+                # If the content size is greater than 5 MB, resize the image
+                if content_size_mb > 5:
+                    # Decode the base64 image. Encodings are cached, so an image is only shrunk once
+                    img = image_cache.open_base64(encoded_string)
+                    width, height = img.size
+
+                    # Run in a loop to make SURE it's less than 5mb
+                    for _ in range(10):
+                        # Calculate the scale factor needed to reduce the image size to 4.9 MB
+                        scale_factor = (4.9 / content_size_mb) ** 0.5
+
+                        # Calculate the new dimensions
+                        width = int(width * scale_factor)
+                        height = int(height * scale_factor)
+
+                        # Resize the image, and convert it back to base64
+                        encoded_string = image_cache.encode(
+                            img, extension, size=(width, height), as_base64=True
+                        )
+
+                        # Set the content
+                        content = f"data:image/{extension};base64,{encoded_string}"
+
+                        # Recalculate the size of the content in bytes
+                        content_size_bytes = sys.getsizeof(str(content))
+
+                        # Convert the size to MB
+                        content_size_mb = content_size_bytes / (1024 * 1024)
+
+                        if content_size_mb < 5:
+                            break
+                    else:
+                        print(
+                            "Attempted to shrink the image but failed. Sending to the LLM anyway."
+                        )
+
+            new_message = {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image_url",
+                        "image_url": {"url": content, "detail": "low"},
+                    }
+                ],
+            }
+
+            if message["role"] == "computer":
+                new_message["content"].append(
+                    {
+                        "type": "text",
+                        "text": "This image is the result of the last tool output. What does it mean / are we done?",
+                    }
+                )
+            if message.get("format") == "path":
+                if any(
+                    content.get("type") == "text" for content in new_message["content"]
+                ):
+                    for content in new_message["content"]:
+                        if content.get("type") == "text":
+                            content["text"] += (
+                                "\nThis image is at this path: " + message["content"]
+                            )
+                else:
+                    new_message["content"].append(
+                        {
+                            "type": "text",
+                            "text": "This image is at this path: " + message["content"],
+                        }
+                    )
+
+    elif message["type"] == "file":
+        new_message = {"role": "user", "content": message["content"]}
+    elif message["type"] == "error":
+        print("Ignoring 'type' == 'error' messages.")
+        return None
+    else:
+        raise Exception(f"Unable to convert this message type: {message}")
+
+    if isinstance(new_message["content"], str):
+        new_message["content"] = new_message["content"].strip()
+
+    return new_message
@@ -0,0 +1,236 @@
+import json
+import re
+
+# Inside a string, only these end a run of plain characters
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+# Where the parser is in the object
+(
+    _START,
+    _EXPECT_KEY,
+    _KEY,
+    _COLON,
+    _VALUE,
+    _STRING,
+    _OTHER,
+    _AFTER_VALUE,
+    _DONE,
+    _FAILED,
+) = range(10)
+
+
+class IncrementalJsonParser:
+    """
+    Parses a JSON object (like a tool call's arguments) as it streams in, keeping its place between chunks,
+    so each chunk is only read once.
+
+    `feed` returns the newly decoded characters of each string value, so they can be streamed on as they arrive.
+    A value is in `complete` once it's finished. If the text isn't a JSON object, `failed` is set and the rest is ignored.
+
+    Like parse_partial_json, it's forgiving of raw newlines in strings, which LLMs often send.
+    """
+
+    def __init__(self):
+        self.complete = {}  # key -> value, once the value is finished
+        self.failed = False
+        self._strings = {}  # key -> decoded parts of a string value
+        self._state = _START
+        self._key = None
+        self._key_parts = []
+        # While decoding an escape: "" after the backslash, then "u" and the hex digits of a \u escape
+        self._escape = None
+        self._high_surrogate = None
+        # The raw text of a value that isn't a string (numbers, lists...), and where we are in it
+        self._raw = []
+        self._depth = 0
+        self._raw_in_string = False
+        self._raw_escaped = False
+
+    def get(self, key, default=None):
+        """
+        A value, or as much of a string value as has arrived.
+        """
+        if key in self.complete:
+            return self.complete[key]
+        if key in self._strings:
+            return "".join(self._strings[key])
+        return default
+
+    def feed(self, text):
+        """
+        Parses the next chunk. Returns {key: new characters} for the string values it added to.
+        """
+        new = {}
+        i = 0
+        while i < len(text) and self._state not in (_DONE, _FAILED):
+            if self._state in (_KEY, _STRING):
+                i = self._read_string(text, i, new)
+                continue
+
+            char = text[i]
+            i += 1
+
+            if self._state == _OTHER:
+                if not self._read_other(char):
+                    # That ended the value, so it's read again as what comes after it
+                    i -= 1
+                continue
+
+            if char in " \t\r\n":
+                continue
+
+            if self._state == _START:
+                self._state = _EXPECT_KEY if char == "{" else _FAILED
+            elif self._state == _EXPECT_KEY:
+                if char == '"':
+                    self._state = _KEY
+                    self._key_parts = []
+                elif char == "}":
+                    self._state = _DONE
+                else:
+                    self._state = _FAILED
+            elif self._state == _COLON:
+                self._state = _VALUE if char == ":" else _FAILED
+            elif self._state == _VALUE:
+                if char == '"':
+                    self._state = _STRING
+                    self._strings[self._key] = []
+                else:
+                    self._state = _OTHER
+                    self._raw = []
+                    self._depth = 0
+                    self._read_other(char)
+            elif self._state == _AFTER_VALUE:
+                if char == ",":
+                    self._state = _EXPECT_KEY
+                elif char == "}":
+                    self._state = _DONE
+                else:
+                    self._state = _FAILED
+
+        if self._state == _FAILED:
+            self.failed = True
+        return {key: "".join(parts) for key, parts in new.items()}
+
+    def _read_string(self, text, i, new):
+        """
+        Decodes as much of the current key or string value as `text` has, from `i`. Returns where it stopped.
+        """
+        if self._state == _KEY:
+            parts = self._key_parts
+            new_parts = None
+        else:
+            parts = self._strings[self._key]
+            new_parts = new.setdefault(self._key, [])
+
+        def add(decoded):
+            if self._high_surrogate is not None:
+                # Not followed by the other half of its pair
+                self._high_surrogate = None
+                add("\ufffd")
+            parts.append(decoded)
+            if new_parts is not None:
+                new_parts.append(decoded)
+
+        while i < len(text):
+            if self._escape is not None:
+                char = text[i]
+                i += 1
+                if self._escape == "":
+                    if char == "u":
+                        self._escape = "u"
+                    else:
+                        self._escape = None
+                        add(_ESCAPES.get(char, char))
+                    continue
+                self._escape += char
+                if len(self._escape) < 5:
+                    continue
+                hex_digits, self._escape = self._escape[1:], None
+                try:
+                    code_point = int(hex_digits, 16)
+                except ValueError:
+                    add("\\u" + hex_digits)
+                    continue
+                if 0xD800 <= code_point < 0xDC00:
+                    if self._high_surrogate is not None:
+                        self._high_surrogate = None
+                        add("\ufffd")
+                    # Held until we see if the other half of the pair follows
+                    self._high_surrogate = code_point
+                elif 0xDC00 <= code_point < 0xE000 and self._high_surrogate is not None:
+                    code_point = (
+                        0x10000
+                        + ((self._high_surrogate - 0xD800) << 10)
+                        + (code_point - 0xDC00)
+                    )
+                    self._high_surrogate = None
+                    add(chr(code_point))
+                else:
+                    add(chr(code_point))
+                continue
+
+            match = _STRING_SPECIAL.search(text, i)
+            end = match.start() if match else len(text)
+            if end > i:
+                add(text[i:end])
+            if not match:
+                return len(text)
+            i = end + 1
+
+            if match.group() == "\\":
+                self._escape = ""
+                continue
+
+            # The end of the string
+            if self._high_surrogate is not None:
+                self._high_surrogate = None
+                add("\ufffd")
+            if self._state == _KEY:
+                self._key = "".join(self._key_parts)
+                self._state = _COLON
+            else:
+                self.complete[self._key] = "".join(parts)
+                self._state = _AFTER_VALUE
+            return i
+
+        return i
+
+    def _read_other(self, char):
+        """
+        Reads a character of a value that isn't a string. Returns False if the character isn't part of it.
+        """
+        if self._raw_in_string:
+            if self._raw_escaped:
+                self._raw_escaped = False
+            elif char == "\\":
+                self._raw_escaped = True
+            elif char == '"':
+                self._raw_in_string = False
+        elif char == '"':
+            self._raw_in_string = True
+        elif char in "[{":
+            self._depth += 1
+        elif char in "]}" and self._depth > 0:
+            self._depth -= 1
+        elif char in ",}" and self._depth == 0:
+            try:
+                self.complete[self._key] = json.loads("".join(self._raw))
+            except ValueError:
+                self._state = _FAILED
+                return False
+            self._state = _AFTER_VALUE
+            return False
+        self._raw.append(char)
+        return True
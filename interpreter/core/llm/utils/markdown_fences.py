@@ -0,0 +1,76 @@
+class FenceParser:
+    """
+    Splits streamed markdown into text and ``` fenced code blocks, as it arrives.
+
+    Each character is read once, so it costs the same per token however long the reply gets.
+    Backticks at the end of a chunk are held until the next one shows whether they're a fence.
+    """
+
+    def __init__(self):
+        self.inside_code_block = False
+        self._ticks = 0  # Backticks in a row that haven't been sent on yet
+        self._info = None  # The line after an opening fence (its language), while it's being read
+
+    def feed(self, text):
+        """
+        Returns a list of events for the new text:
+        ("message", text), ("code_start", the line after the fence), ("code", text) and ("code_end", None).
+        """
+        events = []
+
+        def add(kind, content):
+            if events and events[-1][0] == kind:
+                events[-1] = (kind, events[-1][1] + content)
+            else:
+                events.append((kind, content))
+
+        i = 0
+        while i < len(text):
+            if self._info is not None:
+                end = text.find("\n", i)
+                if end == -1:
+                    self._info.append(text[i:])
+                    break
+                self._info.append(text[i:end])
+                events.append(("code_start", "".join(self._info)))
+                self._info = None
+                self.inside_code_block = True
+                i = end + 1
+                continue
+
+            kind = "code" if self.inside_code_block else "message"
+
+            if text[i] == "`":
+                self._ticks += 1
+                i += 1
+                if self._ticks == 3:
+                    self._ticks = 0
+                    if self.inside_code_block:
+                        self.inside_code_block = False
+                        events.append(("code_end", None))
+                    else:
+                        self._info = []
+                continue
+
+            # They weren't a fence, just backticks
+            if self._ticks:
+                add(kind, "`" * self._ticks)
+                self._ticks = 0
+
+            end = text.find("`", i)
+            if end == -1:
+                end = len(text)
+            add(kind, text[i:end])
+            i = end
+
+        return events
+
+    def end(self):
+        """
+        Returns the events for anything held back, once the stream is over.
+        """
+        if self._ticks:
+            kind = "code" if self.inside_code_block else "message"
+            ticks, self._ticks = self._ticks, 0
+            return [(kind, "`" * ticks)]
+        return []
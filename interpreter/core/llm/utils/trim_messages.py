@@ -0,0 +1,188 @@
+"""
+Trims OpenAI messages to fit the context window.
+
+Token counts are remembered per message, keyed by the model and a hash of each of the message's fields,
+so each turn only tokenizes the messages that are new. If the conversation doesn't fit, old images are dropped first,
+then old console outputs are emptied, then the oldest messages are dropped.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+
+from ....terminal_interface.utils.count_tokens import get_encoder
+
+# Like tokentrim's counts for a model it doesn't know
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_NAME = 2
+TOKENS_PER_REPLY = 3
+
+# What OpenAI charges for an image at "low" detail, which is how they're sent
+IMAGE_TOKENS = 85
+
+OUTPUT_REMOVED = "(This output was removed to fit the context window.)"
+
+MAX_CACHED_COUNTS = 10000
+
+_counts = OrderedDict()
+_counts_lock = threading.Lock()
+
+
+def count_message_tokens(message, model="gpt-4"):
+    """
+    The number of tokens a message takes up, with `model`'s tokenizer. Each message's count is only worked out once.
+    """
+    key = _key(message, model)
+
+    with _counts_lock:
+        if key in _counts:
+            _counts.move_to_end(key)
+            return _counts[key]
+
+    tokens = _count(message, model)
+
+    with _counts_lock:
+        _counts[key] = tokens
+        if len(_counts) > MAX_CACHED_COUNTS:
+            _counts.popitem(last=False)
+    return tokens
+
+
+def _key(message, model):
+    """
+    Changes whenever the message's count could. Strings cache their hash, so this doesn't re-read long contents.
+    """
+    key = [model]
+    for name, value in message.items():
+        if isinstance(value, str):
+            key.append((name, len(value), hash(value)))
+        elif name == "content" and isinstance(value, list):
+            for part in value:
+                if part.get("type") == "image_url":
+                    # Every image counts the same
+                    key.append("image")
+                elif isinstance(part.get("text"), str):
+                    key.append((len(part["text"]), hash(part["text"])))
+                else:
+                    key.append(json.dumps(part, sort_keys=True, default=str))
+        else:
+            # Small, like tool calls
+            key.append((name, json.dumps(value, sort_keys=True, default=str)))
+    return tuple(key)
+
+
+def _count(message, model="gpt-4"):
+    encoder = get_encoder(model)
+
+    def encoded_length(text):
+        return len(encoder.encode(str(text), disallowed_special=()))
+
+    tokens = TOKENS_PER_MESSAGE
+    for key, value in message.items():
+        if key == "content" and isinstance(value, list):
+            for part in value:
+                if part.get("type") == "image_url":
+                    tokens += IMAGE_TOKENS
+                else:
+                    tokens += encoded_length(part.get("text", part))
+        else:
+            tokens += encoded_length(value)
+            if key == "name":
+                tokens += TOKENS_PER_NAME
+    return tokens
+
+
+def _has_image(message):
+    return isinstance(message.get("content"), list) and any(
+        part.get("type") == "image_url" for part in message["content"]
+    )
+
+
+def _is_output(message, output_prefixes):
+    if message["role"] in ("tool", "function"):
+        return True
+    content = message.get("content")
+    return isinstance(content, str) and any(
+        prefix and content.startswith(prefix) for prefix in output_prefixes
+    )
+
+
+def _shorten(message, max_tokens, model):
+    """
+    Removes characters from the middle of a message's content until it fits in `max_tokens`.
+    """
+    for _ in range(12):
+        tokens = _count(message, model)
+        content = message.get("content")
+        if tokens <= max_tokens or not isinstance(content, str):
+            break
+        half = int(len(content) * max(max_tokens, 0) / tokens) // 2
+        message = dict(
+            message,
+            content=content[:half] + "..." + content[-half:] if half else "...",
+        )
+    return message
+
+
+def trim_messages(
+    messages,
+    system_message,
+    max_tokens,
+    output_prefixes=(),
+    model="gpt-4",
+    system_tokens=None,
+):
+    """
+    Returns the system message followed by as much of `messages` as fits in `max_tokens` of `model`'s tokens.
+
+    `output_prefixes` are how console outputs start when they're sent as user messages.
+    Messages that are changed are copied, so `messages` is left alone.
+    `system_tokens` is the system message's count, if it's already known.
+    """
+    system = {"role": "system", "content": system_message}
+    if system_tokens is None:
+        system_tokens = count_message_tokens(system, model)
+    if system_tokens > max_tokens:
+        system = _shorten(system, max_tokens, model)
+        system_tokens = _count(system, model)
+
+    budget = max_tokens - system_tokens - TOKENS_PER_REPLY
+    messages = list(messages)
+    counts = [count_message_tokens(message, model) for message in messages]
+    total = sum(counts)
+
+    if total <= budget:
+        return [system] + messages
+
+    # The newest message is never dropped or emptied
+    old = range(len(messages) - 1)
+
+    for i in old:
+        if total <= budget:
+            break
+        if _has_image(messages[i]):
+            total -= counts[i]
+            messages[i] = None
+
+    for i in old:
+        if total <= budget:
+            break
+        if messages[i] is not None and _is_output(messages[i], output_prefixes):
+            messages[i] = dict(messages[i], content=OUTPUT_REMOVED)
+            tokens = count_message_tokens(messages[i], model)
+            total += tokens - counts[i]
+            counts[i] = tokens
+
+    kept = [(m, c) for m, c in zip(messages, counts) if m is not None]
+
+    while total > budget and len(kept) > 1:
+        total -= kept.pop(0)[1]
+        # Outputs can't be sent without the tool call they answer
+        while len(kept) > 1 and kept[0][0]["role"] in ("tool", "function"):
+            total -= kept.pop(0)[1]
+
+    messages = [message for message, _ in kept]
+    if total > budget and messages:
+        messages[-1] = _shorten(messages[-1], budget, model)
+
+    return [system] + messages
@@ -1,4 +1,101 @@
+import ast
+import io
 import re
+import threading
+import time
+import traceback
+
+
+class RenderCache:
+    """
+    Remembers the output of the {{ }} blocks in dynamic messages, so they aren't re-run on every LLM round trip.
+
+    Outputs are kept until `invalidate()` is called (at the start of each turn, and after code runs, since that's what usually changes them)
+    or until their TTL runs out. `default_ttl` is in seconds, None means no expiry.
+    A block can set its own TTL with a comment like `# render_ttl: 30`. A TTL of 0 means the block is never cached.
+    """
+
+    def __init__(self, default_ttl=None):
+        self.default_ttl = default_ttl
+        self._outputs = {}  # code -> (output, expires_at)
+        self._lock = threading.Lock()
+
+        # Globals for the "local" render evaluator, which runs blocks outside the user's kernel
+        self.namespace = {}
+        self.namespace_lock = threading.Lock()
+
+    def ttl(self, code):
+        match = re.search(
+            r"^\s*#\s*render_ttl:\s*([\d.]+)\s*$", code, flags=re.MULTILINE
+        )
+        if match:
+            return float(match.group(1))
+        return self.default_ttl
+
+    def get(self, code):
+        with self._lock:
+            output, expires_at = self._outputs.get(code, (None, None))
+            if expires_at is not None and time.time() >= expires_at:
+                del self._outputs[code]
+                return None
+            return output
+
+    def set(self, code, output):
+        ttl = self.ttl(code)
+        if ttl == 0:
+            return
+        expires_at = None if ttl is None else time.time() + ttl
+        with self._lock:
+            self._outputs[code] = (output, expires_at)
+
+    def invalidate(self, code=None):
+        """
+        Forgets the output of one block, or of every block if `code` is None.
+        """
+        with self._lock:
+            if code is None:
+                self._outputs.clear()
+            else:
+                self._outputs.pop(code, None)
+
+
+def run_locally(interpreter, code):
+    """
+    Runs a block in this process instead of the user's kernel, so it doesn't wait behind user code.
+    Like Jupyter, the value of a trailing expression is printed.
+
+    Output is captured by giving the block its own `print`, rather than redirecting sys.stdout,
+    which would also capture what other threads print. So only printed output is rendered.
+    """
+    stdout = io.StringIO()
+
+    def local_print(*args, **kwargs):
+        kwargs.setdefault("file", stdout)
+        print(*args, **kwargs)
+
+    cache = interpreter.render_cache
+    with cache.namespace_lock:
+        namespace = cache.namespace
+        namespace.setdefault("computer", interpreter.computer)
+        namespace["print"] = local_print
+        try:
+            tree = ast.parse(code)
+            last_expression = None
+            if tree.body and isinstance(tree.body[-1], ast.Expr):
+                last_expression = ast.Expression(tree.body.pop().value)
+            exec(compile(tree, "<render_message>", "exec"), namespace)
+            if last_expression is not None:
+                value = eval(
+                    compile(last_expression, "<render_message>", "eval"), namespace
+                )
+                if value is not None:
+                    local_print(repr(value))
+        except Exception:
+            local_print(traceback.format_exc())
+        finally:
+            del namespace["print"]
+
+    return [{"type": "console", "format": "output", "content": stdout.getvalue()}]
 
 
 def render_message(interpreter, message):
@@ -15,10 +112,20 @@ def render_message(interpreter, message):
     for i, part in enumerate(parts):
         # If the part is enclosed in {{ and }}
         if part.startswith("{{") and part.endswith("}}"):
+            code = part[2:-2].strip()
+
+            cached_output = interpreter.render_cache.get(code)
+            if cached_output is not None:
+                parts[i] = cached_output
+                continue
+
             # Run the code inside the brackets
-            output = interpreter.computer.run(
-                "python", part[2:-2].strip(), display=interpreter.verbose
-            )
+            if interpreter.render_evaluator == "local":
+                output = run_locally(interpreter, code)
+            else:
+                output = interpreter.computer.run(
+                    "python", code, display=interpreter.verbose
+                )
 
             # Extract the output content
             outputs = (
@@ -30,6 +137,7 @@ def render_message(interpreter, message):
 
             # Replace the part with the output
             parts[i] = "\n".join(outputs)
+            interpreter.render_cache.set(code, parts[i])
 
     # Join the parts back into the message
     rendered_message = "".join(parts).strip()
@@ -9,6 +9,9 @@ import litellm
 
 from ..terminal_interface.utils.display_markdown_message import display_markdown_message
 from .render_message import render_message
+from .utils.output_spool import OutputSpool
+from .utils.prompt_cache import static_system_message
+from .utils.tool_calls import PendingToolCalls
 
 
 def respond(interpreter):
@@ -19,27 +22,17 @@ def respond(interpreter):
 
     last_unsupported_code = ""
     insert_loop_message = False
+    pending_tool_calls = PendingToolCalls()
 
     while True:
-        ## RENDER SYSTEM MESSAGE ##
-
-        system_message = interpreter.system_message
+        # The model made several tool calls last turn. Run the next one before going back to it
+        if pending_tool_calls and interpreter.messages[-1]["type"] != "code":
+            yield pending_tool_calls.pop()
 
-        # Add language-specific system messages
-        for language in interpreter.computer.terminal.languages:
-            if hasattr(language, "system_message"):
-                system_message += "\n\n" + language.system_message
-
-        # Add custom instructions
-        if interpreter.custom_instructions:
-            system_message += "\n\n" + interpreter.custom_instructions
+        ## RENDER SYSTEM MESSAGE ##
 
-        # Add computer API system message
-        if interpreter.computer.import_computer_api:
-            if interpreter.computer.system_message not in system_message:
-                system_message = (
-                    system_message + "\n\n" + interpreter.computer.system_message
-                )
+        # Everything but the {{ }} blocks is assembled once, then reused across turns
+        system_message = static_system_message(interpreter)
 
         # Storing the messages so they're accessible in the interpreter's computer
         # no... this is a huge time sink.....
@@ -49,7 +42,16 @@ def respond(interpreter):
         #     )
 
         ## Rendering ↓
-        rendered_system_message = render_message(interpreter, system_message)
+        # (Unless we're about to run code instead of calling the LLM, or there's nothing to render.
+        # Then it's sent as it is, and Llm.run can tell it's the static message and reuse its token count)
+        if (
+            "{{" in system_message
+            and interpreter.messages
+            and interpreter.messages[-1]["type"] != "code"
+        ):
+            rendered_system_message = render_message(interpreter, system_message)
+        else:
+            rendered_system_message = system_message
         ## Rendering ↑
 
         rendered_system_message = {
@@ -84,7 +86,23 @@ def respond(interpreter):
             interpreter.messages[-1]["type"] != "code"
         ):  # If it is, we should run the code (we do below)
             try:
+                first_tool_call_id = None
+                warmed_up = set()
                 for chunk in interpreter.llm.run(messages_for_llm):
+                    # Start the code's language while the rest of the code is written, so it's ready to run it
+                    if chunk["type"] == "code" and chunk["format"] not in warmed_up:
+                        warmed_up.add(chunk["format"])
+                        interpreter.computer.terminal.warm_up(
+                            chunk["format"].lower().strip()
+                        )
+
+                    # Tool calls after the first are shown and run once it's done
+                    if chunk.get("tool_call_id"):
+                        if first_tool_call_id is None:
+                            first_tool_call_id = chunk["tool_call_id"]
+                        elif chunk["tool_call_id"] != first_tool_call_id:
+                            pending_tool_calls.add(chunk)
+                            continue
                     yield {"role": "assistant", **chunk}
 
             except litellm.exceptions.BudgetExceededError:
@@ -166,6 +184,11 @@ def respond(interpreter):
             if interpreter.verbose:
                 print("Running code:", interpreter.messages[-1])
 
+            # Output is tagged with the tool call it answers, if the model made one
+            tool_call = {}
+            if interpreter.messages[-1].get("tool_call_id"):
+                tool_call["tool_call_id"] = interpreter.messages[-1]["tool_call_id"]
+
             try:
                 # What language/code do you want to run?
                 language = interpreter.messages[-1]["format"].lower().strip()
@@ -263,6 +286,7 @@ def respond(interpreter):
                         "type": "console",
                         "format": "output",
                         "content": output,
+                        **tool_call,
                     }
 
                     # Let the response continue so it can deal with the unsupported code in another way. Also prevent looping on the same piece of code.
@@ -279,6 +303,7 @@ def respond(interpreter):
                         "type": "console",
                         "format": "output",
                         "content": "Code block was empty. Please try again, be sure to write code before executing.",
+                        **tool_call,
                     }
                     continue
 
@@ -304,32 +329,7 @@ def respond(interpreter):
                     "content"
                 ]
 
-                # don't let it import computer — we handle that!
-                if interpreter.computer.import_computer_api and language == "python":
-                    code = code.replace("import computer\n", "pass\n")
-                    code = re.sub(
-                        r"import computer\.(\w+) as (\w+)", r"\2 = computer.\1", code
-                    )
-                    code = re.sub(
-                        r"from computer import (.+)",
-                        lambda m: "\n".join(
-                            f"{x.strip()} = computer.{x.strip()}"
-                            for x in m.group(1).split(", ")
-                        ),
-                        code,
-                    )
-                    code = re.sub(r"import computer\.\w+\n", "pass\n", code)
-                    # If it does this it sees the screenshot twice (which is expected jupyter behavior)
-                    if any(
-                        code.strip().split("\n")[-1].startswith(text)
-                        for text in [
-                            "computer.display.view",
-                            "computer.display.screenshot",
-                            "computer.view",
-                            "computer.screenshot",
-                        ]
-                    ):
-                        code = code + "\npass"
+                code = prepare_code(interpreter, language, code)
 
                 # sync up some things (is this how we want to do this?)
                 interpreter.computer.verbose = interpreter.verbose
@@ -337,9 +337,24 @@ def respond(interpreter):
                 interpreter.computer.emit_images = interpreter.llm.supports_vision
                 interpreter.computer.max_output = interpreter.max_output
 
+                # Was this tool call already started, alongside an earlier one?
+                background_run = pending_tool_calls.take_run(
+                    tool_call.get("tool_call_id")
+                )
+                if (
+                    interpreter.parallel_tool_calls
+                    and interpreter.auto_run
+                    and background_run is None
+                ):
+                    start_tool_calls(interpreter, pending_tool_calls)
+
                 # sync up the interpreter's computer with your computer
                 try:
-                    if interpreter.sync_computer and language == "python":
+                    if (
+                        interpreter.sync_computer
+                        and language == "python"
+                        and background_run is None
+                    ):
                         computer_dict = interpreter.computer.to_dict()
                         if "_hashes" in computer_dict:
                             computer_dict.pop("_hashes")
@@ -356,14 +371,35 @@ def respond(interpreter):
 
                 ## ↓ CODE IS RUN HERE
 
-                for line in interpreter.computer.run(language, code, stream=True):
-                    yield {"role": "computer", **line}
+                # The full output is spilled to disk, messages only keep the start and end of it
+                output_spool = OutputSpool()
+                if background_run is None:
+                    lines = interpreter.computer.run(language, code, stream=True)
+                else:
+                    lines = background_run
+                try:
+                    for line in lines:
+                        if line["type"] == "console" and line.get("format") == "output":
+                            output_spool.write(line["content"])
+                        yield {"role": "computer", **line, **tool_call}
+                finally:
+                    if "get_last_output" in code:
+                        # Paging through the last output shouldn't replace it
+                        output_spool.delete()
+                    else:
+                        interpreter.computer.terminal._store_last_output(output_spool)
+                    # Running code can change what {{ }} blocks in the system message render to
+                    interpreter.render_cache.invalidate()
 
                 ## ↑ CODE IS RUN HERE
 
                 # sync up your computer with the interpreter's computer
                 try:
-                    if interpreter.sync_computer and language == "python":
+                    if (
+                        interpreter.sync_computer
+                        and language == "python"
+                        and background_run is None
+                    ):
                         # sync up the interpreter's computer with your computer
                         result = interpreter.computer.run(
                             "python",
@@ -394,6 +430,7 @@ def respond(interpreter):
                     "type": "console",
                     "format": "active_line",
                     "content": None,
+                    **tool_call,
                 }
 
             except KeyboardInterrupt:
@@ -404,6 +441,7 @@ def respond(interpreter):
                     "type": "console",
                     "format": "output",
                     "content": traceback.format_exc(),
+                    **tool_call,
                 }
 
         else:
@@ -457,3 +495,52 @@ def respond(interpreter):
             break
 
     return
+
+
+def prepare_code(interpreter, language, code):
+    """
+    Rewrites code before it's run.
+    """
+    # don't let it import computer — we handle that!
+    if interpreter.computer.import_computer_api and language == "python":
+        code = code.replace("import computer\n", "pass\n")
+        code = re.sub(r"import computer\.(\w+) as (\w+)", r"\2 = computer.\1", code)
+        code = re.sub(
+            r"from computer import (.+)",
+            lambda m: "\n".join(
+                f"{x.strip()} = computer.{x.strip()}" for x in m.group(1).split(", ")
+            ),
+            code,
+        )
+        code = re.sub(r"import computer\.\w+\n", "pass\n", code)
+        # If it does this it sees the screenshot twice (which is expected jupyter behavior)
+        if any(
+            code.strip().split("\n")[-1].startswith(text)
+            for text in [
+                "computer.display.view",
+                "computer.display.screenshot",
+                "computer.view",
+                "computer.screenshot",
+            ]
+        ):
+            code = code + "\npass"
+    return code
+
+
+def start_tool_calls(interpreter, pending_tool_calls):
+    """
+    Starts the pending tool calls on their own language instances, so they run alongside the current one.
+    Calls that can't run (unsupported language, no code) are left to be reported when their turn comes.
+    """
+    for call in pending_tool_calls.calls:
+        language = call["format"].lower().strip()
+        if (
+            interpreter.computer.terminal.get_language(language) is None
+            or call["content"].strip() == ""
+        ):
+            continue
+        pending_tool_calls.start(
+            interpreter.computer,
+            call,
+            prepare_code(interpreter, language, call["content"]),
+        )
@@ -0,0 +1,372 @@
+"""
+Runs the server as several worker processes behind one port (`interpreter --server --workers N`),
+so busy sessions aren't limited to the one core a process can use.
+
+Each worker is a whole server on a local port, started with the same command line (so the same profile and flags).
+The router, in this process, pins each session to a worker by a hash of its id, and proxies the session's
+HTTP requests and WebSocket frames there. Requests without a session id go to the first worker.
+Workers authenticate requests themselves, as the router passes everything through.
+
+A worker that exits is restarted on the same port. Only the sessions it had are lost.
+"""
+
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from urllib.parse import urlencode
+
+from .utils.lmc_framing import choose_subprotocol
+
+try:
+    import httpx
+    import uvicorn
+    from fastapi import FastAPI, Request, WebSocket
+    from fastapi.responses import JSONResponse, StreamingResponse
+    from starlette.background import BackgroundTask
+except:
+    # Server dependencies are not required by the main package.
+    pass
+
+# Set for worker processes, to the port they should serve on
+WORKER_PORT_VARIABLE = "INTERPRETER_WORKER_PORT"
+
+# Headers about one connection (rather than the request), which aren't proxied
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "content-length",
+    "host",
+    "keep-alive",
+    "transfer-encoding",
+    "upgrade",
+}
+
+# How long a request waits for its worker to come back, if it's restarting
+CONNECT_TIMEOUT = 10
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def worker_command(argv):
+    """
+    The command that starts a worker: this one (`argv`), without `--workers`.
+    """
+    args = []
+    skip = False
+    for arg in argv[1:]:
+        if skip:
+            skip = False
+        elif arg == "--workers":
+            skip = True
+        elif not arg.startswith("--workers="):
+            args.append(arg)
+    script = "from interpreter.terminal_interface.start_terminal_interface import main; main()"
+    return [sys.executable, "-c", script] + args
+
+
+class Worker:
+    def __init__(self, index, command, port):
+        self.index = index
+        self.command = command
+        self.port = port
+        self.process = None
+        self.started = 0
+        self.failures = 0  # Times in a row it's exited soon after starting
+        self.restart_at = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        env = dict(os.environ, **{WORKER_PORT_VARIABLE: str(self.port)})
+        self.process = subprocess.Popen(self.command, env=env)
+        self.started = time.monotonic()
+
+    def stop(self):
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class WorkerPool:
+    def __init__(self, count, command, ports=None):
+        ports = ports or [free_port() for _ in range(count)]
+        self.workers = [Worker(i, command, port) for i, port in enumerate(ports)]
+        self._stopping = threading.Event()
+
+    def worker_for(self, session_id):
+        """
+        The worker a session is pinned to. Requests without a session go to the first worker.
+        """
+        if not session_id:
+            return self.workers[0]
+        index = zlib.crc32(str(session_id).encode("utf-8")) % len(self.workers)
+        return self.workers[index]
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        threading.Thread(target=self._supervise, daemon=True).start()
+
+    def wait_until_ready(self, timeout=120):
+        """
+        Waits for every worker to answer /heartbeat. Returns whether they all did.
+        """
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            while True:
+                try:
+                    httpx.get(worker.url + "/heartbeat", timeout=1).raise_for_status()
+                    break
+                except httpx.HTTPError:
+                    if time.monotonic() > deadline:
+                        return False
+                    time.sleep(0.25)
+        return True
+
+    def stop(self):
+        self._stopping.set()
+        for worker in self.workers:
+            worker.stop()
+
+    def _supervise(self):
+        """
+        Restarts workers that exit. One that keeps exiting as it starts is restarted less and less often.
+        """
+        while not self._stopping.wait(0.5):
+            for worker in self.workers:
+                code = worker.process.poll()
+                if code is None or self._stopping.is_set():
+                    continue
+                now = time.monotonic()
+                if worker.restart_at is None:
+                    if now - worker.started < 10:
+                        worker.failures += 1
+                    else:
+                        worker.failures = 0
+                    delay = min(2**worker.failures - 1, 30)
+                    print(
+                        f"Worker {worker.index} exited with code {code}. Restarting it in {delay}s."
+                    )
+                    worker.restart_at = now + delay
+                if now >= worker.restart_at:
+                    worker.restart_at = None
+                    worker.start()
+
+
+def session_from_auth_message(message):
+    """
+    The session id in a WebSocket auth message (`{"auth": key, "session": id}`), if there is one.
+    """
+    try:
+        data = json.loads(message.get("text") or "")
+        return data.get("session") if isinstance(data, dict) else None
+    except ValueError:
+        return None
+
+
+def session_from_openai_body(body):
+    """
+    The `user` of an OpenAI-compatible request, which the server uses as its session id.
+    """
+    try:
+        data = json.loads(body or b"")
+        return data.get("user") if isinstance(data, dict) else None
+    except ValueError:
+        return None
+
+
+async def connect_websocket(url, subprotocols=None):
+    try:
+        from websockets.asyncio.client import connect
+    except ImportError:
+        # Older websockets
+        from websockets import connect
+
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    while True:
+        try:
+            return await connect(url, max_size=None, subprotocols=subprotocols)
+        except OSError:
+            # The worker is (re)starting
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.25)
+
+
+def create_worker_router(pool):
+    """
+    The router's app, which proxies every request to the worker its session is pinned to.
+    """
+    app = FastAPI()
+    client = httpx.AsyncClient(timeout=None)
+    require_auth = os.getenv("INTERPRETER_REQUIRE_AUTH") != "False"
+
+    @app.websocket("/{path:path}")
+    async def proxy_websocket(websocket: WebSocket, path: str):
+        # Only needed for WebSockets, so HTTP is proxied without it
+        from websockets.exceptions import ConnectionClosed
+
+        # Accepted before the worker is connected to (as the session can be in the first frame),
+        # with the subprotocol the worker will choose
+        subprotocols = websocket.scope.get("subprotocols", [])
+        await websocket.accept(subprotocol=choose_subprotocol(subprotocols))
+        session_id = websocket.headers.get(
+            "X-Session-ID"
+        ) or websocket.query_params.get("session")
+
+        first = None
+        if not session_id and require_auth:
+            # The session can be given with the auth message, which comes first
+            first = await websocket.receive()
+            if first["type"] == "websocket.disconnect":
+                return
+            session_id = session_from_auth_message(first)
+
+        worker = pool.worker_for(session_id)
+        query = dict(websocket.query_params)
+        if session_id:
+            # So the worker gets it however the client sent it
+            query["session"] = session_id
+        url = f"ws://127.0.0.1:{worker.port}/{path}"
+        if query:
+            url += "?" + urlencode(query)
+
+        try:
+            upstream = await connect_websocket(url, subprotocols or None)
+        except Exception:
+            await websocket.close(code=1013)  # Try again later
+            return
+
+        async def forward():
+            message = first
+            while True:
+                if message is None:
+                    message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                if message.get("text") is not None:
+                    await upstream.send(message["text"])
+                elif message.get("bytes") is not None:
+                    await upstream.send(message["bytes"])
+                message = None
+
+        async def backward():
+            try:
+                async for message in upstream:
+                    if isinstance(message, str):
+                        await websocket.send_text(message)
+                    else:
+                        await websocket.send_bytes(message)
+            except ConnectionClosed:
+                pass
+
+        tasks = [asyncio.create_task(forward()), asyncio.create_task(backward())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await upstream.close()
+
+        code = getattr(upstream, "close_code", None)
+        if code == 1006:
+            code = 1012  # The worker went away, and is restarting
+        elif code in (None, 1005, 1015):
+            code = 1000
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            # Non-essential, the client already left
+            pass
+
+    @app.api_route(
+        "/{path:path}",
+        methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "HEAD"],
+    )
+    async def proxy_http(request: Request, path: str):
+        body = await request.body()
+        session_id = request.headers.get("X-Session-ID")
+        if not session_id and request.url.path.startswith("/openai"):
+            session_id = session_from_openai_body(body)
+        worker = pool.worker_for(session_id)
+
+        url = worker.url + request.url.path
+        if request.url.query:
+            url += "?" + request.url.query
+        headers = [
+            (key, value)
+            for key, value in request.headers.items()
+            if key.lower() not in HOP_BY_HOP_HEADERS
+        ]
+        upstream_request = client.build_request(
+            request.method, url, headers=headers, content=body
+        )
+
+        deadline = time.monotonic() + CONNECT_TIMEOUT
+        while True:
+            try:
+                response = await client.send(upstream_request, stream=True)
+                break
+            except httpx.ConnectError:
+                # The worker is (re)starting
+                if time.monotonic() > deadline:
+                    return JSONResponse(
+                        status_code=503,
+                        content={"detail": f"Worker {worker.index} is unavailable"},
+                    )
+                await asyncio.sleep(0.25)
+
+        return StreamingResponse(
+            response.aiter_raw(),
+            status_code=response.status_code,
+            headers={
+                key: value
+                for key, value in response.headers.items()
+                if key.lower() not in HOP_BY_HOP_HEADERS
+            },
+            background=BackgroundTask(response.aclose),
+        )
+
+    return app
+
+
+def run_workers(async_interpreter, count):
+    """
+    Serves on `async_interpreter.server`'s host and port, with `count` workers behind it.
+    """
+    host = async_interpreter.server.host
+    port = async_interpreter.server.port
+    pool = WorkerPool(count, worker_command(sys.argv))
+    pool.start()
+    try:
+        print(f"Starting {count} workers...")
+        if not pool.wait_until_ready():
+            print(
+                "Some workers haven't started yet. Their requests will wait for them."
+            )
+        if host == "0.0.0.0":
+            print(
+                "Warning: Using host `0.0.0.0` will expose Open Interpreter over your local network."
+            )
+        print(f"Server will run at http://{host}:{port}, with {count} workers")
+        # Uvicorn raises SIGTERM again once it's shut down, so this makes that stop the workers too
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+        uvicorn.run(create_worker_router(pool), host=host, port=port)
+    finally:
+        pool.stop()
@@ -0,0 +1,101 @@
+"""
+Delivery of the server's WebSocket frames that clients acknowledge (with `INTERPRETER_REQUIRE_ACKNOWLEDGE`).
+
+Up to `size` frames can be waiting for their acknowledgement at once, so streaming isn't held up by the round trip.
+A frame that isn't acknowledged within `timeout` seconds is sent again (waiting twice as long each time, up to 8x),
+so clients should ignore a frame whose id they've already seen. Frames still unacknowledged when the connection
+closes are handed back by `close`, to be sent on the next connection.
+"""
+
+import asyncio
+from collections import OrderedDict
+
+
+class _Pending:
+    def __init__(self, frame, future):
+        self.frame = frame
+        self.future = future  # Set to True when it's acknowledged
+        self.attempts = 0
+        self.timer = None
+
+
+class AckWindow:
+    def __init__(self, transmit, size=32, timeout=2.0):
+        """
+        `transmit(frame)` is a coroutine function that sends a frame.
+        """
+        self.transmit = transmit
+        self.size = size
+        self.timeout = timeout
+        self._pending = OrderedDict()  # id -> _Pending, oldest first
+        self._slots = asyncio.Semaphore(size)
+        self._resending = set()
+        self._closed = False
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def send(self, id, frame):
+        """
+        Sends a frame once there's room in the window. Returns (once it's sent) a future that's set when it's acknowledged.
+        """
+        await self._slots.acquire()
+        loop = asyncio.get_running_loop()
+        pending = _Pending(frame, loop.create_future())
+        self._pending[id] = pending
+        try:
+            await self.transmit(frame)
+        except BaseException:
+            if self._pending.pop(id, None) is not None:
+                self._slots.release()
+            raise
+        if id in self._pending:
+            pending.timer = loop.call_later(self.timeout, self._resend, id)
+        return pending.future
+
+    def acknowledge(self, id):
+        """
+        Marks a frame as acknowledged. Returns False if it wasn't waiting for that (say it was acknowledged already).
+        """
+        pending = self._pending.pop(id, None)
+        if pending is None:
+            return False
+        if pending.timer is not None:
+            pending.timer.cancel()
+        pending.future.set_result(True)
+        self._slots.release()
+        return True
+
+    def close(self):
+        """
+        Stops resending frames. Returns the frames that weren't acknowledged, oldest first.
+        """
+        self._closed = True
+        frames = []
+        for pending in self._pending.values():
+            if pending.timer is not None:
+                pending.timer.cancel()
+            pending.future.cancel()
+            frames.append(pending.frame)
+        self._pending.clear()
+        for task in self._resending:
+            task.cancel()
+        return frames
+
+    def _resend(self, id):
+        pending = self._pending.get(id)
+        if pending is None or self._closed:
+            return
+        pending.attempts += 1
+        delay = self.timeout * min(2**pending.attempts, 8)
+        pending.timer = asyncio.get_running_loop().call_later(delay, self._resend, id)
+        task = asyncio.ensure_future(self._transmit_again(pending.frame))
+        self._resending.add(task)
+        task.add_done_callback(self._resending.discard)
+
+    async def _transmit_again(self, frame):
+        try:
+            await self.transmit(frame)
+        except Exception:
+            # Non-essential, it's sent again after the next timeout (or handed back by `close`)
+            pass
@@ -0,0 +1,275 @@
+"""
+A sqlite index of the conversations folder: metadata for each conversation, and a full-text (FTS5) table over message text.
+
+It's updated incrementally as conversations are saved, so listing and searching conversations doesn't
+have to open every file. `refresh()` picks up files that changed without going through the index.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from ...terminal_interface.utils.count_tokens import count_tokens
+from ...terminal_interface.utils.get_conversations import list_conversation_files
+from .conversation_journal import load_conversation
+
+INDEX_FILENAME = ".index.sqlite3"
+
+# Bumped when the tables change. An index from another version is rebuilt from the files
+INDEX_VERSION = 1
+
+# Messages of these types have text worth searching
+SEARCHABLE_TYPES = ["message", "code", "console"]
+
+
+def conversation_title(filename):
+    """
+    "First_few_words__October_17_2026_07-46-24.jsonl" -> "First few words"
+    """
+    name = filename.replace(".jsonl", "").replace(".json", "").replace(".JSON", "")
+    return name.split("__")[0].replace("_", " ")
+
+
+def fts_query(query):
+    """
+    Quotes every word of a search, so characters like - or : aren't read as FTS5 syntax.
+    """
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+class ConversationIndex:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, INDEX_FILENAME)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._connection:
+            (version,) = self._connection.execute("PRAGMA user_version").fetchone()
+            if version != INDEX_VERSION:
+                self._connection.executescript(
+                    """
+                    DROP TABLE IF EXISTS conversations;
+                    DROP TABLE IF EXISTS messages;
+                    DROP TABLE IF EXISTS message_rows;
+                    """
+                )
+                self._connection.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+            self._connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS conversations (
+                    filename TEXT PRIMARY KEY,
+                    title TEXT,
+                    created REAL,
+                    updated REAL,
+                    message_count INTEGER,
+                    token_count INTEGER,
+                    mtime REAL,
+                    size INTEGER
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5(
+                    content,
+                    filename UNINDEXED
+                );
+                -- Where each indexed message is in `messages`, as its unindexed columns can't be looked up quickly
+                CREATE TABLE IF NOT EXISTS message_rows (
+                    filename TEXT,
+                    position INTEGER,
+                    message_rowid INTEGER,
+                    tokens INTEGER,
+                    PRIMARY KEY (filename, position)
+                ) WITHOUT ROWID;
+                """
+            )
+
+    def update(self, filename, messages, changed, truncated_to=None):
+        """
+        Indexes the messages at the `changed` indices of a conversation (and drops those past `truncated_to`).
+        Only those messages are read from or written to the index, however long the conversation is.
+        """
+        with self._lock, self._connection as db:
+            row = db.execute(
+                "SELECT token_count FROM conversations WHERE filename = ?", (filename,)
+            ).fetchone()
+            token_count = row[0] if row else 0
+
+            removed = []
+            if truncated_to is not None:
+                removed += db.execute(
+                    "SELECT position, message_rowid, tokens FROM message_rows WHERE filename = ? AND position >= ?",
+                    (filename, truncated_to),
+                ).fetchall()
+            for position in changed:
+                row = db.execute(
+                    "SELECT position, message_rowid, tokens FROM message_rows WHERE filename = ? AND position = ?",
+                    (filename, position),
+                ).fetchone()
+                if row:
+                    removed.append(row)
+            for position, message_rowid, tokens in set(removed):
+                db.execute("DELETE FROM messages WHERE rowid = ?", (message_rowid,))
+                db.execute(
+                    "DELETE FROM message_rows WHERE filename = ? AND position = ?",
+                    (filename, position),
+                )
+                token_count -= tokens
+
+            for position in changed:
+                message = messages[position]
+                content = message.get("content")
+                if message.get("type") in SEARCHABLE_TYPES and isinstance(content, str):
+                    tokens = count_tokens(content)
+                    message_rowid = db.execute(
+                        "INSERT INTO messages (content, filename) VALUES (?, ?)",
+                        (content, filename),
+                    ).lastrowid
+                    db.execute(
+                        "INSERT INTO message_rows (filename, position, message_rowid, tokens) VALUES (?, ?, ?, ?)",
+                        (filename, position, message_rowid, tokens),
+                    )
+                    token_count += tokens
+
+            try:
+                stat = os.stat(os.path.join(self.directory, filename))
+                mtime, size = stat.st_mtime, stat.st_size
+            except OSError:
+                mtime, size = time.time(), 0
+            db.execute(
+                """
+                INSERT INTO conversations
+                    (filename, title, created, updated, message_count, token_count, mtime, size)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(filename) DO UPDATE SET
+                    updated = excluded.updated,
+                    message_count = excluded.message_count,
+                    token_count = excluded.token_count,
+                    mtime = excluded.mtime,
+                    size = excluded.size
+                """,
+                (
+                    filename,
+                    conversation_title(filename),
+                    mtime,
+                    mtime,
+                    len(messages),
+                    token_count,
+                    mtime,
+                    size,
+                ),
+            )
+
+            # A resumed .json conversation is now journaled, so the old file is hidden
+            if filename.endswith(".jsonl"):
+                self._remove(db, filename[:-1])
+
+    def _remove(self, db, filename):
+        db.execute(
+            "DELETE FROM messages WHERE rowid IN (SELECT message_rowid FROM message_rows WHERE filename = ?)",
+            (filename,),
+        )
+        db.execute("DELETE FROM message_rows WHERE filename = ?", (filename,))
+        db.execute("DELETE FROM conversations WHERE filename = ?", (filename,))
+
+    def refresh(self):
+        """
+        Brings the index in line with the folder, only reading conversations that changed outside of it.
+        """
+        with self._lock:
+            indexed = {
+                filename: (mtime, size)
+                for filename, mtime, size in self._connection.execute(
+                    "SELECT filename, mtime, size FROM conversations"
+                )
+            }
+        filenames = list_conversation_files(self.directory)
+
+        for filename in filenames:
+            try:
+                stat = os.stat(os.path.join(self.directory, filename))
+            except OSError:
+                continue
+            if indexed.get(filename) == (stat.st_mtime, stat.st_size):
+                continue
+            try:
+                messages = load_conversation(os.path.join(self.directory, filename))
+            except (OSError, ValueError):
+                continue
+            with self._lock, self._connection as db:
+                self._remove(db, filename)
+            self.update(filename, messages, range(len(messages)))
+
+        with self._lock, self._connection as db:
+            for filename in set(indexed) - set(filenames):
+                self._remove(db, filename)
+
+    def count(self, query=None):
+        with self._lock:
+            if query:
+                (count,) = self._connection.execute(
+                    "SELECT COUNT(DISTINCT filename) FROM messages WHERE messages MATCH ?",
+                    (fts_query(query),),
+                ).fetchone()
+            else:
+                (count,) = self._connection.execute(
+                    "SELECT COUNT(*) FROM conversations"
+                ).fetchone()
+        return count
+
+    def list(self, offset=0, limit=50):
+        """
+        Conversations, most recently updated first.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                """
+                SELECT filename, title, created, updated, message_count, token_count
+                FROM conversations ORDER BY updated DESC LIMIT ? OFFSET ?
+                """,
+                (limit, offset),
+            ).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def search(self, query, offset=0, limit=50):
+        """
+        Conversations with messages matching `query`, best match first. Each has a `snippet` of the matching text.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                """
+                SELECT c.filename, c.title, c.created, c.updated, c.message_count, c.token_count,
+                       messages.rowid, MIN(messages.rank) AS best
+                FROM messages JOIN conversations c ON c.filename = messages.filename
+                WHERE messages MATCH ?
+                GROUP BY c.filename ORDER BY best LIMIT ? OFFSET ?
+                """,
+                (fts_query(query), limit, offset),
+            ).fetchall()
+
+            results = []
+            for row in rows:
+                # snippet() can't be used in a grouped query, so it's fetched for the best message of each page entry
+                (snippet,) = self._connection.execute(
+                    "SELECT snippet(messages, 0, '', '', '…', 12) FROM messages WHERE messages MATCH ? AND rowid = ?",
+                    (fts_query(query), row[6]),
+                ).fetchone()
+                result = self._row_to_dict(row[:6])
+                result["snippet"] = snippet
+                results.append(result)
+        return results
+
+    @staticmethod
+    def _row_to_dict(row):
+        keys = [
+            "filename",
+            "title",
+            "created",
+            "updated",
+            "message_count",
+            "token_count",
+        ]
+        return dict(zip(keys, row))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
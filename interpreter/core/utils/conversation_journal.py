@@ -0,0 +1,198 @@
+"""
+Conversations are saved as append-only JSONL journals, so saving a turn only writes what changed.
+
+Each line is a record:
+
+{"op": "set", "index": 3, "message": {...}}   # Message 3 was added or changed
+{"op": "truncate", "length": 2}                # Messages from index 2 onwards were removed
+
+Replaying the records in order gives back the messages. Journals are compacted (rewritten as one
+"set" per message) in the background once they hold a lot of stale records.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+def journal_path(path):
+    """
+    The journal for a conversation file. "Conversation.json" is journaled in "Conversation.jsonl".
+    """
+    return path if path.endswith(".jsonl") else path + "l"
+
+
+def load_conversation(path):
+    """
+    Loads the messages of a conversation, from a journal or from a plain JSON list of messages.
+    """
+    if not path.endswith(".jsonl"):
+        if os.path.exists(journal_path(path)):
+            path = journal_path(path)
+        else:
+            with open(path, "r") as f:
+                return json.load(f)
+
+    messages = []
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A partially written last line, from a crash. Everything before it is intact
+                break
+            if record["op"] == "set":
+                index = record["index"]
+                if index == len(messages):
+                    messages.append(record["message"])
+                else:
+                    messages[index] = record["message"]
+            elif record["op"] == "truncate":
+                del messages[record["length"] :]
+    return messages
+
+
+class ConversationJournal:
+    """
+    Appends new and changed messages to a conversation's journal.
+
+    Changes are found without serializing or hashing old messages: we remember each saved message's
+    values, and a message counts as changed if any of its values is a different object.
+    Writes are flushed right away, but fsynced at most every `fsync_interval` seconds.
+    """
+
+    def __init__(
+        self, path, fsync_interval=1.0, compact_ratio=2.0, compact_min_records=100
+    ):
+        self.path = journal_path(path)
+        self.fsync_interval = fsync_interval
+        self.compact_ratio = compact_ratio
+        self.compact_min_records = compact_min_records
+
+        self._saved = []  # The items of each message, as of the last save
+        self._records = 0
+        self._file = None
+        self._needs_compaction = os.path.exists(self.path)  # We don't know what's in it
+        self._last_fsync = 0
+        self._fsync_timer = None
+        self._compaction_thread = None
+        self._lock = threading.RLock()
+
+    def save(self, messages):
+        """
+        Journals what changed since the last save.
+        Returns the indices of the messages that were written, and the length messages were truncated to (or None).
+        """
+        with self._lock:
+            if self._needs_compaction:
+                self._saved = [tuple(message.items()) for message in messages]
+                self._compact()
+                return list(range(len(messages))), 0
+
+            records = []
+            changed = []
+            truncated_to = None
+            if len(messages) < len(self._saved):
+                truncated_to = len(messages)
+                records.append({"op": "truncate", "length": len(messages)})
+                del self._saved[len(messages) :]
+            for index, message in enumerate(messages):
+                items = tuple(message.items())
+                if index < len(self._saved) and self._unchanged(
+                    items, self._saved[index]
+                ):
+                    continue
+                records.append({"op": "set", "index": index, "message": message})
+                changed.append(index)
+                if index < len(self._saved):
+                    self._saved[index] = items
+                else:
+                    self._saved.append(items)
+
+            if not records:
+                return changed, truncated_to
+            self._append(records)
+
+            if self._records > max(
+                self.compact_min_records, self.compact_ratio * len(self._saved)
+            ):
+                self._compact_in_background()
+
+            return changed, truncated_to
+
+    @staticmethod
+    def _unchanged(items, saved_items):
+        return len(items) == len(saved_items) and all(
+            key == saved_key and value is saved_value
+            for (key, value), (saved_key, saved_value) in zip(items, saved_items)
+        )
+
+    def _append(self, records):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a")
+        self._file.write("".join(json.dumps(record) + "\n" for record in records))
+        self._file.flush()
+        self._records += len(records)
+        self._schedule_fsync()
+
+    def _schedule_fsync(self):
+        if time.time() - self._last_fsync >= self.fsync_interval:
+            self._fsync()
+        elif self._fsync_timer is None:
+            # Batch up everything written until the interval is over
+            self._fsync_timer = threading.Timer(self.fsync_interval, self._fsync)
+            self._fsync_timer.daemon = True
+            self._fsync_timer.start()
+
+    def _fsync(self):
+        with self._lock:
+            self._fsync_timer = None
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+            self._last_fsync = time.time()
+
+    def _compact_in_background(self):
+        if self._compaction_thread is None or not self._compaction_thread.is_alive():
+            self._compaction_thread = threading.Thread(
+                target=self._compact, daemon=True
+            )
+            self._compaction_thread.start()
+
+    def _compact(self):
+        """
+        Rewrites the journal as one record per message. Crash safe: the new journal replaces the old one atomically.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w") as f:
+                for index, items in enumerate(self._saved):
+                    f.write(
+                        json.dumps(
+                            {"op": "set", "index": index, "message": dict(items)}
+                        )
+                        + "\n"
+                    )
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+
+            self._records = len(self._saved)
+            self._needs_compaction = False
+            self._last_fsync = time.time()
+
+    def close(self):
+        with self._lock:
+            if self._fsync_timer is not None:
+                self._fsync_timer.cancel()
+                self._fsync_timer = None
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
@@ -0,0 +1,116 @@
+"""
+One cache for the encodings of images (PNG, JPEG or WebP bytes, their base64, resized copies),
+shared by everything that sends or reads images, so the same screenshot is only encoded once.
+
+Images are addressed by a hash of their pixels, worked out once per image object.
+Entries are evicted least recently used first, once together they're bigger than `max_bytes`.
+"""
+
+import base64
+import hashlib
+import io
+import threading
+import weakref
+from collections import OrderedDict
+
+from PIL import Image
+
+
+class ImageCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size in bytes)
+        self._size = 0
+        self._digests = {}  # id(image) -> (weak reference to the image, its digest)
+        # Reentrant, as an image can be freed (and forgotten) while the lock is held
+        self._lock = threading.RLock()
+
+    def digest(self, image):
+        """
+        A hash of an image's pixels. Images shouldn't be drawn on after they're hashed.
+        """
+        image_id = id(image)
+        with self._lock:
+            entry = self._digests.get(image_id)
+            if entry and entry[0]() is image:
+                return entry[1]
+
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(f"{image.mode} {image.size}".encode())
+        hasher.update(image.tobytes())
+        digest = hasher.hexdigest()
+
+        def forget(ref):
+            with self._lock:
+                if self._digests.get(image_id, (None,))[0] is ref:
+                    del self._digests[image_id]
+
+        with self._lock:
+            self._digests[image_id] = (weakref.ref(image, forget), digest)
+        return digest
+
+    def encode(self, image, format="PNG", size=None, as_base64=False):
+        """
+        The image (resized to `size`, if it's given) encoded as `format`, which can also be a file extension like "jpg".
+        Returns bytes, or base64 text if `as_base64` is set.
+        """
+        format = Image.registered_extensions().get("." + format.lower(), format.upper())
+        size = tuple(size) if size and tuple(size) != image.size else None
+        key = ("encoded", self.digest(image), format, size, as_base64)
+
+        value = self._get(key)
+        if value is not None:
+            return value
+
+        if as_base64:
+            value = base64.b64encode(self.encode(image, format, size)).decode("utf-8")
+        else:
+            if size:
+                image = image.resize(size)
+            if format == "JPEG" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            buffered = io.BytesIO()
+            image.save(buffered, format=format)
+            value = buffered.getvalue()
+
+        self._put(key, value, len(value))
+        return value
+
+    def open_base64(self, data):
+        """
+        The image in base64 text `data`, decoded once.
+        Each call returns its own copy, which the caller can change without affecting the cached one.
+        """
+        key = ("decoded", hashlib.blake2b(data.encode(), digest_size=16).hexdigest())
+        image = self._get(key)
+        if image is None:
+            image = Image.open(io.BytesIO(base64.b64decode(data)))
+            image.load()
+            self._put(key, image, len(image.getbands()) * image.width * image.height)
+        return image.copy()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _put(self, key, value, size):
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+
+image_cache = ImageCache()
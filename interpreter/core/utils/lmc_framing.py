@@ -0,0 +1,161 @@
+"""
+Compact framing for the server's WebSocket, which clients ask for with the "lmc.compact" subprotocol
+(e.g. `new WebSocket(url, ["lmc.compact"])`).
+
+Outputs that arrive within FLUSH_INTERVAL of each other are sent together, as one text frame `{"batch": [...]}`,
+with consecutive content chunks of the same message merged (start and end chunks are kept as they are).
+Images are sent as binary frames instead of base64 in JSON: the header's length (4 bytes, big-endian),
+the header (the image chunk as JSON, without its content, and with the file type as its format, like "png"),
+then the image's bytes.
+"""
+
+import base64
+import json
+import struct
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SUBPROTOCOL = "lmc.compact"
+
+# Outputs are sent once the first waiting one has waited this long (in seconds), or they add up to FLUSH_SIZE characters
+FLUSH_INTERVAL = 0.01
+FLUSH_SIZE = 16384
+
+# The message types whose content chunks can be joined together
+STREAMED_TYPES = ("message", "code", "console")
+
+
+def choose_subprotocol(subprotocols):
+    return SUBPROTOCOL if SUBPROTOCOL in subprotocols else None
+
+
+def dumps(value):
+    if orjson is not None:
+        try:
+            return orjson.dumps(value).decode("utf-8")
+        except TypeError:
+            # Something orjson can't serialize, but json might (like a very big int)
+            pass
+    return json.dumps(value, separators=(",", ":"))
+
+
+def is_image(output):
+    return (
+        isinstance(output, dict)
+        and output.get("type") == "image"
+        and str(output.get("format")).startswith("base64.")
+        and isinstance(output.get("content"), str)
+    )
+
+
+def encode_image(output):
+    header = {key: value for key, value in output.items() if key != "content"}
+    header["format"] = output["format"][len("base64.") :]
+    header = dumps(header).encode("utf-8")
+    return struct.pack(">I", len(header)) + header + base64.b64decode(output["content"])
+
+
+def decode_image(frame):
+    """
+    The image chunk (with base64 content, like any other) that a binary frame holds.
+    """
+    (length,) = struct.unpack(">I", frame[:4])
+    output = json.loads(frame[4 : 4 + length])
+    output["format"] = "base64." + output["format"]
+    output["content"] = base64.b64encode(frame[4 + length :]).decode("utf-8")
+    return output
+
+
+def encode_frame(frame):
+    """
+    The text (or, for an image, the bytes) to send for a frame made by `frames`.
+    """
+    if is_image(frame):
+        return encode_image(frame)
+    return dumps(frame)
+
+
+def should_flush(output):
+    """
+    Whether to send what's waiting straight away, rather than wait to see if more comes, once this arrives.
+    """
+    return (
+        not isinstance(output, dict)
+        or output.get("role") == "server"  # Like the "complete" status, or an error
+        or output.get("type") == "image"
+    )
+
+
+def size(output):
+    if isinstance(output, dict):
+        return len(str(output.get("content", "")))
+    return len(output)
+
+
+def _joinable(output):
+    return (
+        isinstance(output, dict)
+        and output.get("type") in STREAMED_TYPES
+        and output.get("format") != "active_line"
+        and isinstance(output.get("content"), str)
+        and set(output) <= {"role", "type", "format", "content"}
+    )
+
+
+def coalesce(outputs):
+    """
+    Joins consecutive content chunks of the same message into one.
+    """
+    coalesced = []
+    for output in outputs:
+        previous = coalesced[-1] if coalesced else None
+        if (
+            previous is not None
+            and _joinable(output)
+            and _joinable(previous)
+            and all(
+                previous.get(key) == output.get(key)
+                for key in ("role", "type", "format")
+            )
+        ):
+            coalesced[-1] = dict(
+                previous, content=previous["content"] + output["content"]
+            )
+        else:
+            coalesced.append(output)
+    return coalesced
+
+
+def frames(outputs):
+    """
+    The frames to send outputs in: images (and bytes) on their own, and everything between them as a batch.
+    """
+    framed = []
+    batch = []
+    for output in outputs:
+        if is_image(output) or isinstance(output, bytes):
+            if batch:
+                framed.append({"batch": coalesce(batch)})
+                batch = []
+            framed.append(output)
+        else:
+            batch.append(output)
+    if batch:
+        framed.append({"batch": coalesce(batch)})
+    return framed
+
+
+def unbatch(frames):
+    """
+    The outputs in frames made by `frames` (say, to send them again on a connection that isn't compact).
+    """
+    outputs = []
+    for frame in frames:
+        if isinstance(frame, dict) and "batch" in frame:
+            outputs.extend(frame["batch"])
+        else:
+            outputs.append(frame)
+    return outputs
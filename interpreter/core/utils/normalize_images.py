@@ -0,0 +1,130 @@
+"""
+Images are normalized as they're added to the conversation: downscaled to the most the model can make use of,
+re-encoded as JPEG (when that's smaller), and swapped for a reference when they're the same as an earlier image.
+This keeps them small in memory, in saved conversations and in requests to the LLM.
+"""
+
+import hashlib
+
+from .image_cache import image_cache
+
+# The format of an image message that's the same as an earlier one. Its content is that image's `image_hash`
+REFERENCE_FORMAT = "reference"
+
+
+def max_image_size(llm):
+    """
+    The longest side (in pixels) of an image that's worth sending to the model.
+    """
+    if llm.max_image_size:
+        return llm.max_image_size
+    if "claude" in str(llm.model).lower():
+        # Anthropic downscales anything bigger
+        return 1568
+    # OpenAI fits images into 2048x2048 first
+    return 2048
+
+
+def pixel_hash(image):
+    """
+    A hash of an image's pixels, so the same image is matched however it was encoded.
+    Only exact repeats match: screenshots that differ by a line of text (say, an error) mustn't.
+    """
+    image = image.convert("RGBA")
+    digest = hashlib.sha256(f"{image.width}x{image.height}".encode("utf-8"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def normalize_image(message, max_size):
+    """
+    A copy of a base64 image message, downscaled to fit `max_size`, re-encoded if that makes it smaller,
+    and with its `image_hash` set.
+    """
+    image = image_cache.open_base64(message["content"])
+    scale = max_size / max(image.size)
+    size = image.size
+    if scale < 1:
+        size = (max(round(image.width * scale), 1), max(round(image.height * scale), 1))
+
+    message = dict(message, image_hash=pixel_hash(image))
+
+    if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+        # JPEG would lose the transparency
+        format = "png"
+    else:
+        format = "jpeg"
+    content = image_cache.encode(image, format, size=size, as_base64=True)
+
+    if size != image.size or len(content) < len(message["content"]):
+        message["content"] = content
+        message["format"] = "base64." + format
+    return message
+
+
+def ingest_image(message, messages, llm):
+    """
+    What to store for an image message that's being added to `messages`:
+    the image normalized, or a reference if an earlier image is the same.
+    Anything that isn't a base64 image, or has already been ingested, is returned as it is.
+    """
+    if (
+        message.get("type") != "image"
+        or "image_hash" in message
+        or "base64" not in message.get("format", "")
+    ):
+        return message
+
+    try:
+        normalized = normalize_image(message, max_image_size(llm))
+    except Exception:
+        # Non-essential, it can be sent as it is
+        return message
+
+    for earlier in reversed(messages):
+        if (
+            earlier is not message
+            and earlier.get("type") == "image"
+            and earlier.get("format") != REFERENCE_FORMAT
+            and "image_hash" in earlier
+            and earlier["image_hash"] == normalized["image_hash"]
+        ):
+            return {
+                "role": message["role"],
+                "type": "image",
+                "format": REFERENCE_FORMAT,
+                "content": earlier["image_hash"],
+                "image_hash": earlier["image_hash"],
+            }
+    return normalized
+
+
+def resolve_image_references(messages, all_messages):
+    """
+    Swaps references in `messages` back for the images they refer to, where those images aren't in `messages`
+    (say they were trimmed out). `all_messages` is where they're looked for.
+    """
+    sent = {
+        message.get("image_hash")
+        for message in messages
+        if message["type"] == "image" and message.get("format") != REFERENCE_FORMAT
+    }
+    originals = {
+        message["image_hash"]: message
+        for message in all_messages
+        if message["type"] == "image"
+        and message.get("format") != REFERENCE_FORMAT
+        and "image_hash" in message
+    }
+    resolved = []
+    for message in messages:
+        if (
+            message["type"] == "image"
+            and message.get("format") == REFERENCE_FORMAT
+            and message["content"] not in sent
+            and message["content"] in originals
+        ):
+            message = dict(originals[message["content"]], role=message["role"])
+            sent.add(message["image_hash"])
+        resolved.append(message)
+    return resolved
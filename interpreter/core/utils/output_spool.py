@@ -0,0 +1,124 @@
+import array
+import mmap
+import os
+import uuid
+
+from ...terminal_interface.utils.local_storage_path import get_storage_path
+
+
+class OutputSpool:
+    """
+    Spills a stream of console output to a file under the storage dir, so the full output can be
+    paged through later without ever holding it in memory.
+
+    Pages are read through `mmap`. A sparse index of byte offsets (one every `BLOCK_CHARS` characters)
+    turns a character range into a byte range, so reads never scan from the start of the file.
+    The index is written next to the output (`.idx`) on `close()`, so other processes (like the
+    Python kernel) can page through it with `OutputSpool.open(path)`.
+    """
+
+    BLOCK_CHARS = 65536
+
+    def __init__(self, path=None):
+        if path is None:
+            directory = get_storage_path("outputs")
+            path = os.path.join(directory, f"{uuid.uuid4().hex}.txt")
+        self.path = path
+        self.total_chars = 0
+        self._total_bytes = 0
+        # _offsets[i] is the byte offset of character i * BLOCK_CHARS
+        self._offsets = array.array("q", [0])
+        self._file = None
+        self._closed = False
+
+    @classmethod
+    def open(cls, path):
+        """
+        Opens a closed spool for reading.
+        """
+        spool = cls(path)
+        index = array.array("q")
+        with open(path + ".idx", "rb") as f:
+            index.frombytes(f.read())
+        spool.total_chars = index[0]
+        spool._offsets = index[1:]
+        spool._total_bytes = os.path.getsize(path)
+        spool._closed = True
+        return spool
+
+    def write(self, text):
+        if self._closed:
+            raise ValueError("Can't write to a closed output spool.")
+        if not text:
+            return
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, "wb")
+
+        if self.total_chars + len(text) < len(self._offsets) * self.BLOCK_CHARS:
+            # Most chunks don't cross a block boundary
+            data = text.encode("utf-8", errors="surrogatepass")
+            self._file.write(data)
+            self._total_bytes += len(data)
+            self.total_chars += len(text)
+            return
+
+        position = 0
+        while position < len(text):
+            # Write up to the next block boundary, so we know its byte offset
+            next_boundary = len(self._offsets) * self.BLOCK_CHARS
+            piece = text[position : position + next_boundary - self.total_chars]
+            data = piece.encode("utf-8", errors="surrogatepass")
+            self._file.write(data)
+            self._total_bytes += len(data)
+            self.total_chars += len(piece)
+            position += len(piece)
+            if self.total_chars == next_boundary:
+                self._offsets.append(self._total_bytes)
+
+    def read(self, start=0, end=None):
+        """
+        Returns characters `start` to `end` of the output. Negative indices count from the end, like slices.
+        """
+        start, end, _ = slice(start, end).indices(self.total_chars)
+        if start >= end:
+            return ""
+        if self._file is not None:
+            self._file.flush()
+
+        first_block = start // self.BLOCK_CHARS
+        last_block = -(-end // self.BLOCK_CHARS)
+        start_byte = self._offsets[first_block]
+        if last_block < len(self._offsets):
+            end_byte = self._offsets[last_block]
+        else:
+            end_byte = self._total_bytes
+
+        with open(self.path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                text = mm[start_byte:end_byte].decode("utf-8", errors="surrogatepass")
+
+        block_start = first_block * self.BLOCK_CHARS
+        return text[start - block_start : end - block_start]
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._file is None:
+            # Nothing was written, so there's nothing to page through
+            return
+        self._file.close()
+        self._file = None
+        with open(self.path + ".idx", "wb") as f:
+            array.array("q", [self.total_chars]).tofile(f)
+            self._offsets.tofile(f)
+
+    def delete(self):
+        self.close()
+        for path in [self.path, self.path + ".idx"]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __len__(self):
+        return self.total_chars
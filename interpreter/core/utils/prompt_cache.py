@@ -0,0 +1,197 @@
+"""
+Caches the parts of the system prompt that don't change between turns or between interpreter instances:
+the computer API signature table, the language snippets, and their token counts.
+
+Values are kept in memory (the least recently used go first, past MAX_MEMORY_ENTRIES), and the expensive ones
+are also kept on disk (keyed by package version), so new processes don't have to recompute them either.
+The static system message and its token counts depend on an interpreter's settings, so they're kept on the interpreter.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from importlib.metadata import PackageNotFoundError, version
+
+from ...terminal_interface.utils.local_storage_path import get_storage_path
+
+# Least recently used values are dropped past this many
+MAX_MEMORY_ENTRIES = 256
+
+_memory = OrderedDict()
+_disk = None
+_lock = threading.Lock()
+
+
+def package_version():
+    try:
+        return version("open-interpreter")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def make_key(*parts):
+    return hashlib.sha256(
+        json.dumps(parts, default=str, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def _disk_path():
+    return os.path.join(
+        get_storage_path("cache"), f"prompt_cache_{package_version()}.json"
+    )
+
+
+def _load_disk():
+    global _disk
+    if _disk is None:
+        try:
+            with open(_disk_path(), "r") as f:
+                _disk = json.load(f)
+        except (OSError, ValueError):
+            _disk = {}
+    return _disk
+
+
+def _save_disk():
+    path = _disk_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(_disk, f)
+        os.replace(temp_path, path)
+    except OSError:
+        # Non-essential, we can always recompute
+        pass
+
+
+def cached(name, key, compute, persist=False):
+    """
+    Returns the cached value for (name, key), calling `compute()` to fill the cache if it's missing.
+    `persist=True` also keeps the value on disk. It must be JSON serializable.
+    """
+    memory_key = (name, key)
+    with _lock:
+        if memory_key in _memory:
+            _memory.move_to_end(memory_key)
+            return _memory[memory_key]
+        if persist:
+            disk_key = f"{name}:{key}"
+            disk = _load_disk()
+            if disk_key in disk:
+                _remember(memory_key, disk[disk_key])
+                return disk[disk_key]
+
+    value = compute()
+
+    with _lock:
+        _remember(memory_key, value)
+        if persist:
+            _load_disk()[disk_key] = value
+            _save_disk()
+    return value
+
+
+def _remember(memory_key, value):
+    _memory[memory_key] = value
+    _memory.move_to_end(memory_key)
+    while len(_memory) > MAX_MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+
+
+def clear():
+    global _disk
+    with _lock:
+        _memory.clear()
+        _disk = {}
+        try:
+            os.remove(_disk_path())
+        except OSError:
+            pass
+
+
+class _StaticSystemMessage:
+    def __init__(self, parts, content):
+        self.parts = parts  # The settings it was built from
+        self.content = content
+        self.tokens = {}  # model -> token count
+
+
+def _parts(interpreter):
+    """
+    The settings the static system message is built from. They're strings, so one that's changed is a new object.
+    """
+    languages = interpreter.computer.terminal.languages
+    return (
+        interpreter.system_message,
+        interpreter.custom_instructions,
+        (
+            interpreter.computer.system_message
+            if interpreter.computer.import_computer_api
+            else None
+        ),
+    ) + tuple(
+        language.system_message
+        for language in languages
+        if hasattr(language, "system_message")
+    )
+
+
+def _static(interpreter):
+    """
+    The static system message, built again only when one of its settings is a different object than last time.
+    Comparing by identity means nothing is read or hashed on turns where the settings haven't changed.
+    """
+    parts = _parts(interpreter)
+    static = getattr(interpreter, "_static_system_message", None)
+    if (
+        static is not None
+        and len(static.parts) == len(parts)
+        and all(a is b for a, b in zip(static.parts, parts))
+    ):
+        return static
+
+    system_message, custom_instructions, computer_message = parts[:3]
+    content = system_message
+
+    # Add language-specific system messages
+    for language_message in parts[3:]:
+        content += "\n\n" + language_message
+
+    # Add custom instructions
+    if custom_instructions:
+        content += "\n\n" + custom_instructions
+
+    # Add computer API system message
+    if computer_message and computer_message not in content:
+        content = content + "\n\n" + computer_message
+
+    static = _StaticSystemMessage(parts, content)
+    interpreter._static_system_message = static
+    return static
+
+
+def static_system_message(interpreter):
+    """
+    The system message with everything that doesn't need rendering added to it:
+    language snippets, custom instructions and (if it's imported) the computer API.
+    """
+    return _static(interpreter).content
+
+
+def static_system_message_tokens(interpreter, model=None):
+    """
+    The number of tokens the static system message takes up as a message (as trim_messages counts it),
+    worked out once per model for each version of it.
+    """
+    from ..llm.utils.trim_messages import count_message_tokens
+
+    static = _static(interpreter)
+    model = model or interpreter.llm.model or "gpt-4"
+    if model not in static.tokens:
+        static.tokens[model] = count_message_tokens(
+            {"role": "system", "content": static.content}, model
+        )
+    return static.tokens[model]
@@ -0,0 +1,222 @@
+"""
+Sessions for a server that many clients share. Each session id gets its own interpreter (its own messages,
+languages and stop event), so clients don't see or interrupt each other.
+
+New sessions take an interpreter from a pool of spares, which is refilled in the background.
+Sessions nobody has used for `idle_timeout` seconds are closed, and only the `max_live_kernels`
+most recently used sessions keep their languages running (the others' are restarted when they next run code).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class SessionBusy(Exception):
+    pass
+
+
+class Session:
+    def __init__(self, id, interpreter):
+        self.id = id
+        self.interpreter = interpreter
+        self.active = 0  # Requests and connections using it right now
+        self.last_used = time.monotonic()
+
+    @property
+    def busy(self):
+        return self.active > 0 or getattr(self.interpreter, "responding", False)
+
+
+class SessionManager:
+    def __init__(
+        self,
+        factory,
+        pool_size=2,
+        max_concurrent=1,
+        idle_timeout=3600,
+        max_live_kernels=8,
+        warm_languages=(),
+    ):
+        """
+        `factory()` creates a new interpreter. `max_concurrent` is how many requests (or websocket connections)
+        can use one session at a time. `warm_languages` are started in the pool's interpreters, ahead of time.
+        """
+        self.factory = factory
+        self.pool_size = pool_size
+        self.max_concurrent = max_concurrent
+        self.idle_timeout = idle_timeout
+        self.max_live_kernels = max_live_kernels
+        self.warm_languages = warm_languages
+        self._sessions = OrderedDict()  # id -> Session, least recently used first
+        self._spares = []
+        self._filling = False
+        self._reaper = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def open(self, session_id):
+        """
+        Starts using a session (creating it if it's new). Call `release` when you're done with it.
+        Raises SessionBusy if it's already used by `max_concurrent` others.
+        """
+        return self._session(session_id, use=True)
+
+    def interpreter(self, session_id):
+        """
+        A session's interpreter (creating the session if it's new), without using up one of its `max_concurrent`.
+        """
+        return self._session(session_id, use=False).interpreter
+
+    def _session(self, session_id, use):
+        interpreter = None
+        while True:
+            with self._lock:
+                session = self._sessions.get(session_id)
+                if session is None and interpreter is None and self._spares:
+                    interpreter = self._spares.pop(0)
+                if session is None and interpreter is not None:
+                    session = Session(session_id, interpreter)
+                    self._sessions[session_id] = session
+                    interpreter = None
+                if session is not None:
+                    if interpreter is not None:
+                        # Someone else created the session while this was being made
+                        self._spares.append(interpreter)
+                    if use:
+                        if session.active >= self.max_concurrent:
+                            raise SessionBusy(
+                                f"Session {session_id} is already handling {session.active} request(s)."
+                            )
+                        session.active += 1
+                    session.last_used = time.monotonic()
+                    self._sessions.move_to_end(session_id)
+                    break
+            # There's no spare, so this session waits for one to be made (outside the lock, as it's slow)
+            interpreter = self.factory()
+
+        self.fill()
+        self._start_reaper()
+        self._stop_least_recently_used_kernels()
+        return session
+
+    def release(self, session):
+        with self._lock:
+            session.active -= 1
+            session.last_used = time.monotonic()
+
+    def get(self, session_id):
+        """
+        The session with this id, or None.
+        """
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def close(self, session_id):
+        """
+        Ends a session, terminating its languages.
+        """
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session:
+            self._close_interpreter(session.interpreter)
+
+    def close_all(self):
+        """
+        Ends every session, and the spares, so none of their languages are left running.
+        """
+        with self._lock:
+            self._closed = True
+            interpreters = [session.interpreter for session in self._sessions.values()]
+            interpreters += self._spares
+            self._sessions.clear()
+            self._spares = []
+        for interpreter in interpreters:
+            self._close_interpreter(interpreter)
+
+    def fill(self):
+        """
+        Creates spare interpreters in the background, until there are `pool_size` of them.
+        """
+        with self._lock:
+            if self._closed or self._filling or len(self._spares) >= self.pool_size:
+                return
+            self._filling = True
+        threading.Thread(target=self._fill, daemon=True).start()
+
+    def _fill(self):
+        try:
+            while True:
+                with self._lock:
+                    if self._closed or len(self._spares) >= self.pool_size:
+                        return
+                interpreter = self.factory()
+                for language in self.warm_languages:
+                    interpreter.computer.terminal.warm_up(language)
+                with self._lock:
+                    closed = self._closed
+                    if not closed:
+                        self._spares.append(interpreter)
+                if closed:
+                    self._close_interpreter(interpreter)
+        except Exception:
+            # Non-essential, sessions create their interpreter if there's no spare
+            pass
+        finally:
+            with self._lock:
+                self._filling = False
+
+    def evict_idle(self):
+        """
+        Closes the sessions that haven't been used for `idle_timeout` seconds.
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                session
+                for session in self._sessions.values()
+                if not session.busy and now - session.last_used > self.idle_timeout
+            ]
+            for session in idle:
+                del self._sessions[session.id]
+        for session in idle:
+            self._close_interpreter(session.interpreter)
+
+    def _stop_least_recently_used_kernels(self):
+        """
+        Terminates the languages of all but the `max_live_kernels` most recently used sessions.
+        """
+        with self._lock:
+            live = [
+                session
+                for session in self._sessions.values()
+                if session.interpreter.computer.terminal.active_languages
+            ]
+            excess = len(live) - self.max_live_kernels
+            idle = [session for session in live if not session.busy]
+            stopping = idle[: max(excess, 0)]
+        for session in stopping:
+            session.interpreter.computer.terminate()
+
+    def _close_interpreter(self, interpreter):
+        try:
+            stop_event = getattr(interpreter, "stop_event", None)
+            if stop_event is not None:
+                stop_event.set()
+            interpreter.computer.terminate()
+        except Exception:
+            # Non-essential, it's already been forgotten
+            pass
+
+    def _start_reaper(self):
+        with self._lock:
+            if self._reaper is not None or not self.idle_timeout:
+                return
+            self._reaper = threading.Thread(target=self._reap, daemon=True)
+        self._reaper.start()
+
+    def _reap(self):
+        while True:
+            time.sleep(min(self.idle_timeout / 4, 60))
+            self.evict_idle()
+            self._stop_least_recently_used_kernels()
@@ -0,0 +1,99 @@
+class StreamingMessage(dict):
+    """
+    An LMC message that is still being streamed into `interpreter.messages`.
+
+    Appended chunks go into a buffer and are only joined into `content` when someone reads it,
+    so building a long message is linear in its length instead of quadratic.
+    If a `truncator` (see `OutputTruncator`) is passed in, content is truncated as it streams in.
+
+    Call `finalize()` when the message is done to get a plain dict back.
+    """
+
+    def __init__(self, message, truncator=None):
+        super().__init__(message)
+        self._truncator = truncator
+        self._parts = []
+        self._stale = False
+        self._write(dict.get(self, "content", ""))
+
+    def _write(self, content):
+        if self._truncator is not None:
+            self._truncator.write(content)
+        else:
+            self._parts.append(content)
+        self._stale = True
+
+    def _sync(self):
+        if self._stale:
+            if self._truncator is not None:
+                content = self._truncator.getvalue()
+            else:
+                content = "".join(self._parts)
+                self._parts = [content]
+            dict.__setitem__(self, "content", content)
+            self._stale = False
+
+    def append(self, content):
+        self._write(content)
+
+    def finalize(self):
+        self._sync()
+        return dict(dict.items(self))
+
+    # Everything that reads `content` has to see the joined buffer
+
+    def __getitem__(self, key):
+        if key == "content":
+            self._sync()
+        return dict.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        if key == "content":
+            self._parts = []
+            if self._truncator is not None:
+                self._truncator.reset()
+            self._write(value)
+        dict.__setitem__(self, key, value)
+
+    def get(self, key, default=None):
+        if key == "content":
+            self._sync()
+        return dict.get(self, key, default)
+
+    def pop(self, key, *args):
+        if key == "content":
+            self._sync()
+        return dict.pop(self, key, *args)
+
+    def __iter__(self):
+        # Overriding this makes dict(message) and {**message} go through __getitem__
+        return dict.__iter__(self)
+
+    def items(self):
+        self._sync()
+        return dict.items(self)
+
+    def values(self):
+        self._sync()
+        return dict.values(self)
+
+    def copy(self):
+        return self.finalize()
+
+    def __eq__(self, other):
+        self._sync()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        self._sync()
+        return dict.__ne__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        self._sync()
+        return dict.__repr__(self)
+
+    def __reduce_ex__(self, protocol):
+        # Copies and pickles are plain dicts
+        return (dict, (self.finalize(),))
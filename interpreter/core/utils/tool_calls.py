@@ -0,0 +1,88 @@
+"""
+Models can make several tool calls in one turn. The first one streams and runs like any other code block.
+The rest wait here, then run one after another (they may share a stateful kernel), without a round trip to the LLM in between.
+
+With `interpreter.parallel_tool_calls`, the rest are started right away instead, each on its own language instances,
+so independent calls run concurrently. Their output is still shown in order, one call at a time.
+"""
+
+import queue
+import threading
+
+
+class BackgroundRun:
+    """
+    Runs code in a thread, on its own terminal session. Iterating over it yields its output as it's produced.
+    """
+
+    def __init__(self, computer, language, code, session):
+        self._output = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, args=(computer, language, code, session), daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, computer, language, code, session):
+        try:
+            for chunk in computer.run(language, code, stream=True, session=session):
+                self._output.put(chunk)
+        except Exception as e:
+            self._output.put(e)
+        finally:
+            computer.terminal.end_session(session)
+            self._output.put(None)
+
+    def __iter__(self):
+        while True:
+            chunk = self._output.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+class PendingToolCalls:
+    """
+    The tool calls made after the first one in a turn, as LMC code messages (with their `tool_call_id`).
+    """
+
+    def __init__(self):
+        self.calls = []
+        self._runs = {}  # tool_call_id -> BackgroundRun
+
+    def __bool__(self):
+        return bool(self.calls)
+
+    def add(self, chunk):
+        """
+        Adds a streamed code chunk to the call it belongs to.
+        """
+        for call in self.calls:
+            if call["tool_call_id"] == chunk["tool_call_id"]:
+                call["content"] += chunk["content"]
+                return
+        self.calls.append(
+            {
+                "role": "assistant",
+                "type": "code",
+                "format": chunk["format"],
+                "content": chunk["content"],
+                "tool_call_id": chunk["tool_call_id"],
+            }
+        )
+
+    def pop(self):
+        return self.calls.pop(0)
+
+    def start(self, computer, call, code):
+        """
+        Starts running a call in the background. Its output is picked up with `take_run`.
+        """
+        if call["tool_call_id"] not in self._runs:
+            self._runs[call["tool_call_id"]] = BackgroundRun(
+                computer, call["format"].lower().strip(), code, call["tool_call_id"]
+            )
+
+    def take_run(self, tool_call_id):
+        return self._runs.pop(tool_call_id, None)
@@ -1,13 +1,10 @@
-def truncate_output(data, max_output_chars=2800, add_scrollbars=False):
-    # if "@@@DO_NOT_TRUNCATE@@@" in data:
-    #     return data
+from collections import deque
 
-    needs_truncation = False
 
-    # Calculate how much to show from start and end
+def truncation_message(total_chars, max_output_chars=2800, add_scrollbars=False):
     chars_per_end = max_output_chars // 2
 
-    message = (f"Output truncated ({len(data):,} characters total). "
+    message = (f"Output truncated ({total_chars:,} characters total). "
                f"Showing {chars_per_end:,} characters from start/end. "
                "To handle large outputs, store result in python var first "
                "`result = command()` then `computer.ai.summarize(result)` for "
@@ -15,14 +12,26 @@ def truncate_output(data, max_output_chars=2800, add_scrollbars=False):
                "repeat shell commands with wc/grep/sed, etc. or break it down "
                "into smaller steps.\n\n")
 
-    # This won't work because truncated code is stored in interpreter.messages :/
-    # If the full code was stored, we could do this:
+    # The full output is kept by the terminal, so the model can page through it
     if add_scrollbars:
         message = (
             message.strip()
-            + f" Run `get_last_output()[0:{max_output_chars}]` to see the first page.\n\n"
+            + f" The full output was saved. Run `computer.terminal.get_last_output(0, {max_output_chars})` to see the first page.\n\n"
         )
-    # Then we have code in `terminal.py` which makes that function work. It should be a computer tool though to just access messages IMO. Or like, self.messages.
+
+    return message
+
+
+def truncate_output(data, max_output_chars=2800, add_scrollbars=False):
+    # if "@@@DO_NOT_TRUNCATE@@@" in data:
+    #     return data
+
+    needs_truncation = False
+
+    # Calculate how much to show from start and end
+    chars_per_end = max_output_chars // 2
+
+    message = truncation_message(len(data), max_output_chars, add_scrollbars)
 
     # Remove previous truncation message if it exists
     if data.startswith(message):
@@ -36,3 +45,60 @@ def truncate_output(data, max_output_chars=2800, add_scrollbars=False):
         data = message + first_part + "\n[...]\n" + last_part
 
     return data
+
+
+class OutputTruncator:
+    """
+    Incremental version of `truncate_output`, for output that arrives in chunks.
+
+    Only the start and the end of the stream are kept, so writing a chunk costs O(len(chunk))
+    no matter how much output came before it.
+    """
+
+    def __init__(self, max_output_chars=2800, add_scrollbars=False):
+        self.max_output_chars = max_output_chars
+        self.add_scrollbars = add_scrollbars
+        self.reset()
+
+    def reset(self):
+        self.total_chars = 0
+        self._head = []
+        self._head_chars = 0
+        self._tail = deque()
+        self._tail_chars = 0
+
+    def write(self, data):
+        if not data:
+            return
+        self.total_chars += len(data)
+
+        # The head holds everything until we know we'll have to truncate
+        if self._head_chars < self.max_output_chars:
+            room = self.max_output_chars - self._head_chars
+            self._head.append(data[:room])
+            self._head_chars += min(room, len(data))
+
+        # The tail only ever needs the last `chars_per_end` characters
+        chars_per_end = self.max_output_chars // 2
+        if len(data) >= chars_per_end:
+            self._tail.clear()
+            self._tail_chars = 0
+            data = data[-chars_per_end:] if chars_per_end else ""
+        self._tail.append(data)
+        self._tail_chars += len(data)
+        while self._tail and self._tail_chars - len(self._tail[0]) >= chars_per_end:
+            self._tail_chars -= len(self._tail.popleft())
+
+    def getvalue(self):
+        head = "".join(self._head)
+        if self.total_chars <= self.max_output_chars:
+            return head
+
+        chars_per_end = self.max_output_chars // 2
+        tail = "".join(self._tail)
+        self._tail = deque([tail])  # Joined once, reused on the next read
+        message = truncation_message(
+            self.total_chars, self.max_output_chars, self.add_scrollbars
+        )
+        last_part = tail[-chars_per_end:] if chars_per_end else ""
+        return message + head[:chars_per_end] + "\n[...]\n" + last_part
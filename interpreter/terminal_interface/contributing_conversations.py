@@ -6,10 +6,14 @@ from typing import List, TypedDict
 from importlib.metadata import version, PackageNotFoundError
 import requests
 
+from interpreter.core.utils.conversation_journal import load_conversation
 from interpreter.terminal_interface.profiles.profiles import write_key_to_profile
 from interpreter.terminal_interface.utils.display_markdown_message import (
     display_markdown_message,
 )
+from interpreter.terminal_interface.utils.get_conversations import (
+    list_conversation_files,
+)
 
 contribute_cache_path = os.path.join(
     os.path.expanduser("~"), ".cache", "open-interpreter", "contribute.json"
@@ -143,22 +147,14 @@ def write_to_contribution_cache(contribution_cache: ContributionCache):
 
 
 def get_all_conversations(interpreter) -> List[List]:
-    def is_conversation_path(path: str):
-        _, ext = os.path.splitext(path)
-        return ext == ".json"
-
     history_path = interpreter.conversation_history_path
     all_conversations: List[List] = []
     conversation_files = (
-        os.listdir(history_path) if os.path.exists(history_path) else []
+        list_conversation_files(history_path) if os.path.exists(history_path) else []
     )
     for mpath in conversation_files:
-        if not is_conversation_path(mpath):
-            continue
         full_path = os.path.join(history_path, mpath)
-        with open(full_path, "r") as cfile:
-            conversation = json.load(cfile)
-            all_conversations.append(conversation)
+        all_conversations.append(load_conversation(full_path))
     return all_conversations
 
 
@@ -2,20 +2,35 @@
 This file handles conversations.
 """
 
-import json
 import os
 import platform
 import subprocess
 
 import inquirer
 
+from ..core.utils.conversation_index import ConversationIndex
+from ..core.utils.conversation_journal import load_conversation
 from .render_past_conversation import render_past_conversation
 from .utils.local_storage_path import get_storage_path
 
+PAGE_SIZE = 50
 
-def conversation_navigator(interpreter):
-    import time
 
+def readable_name(filename):
+    """
+    "First_few_words__September_23rd.json" -> "First few words... (September 23rd)"
+    """
+    return (
+        filename.replace(".jsonl", "")
+        .replace(".json", "")
+        .replace(".JSON", "")
+        .replace("__", "... (")
+        .replace("_", " ")
+        + ")"
+    )
+
+
+def conversation_navigator(interpreter, search=None):
     conversations_dir = get_storage_path("conversations")
 
     interpreter.display_message(
@@ -30,62 +45,72 @@ def conversation_navigator(interpreter):
         print(f"No conversations found in {conversations_dir}")
         return None
 
-    # Get list of all JSON files in the directory and sort them by modification time, newest first
-    json_files = sorted(
-        [f for f in os.listdir(conversations_dir) if f.endswith(".json")],
-        key=lambda x: os.path.getmtime(os.path.join(conversations_dir, x)),
-        reverse=True,
-    )
-
-    # Make a dict that maps reformatted "First few words... (September 23rd)" -> "First_few_words__September_23rd.json" (original file name)
-    readable_names_and_filenames = {}
-    for filename in json_files:
-        name = (
-            filename.replace(".json", "")
-            .replace(".JSON", "")
-            .replace("__", "... (")
-            .replace("_", " ")
-            + ")"
-        )
-        readable_names_and_filenames[name] = filename
-
-    # Add the option to open the folder. This doesn't map to a filename, we'll catch it
-    readable_names_and_filenames_list = list(readable_names_and_filenames.keys())
-    readable_names_and_filenames_list = [
-        "Open Folder →"
-    ] + readable_names_and_filenames_list
-
-    # Use inquirer to let the user select a file
-    questions = [
-        inquirer.List(
-            "name",
-            message="",
-            choices=readable_names_and_filenames_list,
-        ),
-    ]
-    answers = inquirer.prompt(questions)
-
-    # User chose to exit
-    if not answers:
-        return
+    # The index only reads conversations that changed since it last saw them
+    index = ConversationIndex(conversations_dir)
+    index.refresh()
+
+    if search:
+        total = index.count(search)
+        if total == 0:
+            print(f'No conversations found for "{search}"')
+            return None
+
+    # Page through conversations (newest first, or best match first), rather than listing them all at once
+    offset = 0
+    while True:
+        if search:
+            conversations = index.search(search, offset=offset, limit=PAGE_SIZE)
+        else:
+            conversations = index.list(offset=offset, limit=PAGE_SIZE)
+
+        # The labels are readable names like "First few words... (September 23rd)", the values are filenames
+        choices = [("Open Folder →", None)]
+        for conversation in conversations:
+            name = readable_name(conversation["filename"])
+            if conversation.get("snippet"):
+                name += f" — {conversation['snippet']}"
+            choices.append((name, conversation["filename"]))
+        has_more = offset + PAGE_SIZE < index.count(search)
+        if has_more:
+            choices.append(("More →", "MORE"))
+
+        # Use inquirer to let the user select a file
+        questions = [
+            inquirer.List(
+                "filename",
+                message="",
+                choices=choices,
+            ),
+        ]
+        answers = inquirer.prompt(questions)
+
+        # User chose to exit
+        if not answers:
+            return
+
+        if answers["filename"] == "MORE":
+            offset += PAGE_SIZE
+            continue
+        break
+
+    index.close()
 
     # If the user selected to open the folder, do so and return
-    if answers["name"] == "Open Folder →":
+    if answers["filename"] is None:
         open_folder(conversations_dir)
         return
 
-    selected_filename = readable_names_and_filenames[answers["name"]]
+    selected_filename = answers["filename"]
 
-    # Open the selected file and load the JSON data
-    with open(os.path.join(conversations_dir, selected_filename), "r") as f:
-        messages = json.load(f)
+    # Open the selected file and load the messages
+    messages = load_conversation(os.path.join(conversations_dir, selected_filename))
 
     # Pass the data into render_past_conversation
     render_past_conversation(messages)
 
     # Set the interpreter's settings to the loaded messages
     interpreter.messages = messages
-    interpreter.conversation_filename = selected_filename
+    interpreter.conversation_filename = selected_filename.replace(".jsonl", ".json")
 
     # Start the chat
     interpreter.chat()
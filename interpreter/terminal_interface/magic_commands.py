@@ -5,8 +5,10 @@ import sys
 import time
 from datetime import datetime
 
+from ..core.utils.conversation_journal import load_conversation
+from ..core.utils.prompt_cache import static_system_message_tokens
 from ..core.utils.system_debug_info import system_info
-from .utils.count_tokens import count_messages_tokens
+from .utils.count_tokens import count_messages_tokens, token_cost
 from .utils.export_to_markdown import export_to_markdown
 
 
@@ -162,27 +164,25 @@ def handle_save_message(self, json_path):
 def handle_load_message(self, json_path):
     if json_path == "":
         json_path = "messages.json"
-    if not json_path.endswith(".json"):
+    if not json_path.endswith((".json", ".jsonl")):
         json_path += ".json"
-    with open(json_path, "r") as f:
-        self.messages = json.load(f)
+    # Also loads conversation journals (.jsonl) from the conversations folder
+    self.messages = load_conversation(json_path)
 
     self.display_message(f"> messages json loaded from {os.path.abspath(json_path)}")
 
 
 def handle_count_tokens(self, prompt):
-    messages = [{"role": "system", "message": self.system_message}] + self.messages
-
     outputs = []
 
-    if len(self.messages) == 0:
-        (conversation_tokens, conversation_cost) = count_messages_tokens(
-            messages=messages, model=self.llm.model
-        )
-    else:
-        (conversation_tokens, conversation_cost) = count_messages_tokens(
-            messages=messages, model=self.llm.model
-        )
+    (conversation_tokens, conversation_cost) = count_messages_tokens(
+        messages=self.messages, model=self.llm.model
+    )
+
+    # The system prompt's token count is cached, it rarely changes
+    system_tokens = static_system_message_tokens(self)
+    conversation_tokens += system_tokens
+    conversation_cost += token_cost(system_tokens, model=self.llm.model)
 
     outputs.append(
         (
@@ -10,6 +10,7 @@ from interpreter.terminal_interface.contributing_conversations import (
     contribute_conversations,
 )
 
+from ..core.server_workers import WORKER_PORT_VARIABLE, run_workers
 from .conversation_navigator import conversation_navigator
 from .profiles.profiles import open_storage_dir, profile, reset_profile
 from .utils.check_for_update import check_for_update
@@ -264,11 +265,21 @@ def start_terminal_interface(interpreter):
             "help_text": "list conversations to resume",
             "type": bool,
         },
+        {
+            "name": "search",
+            "help_text": "with --conversations, only list conversations that mention this text",
+            "type": str,
+        },
         {
             "name": "server",
             "help_text": "start open interpreter as a server",
             "type": bool,
         },
+        {
+            "name": "workers",
+            "help_text": "with --server, run this many worker processes behind one port (sessions are spread across them)",
+            "type": int,
+        },
         {
             "name": "version",
             "help_text": "get Open Interpreter's version number",
@@ -543,7 +554,7 @@ Use """ to write multi-line messages.
 
     # If --conversations is used, run conversation_navigator
     if args.conversations:
-        conversation_navigator(interpreter)
+        conversation_navigator(interpreter, search=args.search)
         return
 
     if interpreter.llm.model in [
@@ -562,7 +573,15 @@ Use """ to write multi-line messages.
         )  # This should actually just run interpreter.llm.load() once that's == to validate_llm_settings
 
     if args.server:
-        interpreter.server.run()
+        if args.workers and args.workers > 1:
+            run_workers(interpreter, args.workers)
+        elif os.getenv(WORKER_PORT_VARIABLE):
+            # One of the workers of `--server --workers N`, behind its router
+            interpreter.server.run(
+                host="127.0.0.1", port=int(os.environ[WORKER_PORT_VARIABLE])
+            )
+        else:
+            interpreter.server.run()
         return
 
     interpreter.in_terminal_interface = True
@@ -1,3 +1,5 @@
+import functools
+
 try:
     import tiktoken
     from litellm import cost_per_token
@@ -6,25 +8,29 @@ except:
     pass
 
 
+@functools.lru_cache(maxsize=None)
+def get_encoder(model="gpt-4"):
+    """
+    The tokenizer for a model. It's only loaded once per model
+    """
+    # Fix bug where models starting with openai/ for example can't find tokenizer
+    if "/" in model:
+        model = model.split("/")[-1]
+
+    # At least give an estimate if we can't find the tokenizer
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        print(f"Could not find tokenizer for {model}. Defaulting to gpt-4 tokenizer.")
+        return tiktoken.encoding_for_model("gpt-4")
+
+
 def count_tokens(text="", model="gpt-4"):
     """
     Count the number of tokens in a string
     """
     try:
-        # Fix bug where models starting with openai/ for example can't find tokenizer
-        if "/" in model:
-            model = model.split("/")[-1]
-
-        # At least give an estimate if we can't find the tokenizer
-        try:
-            encoder = tiktoken.encoding_for_model(model)
-        except KeyError:
-            print(
-                f"Could not find tokenizer for {model}. Defaulting to gpt-4 tokenizer."
-            )
-            encoder = tiktoken.encoding_for_model("gpt-4")
-
-        return len(encoder.encode(text))
+        return len(get_encoder(model).encode(text))
     except:
         # Non-essential feature
         return 0
@@ -3,7 +3,20 @@ import os
 from .local_storage_path import get_storage_path
 
 
+def list_conversation_files(conversations_dir):
+    """
+    Conversation files in a directory. Conversations are journaled in .jsonl files, older ones are .json files.
+    When a conversation has both (it was resumed after we started journaling), only the journal is listed.
+    """
+    filenames = os.listdir(conversations_dir)
+    journals = {f for f in filenames if f.endswith(".jsonl")}
+    return [
+        f
+        for f in filenames
+        if f in journals or (f.endswith(".json") and f + "l" not in journals)
+    ]
+
+
 def get_conversations():
     conversations_dir = get_storage_path("conversations")
-    json_files = [f for f in os.listdir(conversations_dir) if f.endswith(".json")]
-    return json_files
+    return list_conversation_files(conversations_dir)
@@ -0,0 +1,92 @@
+"""
+Times convert_to_openai_messages on a long conversation with images, the way Llm.run calls it each turn:
+once with no cache, and once more after a new message is added with the cache from the turn before.
+
+Images are saved to a temporary folder and sent as paths, like screenshots. Every tenth one is noise,
+too big to send without shrinking.
+
+    python tests/benchmarks/bench_convert_messages.py --messages 500 --images 50
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from PIL import Image
+
+from interpreter import OpenInterpreter
+from interpreter.core.llm.utils.convert_to_openai_messages import (
+    convert_to_openai_messages,
+)
+from interpreter.core.utils.image_cache import image_cache
+
+
+def make_history(count, images, folder):
+    messages = []
+    image_every = max(count // images, 1)
+    for i in range(count):
+        if i % image_every == 0 and len(messages) // image_every < images:
+            number = i // image_every
+            path = os.path.join(folder, f"screenshot_{number}.png")
+            if number % 10 == 0:
+                noise = random.randbytes(1500 * 1500 * 3)
+                image = Image.frombytes("RGB", (1500, 1500), noise)
+            else:
+                image = Image.linear_gradient("L").resize((1920, 1080)).convert("RGB")
+            image.save(path)
+            message = {"role": "computer", "type": "image", "format": "path"}
+            messages.append(dict(message, content=path))
+        elif i % 3 == 0:
+            message = {"role": "user", "type": "message"}
+            messages.append(dict(message, content=f"Step {i}, please."))
+        elif i % 3 == 1:
+            message = {"role": "assistant", "type": "code", "format": "python"}
+            messages.append(dict(message, content=f"print({i})"))
+        else:
+            message = {"role": "computer", "type": "console", "format": "output"}
+            messages.append(dict(message, content=f"{i}\n" * 20))
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--images", type=int, default=50)
+    args = parser.parse_args()
+
+    interpreter = OpenInterpreter(disable_telemetry=True)
+    folder = tempfile.mkdtemp()
+    messages = make_history(args.messages, args.images, folder)
+
+    def convert(cache):
+        start = time.perf_counter()
+        converted = convert_to_openai_messages(
+            messages,
+            function_calling=True,
+            vision=True,
+            shrink_images=True,
+            interpreter=interpreter,
+            cache=cache,
+        )
+        return converted, time.perf_counter() - start
+
+    cache = {}
+    convert(cache)
+    messages.append({"role": "user", "type": "message", "content": "Next step?"})
+    # Shrunk images are cached too
+    image_cache.clear()
+    uncached, uncached_time = convert(None)
+    cached, cached_time = convert(cache)
+    assert cached == uncached, "cached conversion differs"
+
+    print(
+        f"{len(messages)} messages, {args.images} images: "
+        f"{uncached_time * 1000:.1f}ms without the cache, "
+        f"{cached_time * 1000:.2f}ms for the next turn with it"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Time to first output for a session's first Python code block, with and without starting the kernel while the code streams.
+
+A fake LLM writes a short Python block a token at a time, `--token-delay` seconds apart, then we time how long
+it takes from the first code token until the code's output arrives.
+
+    python tests/benchmarks/bench_first_output.py --token-delay 0.05
+"""
+
+import argparse
+import time
+
+from interpreter import OpenInterpreter
+
+CODE = "total = 0\nfor i in range(10):\n    total += i\nprint(total)\n"
+
+
+def make_llm_run(token_delay):
+    def fake_llm_run(messages):
+        if messages[-1]["type"] == "console":
+            yield {"type": "message", "content": "Done."}
+            return
+        yield {"type": "message", "content": "Adding numbers."}
+        for token in CODE.split(" "):
+            time.sleep(token_delay)
+            yield {"type": "code", "format": "python", "content": token + " "}
+
+    return fake_llm_run
+
+
+def time_to_first_output(token_delay, warm_up):
+    interpreter = OpenInterpreter(
+        auto_run=True, disable_telemetry=True, conversation_history=False
+    )
+    interpreter.computer.import_computer_api = False
+    interpreter.llm.run = make_llm_run(token_delay)
+    if not warm_up:
+        interpreter.computer.terminal.warm_up = lambda language: None
+
+    first_code = None
+    first_output = None
+    for chunk in interpreter.chat("Add some numbers", display=False, stream=True):
+        if chunk.get("type") == "code" and first_code is None:
+            first_code = time.perf_counter()
+        if (
+            chunk.get("type") == "console"
+            and chunk.get("format") == "output"
+            and chunk.get("content")
+            and first_output is None
+        ):
+            first_output = time.perf_counter()
+
+    interpreter.computer.terminate()
+    return first_output - first_code
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--token-delay", type=float, default=0.05)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    for warm_up in [False, True]:
+        times = [
+            time_to_first_output(args.token_delay, warm_up) for _ in range(args.runs)
+        ]
+        label = "warm up while streaming" if warm_up else "start on run"
+        print(f"{label}: best {min(times):.2f}s, mean {sum(times) / len(times):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
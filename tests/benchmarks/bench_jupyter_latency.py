@@ -0,0 +1,88 @@
+"""
+Per-command latency of the Python (Jupyter) language: how long a trivial command takes from `run()` to its last output,
+on its own and with a second execution in flight on the same kernel. Also times a tight loop, which shouldn't run much
+slower than it does in plain Python.
+
+    python tests/benchmarks/bench_jupyter_latency.py --runs 20
+"""
+
+import argparse
+import threading
+import time
+
+from interpreter import OpenInterpreter
+from interpreter.core.computer.terminal.languages.python import Python
+
+
+def output(language, code):
+    return "".join(
+        chunk["content"] for chunk in language.run(code) if chunk["format"] == "output"
+    )
+
+
+def timed(language, code, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output(language, code)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    interpreter = OpenInterpreter(disable_telemetry=True)
+    language = Python(interpreter.computer)
+    try:
+        times = timed(language, 'print("hi")', args.runs)
+        print(
+            f"sequential: median {times[len(times) // 2] * 1000:.1f}ms, max {times[-1] * 1000:.1f}ms"
+        )
+
+        loop = "total = 0\nfor i in range(100000):\n    total += i\nprint(total)"
+        start = time.perf_counter()
+        chunks = list(language.run(loop))
+        elapsed = time.perf_counter() - start
+        plain_start = time.perf_counter()
+        exec(loop.replace("print(total)", ""), {})
+        plain = time.perf_counter() - plain_start
+        print(
+            f"100k iteration loop: {elapsed * 1000:.0f}ms, {len(chunks)} chunks "
+            f"(plain python: {plain * 1000:.0f}ms)"
+        )
+
+        # Two threads share the kernel. Each should only see its own output.
+        results = {}
+
+        def run(name):
+            results[name] = [
+                output(language, f'print("{name}")') for _ in range(args.runs)
+            ]
+
+        start = time.perf_counter()
+        names = ("alpha", "omega")
+        threads = [threading.Thread(target=run, args=(name,)) for name in names]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        mixed = sum(
+            name not in out or any(other in out for other in names if other != name)
+            for name, outs in results.items()
+            for out in outs
+        )
+        print(
+            f"concurrent: {elapsed / args.runs * 1000:.1f}ms per pair, "
+            f"{mixed} of {2 * args.runs} outputs went to the wrong run"
+        )
+    finally:
+        language.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Throughput of the server with concurrent sessions, for 1 up to --max-workers worker processes (`--server --workers N`).
+
+The server runs a fake LLM that burns `--work` seconds of CPU per reply, like a busy turn would.
+`--sessions` clients each send `--requests` requests to the OpenAI-compatible endpoint, all at once,
+and we report completed requests per second. It should grow about linearly up to your core count.
+
+    python tests/benchmarks/bench_server_workers.py --max-workers 4 --sessions 16
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+PROFILE = """
+import time
+
+interpreter.llm.model = "gpt-4o"
+interpreter.llm.supports_functions = False
+interpreter.disable_telemetry = True
+
+
+def completions(**params):
+    end = time.process_time() + {work}
+    while time.process_time() < end:
+        pass
+    yield {{"choices": [{{"delta": {{"content": "Done."}}}}]}}
+
+
+interpreter.llm.completions = completions
+"""
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers, profile, port):
+    script = "from interpreter.terminal_interface.start_terminal_interface import main; main()"
+    command = [sys.executable, "-c", script, "--server", "--profile", profile]
+    if workers > 1:
+        command += ["--workers", str(workers)]
+    env = dict(os.environ, INTERPRETER_PORT=str(port), INTERPRETER_REQUIRE_AUTH="False")
+    server = subprocess.Popen(
+        command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url + "/heartbeat", timeout=1).raise_for_status()
+            return server, url
+        except httpx.HTTPError:
+            time.sleep(0.25)
+    server.kill()
+    raise RuntimeError("The server didn't start.")
+
+
+def run_session(url, session, requests):
+    with httpx.Client(timeout=None) as client:
+        for i in range(requests):
+            response = client.post(
+                url + "/openai/chat/completions",
+                json={
+                    "model": "open-interpreter",
+                    "messages": [{"role": "user", "content": f"Request {i}"}],
+                    "stream": False,
+                    "user": session,
+                },
+            )
+            response.raise_for_status()
+
+
+def throughput(workers, profile, sessions, requests):
+    server, url = start_server(workers, profile, free_port())
+    try:
+        # One request per session first, so sessions' interpreters are made before timing
+        with ThreadPoolExecutor(sessions) as executor:
+            list(executor.map(lambda s: run_session(url, f"s{s}", 1), range(sessions)))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(sessions) as executor:
+            list(
+                executor.map(
+                    lambda s: run_session(url, f"s{s}", requests), range(sessions)
+                )
+            )
+        return sessions * requests / (time.perf_counter() - start)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--work", type=float, default=0.05)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+        f.write(PROFILE.format(work=args.work))
+
+    try:
+        baseline = None
+        workers = 1
+        while workers <= args.max_workers:
+            rate = throughput(workers, f.name, args.sessions, args.requests)
+            baseline = baseline or rate
+            print(
+                f"{workers} worker(s): {rate:.1f} requests/s ({rate / baseline:.2f}x)"
+            )
+            workers *= 2
+    finally:
+        os.remove(f.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Streams a large amount of console output through `interpreter.chat(stream=True)`.
+
+No LLM or kernel is needed: a fake LLM asks to run code in a fake language that prints N lines.
+
+    python tests/benchmarks/bench_streaming_chat.py --lines 1000000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from interpreter import OpenInterpreter
+from interpreter.core.computer.terminal.base_language import BaseLanguage
+
+
+class Lines(BaseLanguage):
+    name = "lines"
+    count = 1_000_000
+
+    def __init__(self, computer):
+        self.computer = computer
+
+    def run(self, code):
+        for i in range(self.count):
+            yield {"type": "console", "format": "output", "content": f"line {i}\n"}
+
+
+def fake_llm_run(messages):
+    if messages[-1]["type"] == "console":
+        yield {"type": "message", "content": "Done."}
+        return
+    for token in ["Printing", " lines", "."]:
+        yield {"type": "message", "content": token}
+    yield {"type": "code", "format": "lines", "content": "go"}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--memory", action="store_true", help="Also trace allocations")
+    args = parser.parse_args()
+
+    Lines.count = args.lines
+
+    interpreter = OpenInterpreter(
+        auto_run=True, disable_telemetry=True, conversation_history=False
+    )
+    interpreter.computer.languages = [Lines]
+    interpreter.llm.run = fake_llm_run
+
+    if args.memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    chunks = 0
+    for _ in interpreter.chat("Print some lines", display=False, stream=True):
+        chunks += 1
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.lines:,} lines, {chunks:,} chunks in {elapsed:.2f}s")
+    print(f"{args.lines / elapsed:,.0f} lines/s")
+    if args.memory:
+        _, peak = tracemalloc.get_traced_memory()
+        print(f"Peak traced memory: {peak / 1024 / 1024:.1f} MiB")
+    output = [m for m in interpreter.messages if m["type"] == "console"][-1]
+    print(f"Stored output: {len(output['content']):,} characters")
+
+
+if __name__ == "__main__":
+    main()
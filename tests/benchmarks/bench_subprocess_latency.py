@@ -0,0 +1,73 @@
+"""
+Per-command latency of the subprocess languages: how long a trivial command takes from `run()` to its last output.
+Also the time it takes to stream 200k lines of output. Languages with a control channel are measured with and without it.
+
+Languages that aren't installed are skipped.
+
+    python tests/benchmarks/bench_subprocess_latency.py --runs 20
+"""
+
+import argparse
+import shutil
+import time
+
+from interpreter.core.computer.terminal.languages.javascript import JavaScript
+from interpreter.core.computer.terminal.languages.r import R
+from interpreter.core.computer.terminal.languages.ruby import Ruby
+from interpreter.core.computer.terminal.languages.shell import Shell
+
+COMMANDS = [
+    (Shell, "echo hi", "seq 1 200000"),
+    (JavaScript, 'console.log("hi")', 'console.log("line\\n".repeat(200000))'),
+    (R, 'print("hi")', 'cat(rep("line\\n", 200000), sep="")'),
+    (Ruby, 'puts "hi"', 'puts "line\\n" * 200000'),
+]
+
+
+def measure(language, code, runs):
+    # The first run includes starting the process
+    output = "".join(
+        chunk["content"] for chunk in language.run(code) if chunk["format"] == "output"
+    )
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for _ in language.run(code):
+            pass
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times, output
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    for lang_class, code, throughput_code in COMMANDS:
+        for control_channel in [False, True]:
+            language = lang_class()
+            if control_channel and not language.uses_control_channel:
+                continue
+            if not control_channel:
+                language.control_start_cmd = None
+            if not shutil.which(language.start_cmd[0]):
+                print(f"{lang_class.name}: skipped ({language.start_cmd[0]} not found)")
+                break
+
+            mode = "control channel" if control_channel else "markers"
+            times, output = measure(language, code, args.runs)
+            print(
+                f"{lang_class.name} ({mode}): median {times[len(times) // 2] * 1000:.1f}ms, "
+                f"max {times[-1] * 1000:.1f}ms (output: {output.strip()!r})"
+            )
+            times, output = measure(language, throughput_code, 3)
+            print(
+                f"{lang_class.name} ({mode}): 200k lines in {times[len(times) // 2] * 1000:.0f}ms "
+                f"({len(output.splitlines())} lines)"
+            )
+            language.terminate()
+
+
+if __name__ == "__main__":
+    main()
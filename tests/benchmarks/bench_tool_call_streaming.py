@@ -0,0 +1,61 @@
+"""
+Streams one large tool call, token by token, through run_tool_calling_llm, the way a model writes a long code block.
+
+No LLM is needed: a fake `llm.completions` sends the call's arguments a few characters at a time.
+
+    python tests/benchmarks/bench_tool_call_streaming.py --kb 100
+"""
+
+import argparse
+import json
+import time
+from types import SimpleNamespace
+
+from interpreter import OpenInterpreter
+from interpreter.core.llm.run_tool_calling_llm import run_tool_calling_llm
+
+
+def fake_completions(arguments, token_size):
+    def completions(**params):
+        for i in range(0, len(arguments), token_size):
+            tool_call = SimpleNamespace(
+                index=0,
+                id="call_1" if i == 0 else None,
+                function=SimpleNamespace(
+                    name="execute" if i == 0 else None,
+                    arguments=arguments[i : i + token_size],
+                ),
+            )
+            yield {"choices": [{"delta": {"tool_calls": [tool_call]}}]}
+
+    return completions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kb", type=int, default=100)
+    parser.add_argument("--token-size", type=int, default=4)
+    args = parser.parse_args()
+
+    line = 'print("The quick brown fox jumps over the lazy dog", i)  # \\ "quoted"\n'
+    code = line * (args.kb * 1024 // len(line))
+    arguments = json.dumps({"language": "python", "code": code})
+
+    interpreter = OpenInterpreter(disable_telemetry=True)
+    interpreter.llm.completions = fake_completions(arguments, args.token_size)
+
+    start = time.perf_counter()
+    chunks = list(run_tool_calling_llm(interpreter.llm, {"messages": []}))
+    elapsed = time.perf_counter() - start
+
+    streamed = "".join(chunk["content"] for chunk in chunks)
+    assert streamed == code, "streamed code doesn't match"
+    tokens = -(-len(arguments) // args.token_size)
+    print(
+        f"{len(arguments) / 1024:.0f} KB in {tokens:,} tokens: {elapsed * 1000:.0f}ms "
+        f"({elapsed / tokens * 1e6:.1f}µs per token), {len(chunks):,} code chunks"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Times the context trimming done before every LLM call, over a long session, each turn adding a code block and its output.
+Compares tokentrim (what Llm.run used to call) with trim_messages.
+
+tiktoken downloads its encodings, so when they can't be loaded a byte level encoding
+(with cl100k's word splitting) stands in for them. Counts are smaller, the work done per character is similar.
+
+tokentrim's time per turn grows with the square of the conversation's length, so keep --turns small.
+
+    python tests/benchmarks/bench_trim_messages.py --turns 20
+"""
+
+import argparse
+import time
+
+import tiktoken
+import tokentrim
+
+from interpreter.core.llm.utils.trim_messages import trim_messages
+
+CL100K_PATTERN = r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"""
+
+
+def use_offline_encoding_if_needed():
+    try:
+        tiktoken.get_encoding("cl100k_base")
+        return
+    except Exception:
+        pass
+    encoding = tiktoken.Encoding(
+        name="bytes",
+        pat_str=CL100K_PATTERN,
+        mergeable_ranks={bytes([i]): i for i in range(256)},
+        special_tokens={"<|endoftext|>": 256},
+    )
+    tiktoken.get_encoding = lambda name: encoding
+    tiktoken.encoding_for_model = lambda model: encoding
+    print("(tiktoken's encodings aren't available, using a byte level one)")
+
+
+def turn(i):
+    code = "\n".join(f"print('line {j} of turn {i}')" for j in range(20))
+    output = "\n".join(f"line {j} of turn {i}" for j in range(40))
+    return [
+        {"role": "user", "content": f"Please run step {i} of the analysis."},
+        {"role": "assistant", "content": f"```python\n{code}\n```"},
+        {"role": "user", "content": f"Code output: {output}\n\nWhat's next?"},
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--max-tokens", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    use_offline_encoding_if_needed()
+    system_message = "You are Open Interpreter. " * 200
+
+    def old_trim(messages):
+        return tokentrim.trim(
+            messages, system_message=system_message, max_tokens=args.max_tokens
+        )
+
+    def new_trim(messages):
+        return trim_messages(
+            messages, system_message, args.max_tokens, ["Code output: "]
+        )
+
+    for name, trim in [("tokentrim", old_trim), ("trim_messages", new_trim)]:
+        messages = []
+        elapsed = 0
+        for i in range(args.turns):
+            messages = messages + turn(i)
+            start = time.perf_counter()
+            trim([dict(m) for m in messages])
+            elapsed += time.perf_counter() - start
+        last_start = time.perf_counter()
+        trim([dict(m) for m in messages])
+        last = time.perf_counter() - last_start
+        print(
+            f"{name:>14}: {elapsed * 1000:8.1f}ms over {args.turns} turns, "
+            f"{last * 1000:6.2f}ms for turn {args.turns + 1}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Bytes sent, frames sent and encoding time for a streamed reply (tokens, then an image), with the default framing
+(one JSON text frame per chunk) and with compact framing (coalesced batches, and images as binary frames).
+
+    python tests/benchmarks/bench_websocket_framing.py --tokens 2000 --image-size 512
+"""
+
+import argparse
+import base64
+import io
+import json
+import time
+
+from PIL import Image
+
+from interpreter.core.utils.lmc_framing import encode_frame, frames
+
+
+def make_outputs(tokens, image_size):
+    buffered = io.BytesIO()
+    Image.effect_noise((image_size, image_size), 50).save(buffered, format="PNG")
+    outputs = [{"role": "assistant", "type": "message", "start": True}]
+    outputs += [
+        {"role": "assistant", "type": "message", "content": f"token{i} "}
+        for i in range(tokens)
+    ]
+    outputs.append({"role": "assistant", "type": "message", "end": True})
+    outputs.append(
+        {
+            "role": "computer",
+            "type": "image",
+            "format": "base64.png",
+            "content": base64.b64encode(buffered.getvalue()).decode(),
+        }
+    )
+    outputs.append({"role": "server", "type": "status", "content": "complete"})
+    return outputs
+
+
+def measure(encode, outputs, runs=5):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        data = encode(outputs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    sent = sum(len(d.encode("utf-8") if isinstance(d, str) else d) for d in data)
+    return len(data), sent, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--image-size", type=int, default=512)
+    parser.add_argument("--batch", type=int, default=20, help="chunks per batch")
+    args = parser.parse_args()
+    outputs = make_outputs(args.tokens, args.image_size)
+
+    def default(outputs):
+        return [json.dumps(output) for output in outputs]
+
+    def compact(outputs):
+        # As if `--batch` chunks arrive within each coalescing window
+        data = []
+        for i in range(0, len(outputs), args.batch):
+            data += [encode_frame(f) for f in frames(outputs[i : i + args.batch])]
+        return data
+
+    for name, encode in [("default", default), ("compact", compact)]:
+        count, sent, elapsed = measure(encode, outputs)
+        print(
+            f"{name}: {count} frames, {sent / 1024:.0f} KiB, {elapsed * 1000:.1f} ms to encode"
+        )
+
+
+if __name__ == "__main__":
+    main()
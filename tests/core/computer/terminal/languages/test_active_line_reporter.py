@@ -0,0 +1,49 @@
+import sys
+import unittest
+
+from interpreter.core.computer.terminal.languages.active_line_reporter import (
+    find_active_line,
+)
+
+# Stands in for IPython's run_code, which calls the cell, then showtraceback if it raised
+SHELL = """
+def run_code(cell):
+    try:
+        return cell()
+    except ZeroDivisionError:
+        return showtraceback()
+
+def showtraceback():
+    return sys._getframe()
+"""
+
+
+def compile_function(source, filename, name):
+    namespace = {"sys": sys}
+    exec(compile(source, filename, "exec"), namespace)
+    return namespace[name]
+
+
+class TestFindActiveLine(unittest.TestCase):
+    def setUp(self):
+        self.run_code = compile_function(
+            SHELL, "/site-packages/IPython/core/interactiveshell.py", "run_code"
+        )
+
+    def test_line_in_cell(self):
+        for filename in ["/tmp/ipykernel_5558/2354412189.py", "<ipython-input-3-1f>"]:
+            cell = compile_function(
+                "def cell():\n\n    return sys._getframe()", filename, "cell"
+            )
+            self.assertEqual(find_active_line(self.run_code(cell)), 3)
+
+    def test_ipython_frames_are_not_cells(self):
+        cell = compile_function(
+            "def cell():\n    1/0", "/tmp/ipykernel_5558/2354412189.py", "cell"
+        )
+        # Showing the traceback, once the cell has raised
+        self.assertIsNone(find_active_line(self.run_code(cell)))
+
+
+if __name__ == "__main__":
+    unittest.main()
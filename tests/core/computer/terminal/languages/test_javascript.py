@@ -0,0 +1,51 @@
+import shutil
+import unittest
+
+from interpreter.core.computer.terminal.languages.javascript import JavaScript
+
+
+@unittest.skipUnless(shutil.which("node"), "needs node")
+class TestJavaScript(unittest.TestCase):
+    def setUp(self):
+        self.javascript = JavaScript()
+        if not self.javascript.uses_control_channel:
+            self.skipTest("needs a control channel")
+
+    def tearDown(self):
+        self.javascript.terminate()
+
+    def output(self, code):
+        return "".join(
+            chunk["content"]
+            for chunk in self.javascript.run(code)
+            if chunk["format"] == "output"
+        ).strip()
+
+    def test_runner_names_are_free(self):
+        self.assertEqual(self.output("const fs = require('fs')\ntypeof fs"), "'object'")
+        self.assertEqual(self.javascript.exit_code, 0)
+        self.assertEqual(self.output("const readline = 1\nreadline"), "1")
+        self.assertEqual(self.output("var vm = 2\nvm"), "2")
+        self.assertEqual(self.javascript.exit_code, 0)
+
+    def test_let_declared_again(self):
+        self.assertEqual(self.output("let x = 1\nx"), "1")
+        self.assertEqual(self.output("let x = 2\nx"), "2")
+        self.assertEqual(self.javascript.exit_code, 0)
+
+    def test_function_named_like_the_runners(self):
+        self.assertEqual(self.output("function frame() { return 3 }\nframe()"), "3")
+        # Functions are kept for later runs, and the runner still reports
+        self.assertEqual(self.output("frame() + 1"), "4")
+        self.assertEqual(self.javascript.exit_code, 0)
+
+    def test_active_lines(self):
+        chunks = list(self.javascript.run("console.log('a')\nconsole.log('b')"))
+        self.assertEqual(
+            [chunk["content"] for chunk in chunks],
+            [1, "a\n", 2, "b\n"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
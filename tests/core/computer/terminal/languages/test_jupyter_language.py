@@ -0,0 +1,96 @@
+import threading
+import time
+import unittest
+
+from interpreter import OpenInterpreter
+from interpreter.core.computer.terminal.languages.python import Python
+
+
+class TestJupyterLanguage(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.python = Python(OpenInterpreter(disable_telemetry=True).computer)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.python.terminate()
+
+    def output(self, code):
+        return "".join(
+            chunk["content"]
+            for chunk in self.python.run(code)
+            if chunk["format"] == "output"
+        )
+
+    def test_run_ends_when_kernel_is_idle(self):
+        self.assertEqual(self.output("print('hi')").strip(), "hi")
+        self.assertEqual(self.output("x = 1").strip(), "")
+        self.assertEqual(self.python._executions, {})
+
+    def test_active_lines_are_reported_without_touching_output(self):
+        code = "import time\n\ntime.sleep(0.5)\ndef f():\n    time.sleep(0.5)\nf()\nprint('done')"
+        chunks = list(self.python.run(code))
+
+        active_lines = [c["content"] for c in chunks if c["format"] == "active_line"]
+        self.assertEqual(active_lines, [3, 5])
+        self.assertEqual(
+            [c for c in chunks if c["format"] == "output"],
+            [{"type": "console", "format": "output", "content": "done\n"}],
+        )
+
+    def test_raising_cell_only_reports_its_own_lines(self):
+        for _ in range(3):
+            chunks = list(self.python.run("import time\ntime.sleep(0.3)\n1/0"))
+            active_lines = [
+                c["content"] for c in chunks if c["format"] == "active_line"
+            ]
+            self.assertLessEqual(set(active_lines), {2, 3})
+            output = "".join(c["content"] for c in chunks if c["format"] == "output")
+            self.assertIn("ZeroDivisionError", output)
+
+    def test_concurrent_runs_get_their_own_output(self):
+        outputs = {}
+
+        def run(name, code):
+            outputs[name] = self.output(code)
+
+        slow = threading.Thread(
+            target=run, args=("slow", "import time\ntime.sleep(0.5)\nprint('slow')")
+        )
+        slow.start()
+        time.sleep(0.1)
+        run("fast", "print('fast')")
+        slow.join()
+
+        self.assertEqual(outputs["slow"].strip(), "slow")
+        self.assertEqual(outputs["fast"].strip(), "fast")
+
+    def test_stop_interrupts_running_code(self):
+        chunks = self.python.run("import time\nprint('started')\ntime.sleep(30)")
+        for chunk in chunks:
+            if chunk["format"] == "output" and "started" in chunk["content"]:
+                break
+        start = time.time()
+        self.python.stop()
+        output = "".join(
+            chunk["content"] for chunk in chunks if chunk["format"] == "output"
+        )
+
+        self.assertIn("KeyboardInterrupt", output)
+        self.assertLess(time.time() - start, 10)
+        self.assertEqual(self.output("print('after')").strip(), "after")
+
+    def test_abandoned_run_is_interrupted(self):
+        chunks = self.python.run("import time\nprint('started')\ntime.sleep(30)")
+        for chunk in chunks:
+            if chunk["format"] == "output":
+                break
+        chunks.close()
+
+        start = time.time()
+        self.assertEqual(self.output("print('next')").strip(), "next")
+        self.assertLess(time.time() - start, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+
+from interpreter.core.computer.terminal.languages.shell import Shell
+from interpreter.core.computer.terminal.languages.subprocess_language import (
+    FrameReader,
+    SubprocessLanguage,
+    encode_frame,
+)
+
+
+class TestSubprocessLanguage(unittest.TestCase):
+    def setUp(self):
+        self.shell = Shell()
+
+    def tearDown(self):
+        self.shell.terminate()
+
+    def output(self, code):
+        return "".join(
+            chunk["content"]
+            for chunk in self.shell.run(code)
+            if chunk["format"] == "output"
+        )
+
+    def test_output_arrives_in_order_with_stderr(self):
+        self.assertEqual(
+            self.output("echo one; echo two >&2; sleep 0.2; echo three").split(),
+            ["one", "two", "three"],
+        )
+        # The next run only sees its own output
+        self.assertEqual(self.output("echo four").strip(), "four")
+
+    def test_run_ends_when_process_exits(self):
+        self.output("echo started")
+        self.assertEqual(self.output("echo bye; exit").strip(), "bye")
+
+    def test_frames_split_across_reads(self):
+        data = encode_frame({"event": "end", "id": 1}) + encode_frame({"line": 2})
+        reader = FrameReader()
+        self.assertEqual(reader.feed(data[:3]), [])
+        self.assertEqual(reader.feed(data[3:-2]), [{"event": "end", "id": 1}])
+        self.assertEqual(reader.feed(data[-2:]), [{"line": 2}])
+
+    def test_control_channel(self):
+        if not self.shell.uses_control_channel:
+            self.skipTest("needs bash or zsh")
+
+        chunks = list(self.shell.run("echo one\nfalse"))
+        self.assertEqual(
+            chunks,
+            [
+                {"type": "console", "format": "active_line", "content": 1},
+                {"type": "console", "format": "output", "content": "one\n"},
+                {"type": "console", "format": "active_line", "content": 2},
+            ],
+        )
+        self.assertEqual(self.shell.exit_code, 1)
+
+        # Long code is run from a file, which is removed after
+        self.shell.file_payload_size = 10
+        files = set(os.listdir(tempfile.gettempdir()))
+        self.assertEqual(self.output("echo " + "a" * 20).strip(), "a" * 20)
+        self.assertEqual(self.shell.exit_code, 0)
+        self.assertEqual(set(os.listdir(tempfile.gettempdir())), files)
+
+    def test_control_channel_needs_control_command(self):
+        class Markers(SubprocessLanguage):
+            file_extension = "sh"
+
+            def __init__(self):
+                super().__init__()
+                self.start_cmd = self.control_start_cmd = ["bash"]
+
+            def preprocess_code(self, code):
+                return code + '\necho "##end_of_execution##"'
+
+            def detect_end_of_execution(self, line):
+                return "##end_of_execution##" in line
+
+        language = Markers()
+        try:
+            self.assertFalse(language.uses_control_channel)
+            output = "".join(chunk["content"] for chunk in language.run("echo hi"))
+            self.assertEqual(output.strip(), "hi")
+        finally:
+            language.terminate()
+
+
+if __name__ == "__main__":
+    unittest.main()
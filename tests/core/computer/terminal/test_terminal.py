@@ -0,0 +1,111 @@
+import threading
+import time
+import unittest
+
+from interpreter import OpenInterpreter
+from interpreter.core.computer.terminal.base_language import BaseLanguage
+
+
+class Slow(BaseLanguage):
+    """
+    Takes until `ready` is set to start.
+    """
+
+    name = "slow"
+    ready = threading.Event()
+    instances = 0
+
+    def __init__(self, computer):
+        Slow.ready.wait(10)
+        Slow.instances += 1
+
+    def run(self, code):
+        yield {"type": "console", "format": "output", "content": code}
+
+
+class Counted(BaseLanguage):
+    """
+    Prints which instance ran it.
+    """
+
+    name = "counted"
+    started = []
+    terminated = []
+
+    def __init__(self, computer):
+        Counted.started.append(self)
+
+    def run(self, code):
+        yield {
+            "type": "console",
+            "format": "output",
+            "content": str(Counted.started.index(self)),
+        }
+
+    def terminate(self):
+        Counted.terminated.append(self)
+
+
+def wait_for(condition):
+    for _ in range(100):
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class TestTerminal(unittest.TestCase):
+    def setUp(self):
+        self.interpreter = OpenInterpreter(disable_telemetry=True)
+        self.terminal = self.interpreter.computer.terminal
+        self.terminal.languages = [Slow, Counted]
+        Slow.ready.clear()
+        Slow.instances = 0
+        Counted.started = []
+        Counted.terminated = []
+
+    def tearDown(self):
+        Slow.ready.set()
+        self.terminal.terminate()
+
+    def test_warm_up_starts_language_in_background(self):
+        self.terminal.warm_up("slow")
+        self.terminal.warm_up("slow")
+        self.assertNotIn("slow", self.terminal._active_languages)
+
+        Slow.ready.set()
+        output = self.terminal.run("slow", "hi")
+
+        self.assertEqual(
+            output, [{"type": "console", "format": "output", "content": "hi"}]
+        )
+        self.assertEqual(Slow.instances, 1)
+
+    def test_warm_up_ignores_unknown_languages(self):
+        self.terminal.warm_up("cobol")
+        self.assertEqual(self.terminal._starting, {})
+
+    def test_pool_hands_over_spares_after_reset(self):
+        self.terminal.pool_size = 1
+
+        self.assertEqual(self.terminal.run("counted", "")[0]["content"], "0")
+        self.assertTrue(wait_for(lambda: len(Counted.started) == 2))
+
+        # The spare is used, and a new one is started in its place
+        self.terminal.terminate()
+        self.assertEqual(self.terminal.run("counted", "")[0]["content"], "1")
+        self.assertTrue(wait_for(lambda: len(Counted.started) == 3))
+        self.assertTrue(wait_for(lambda: Counted.terminated == [Counted.started[0]]))
+
+        self.terminal._pool.close()
+        self.assertIn(Counted.started[2], Counted.terminated)
+
+    def test_no_pool_by_default(self):
+        self.terminal.run("counted", "")
+        self.terminal.terminate()
+        self.assertEqual(len(Counted.started), 1)
+        self.assertEqual(Counted.terminated, Counted.started)
+
+
+if __name__ == "__main__":
+    unittest.main()
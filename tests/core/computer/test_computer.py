@@ -20,6 +20,19 @@ class TestComputer(unittest.TestCase):
         # Assert
         self.assertGreater(len(tools_description), 64)
 
+    def test_get_cached_computer_tools_signature_and_description(self):
+        # Act
+        cached_description = (
+            self.computer._get_cached_computer_tools_signature_and_description()
+        )
+
+        # Assert
+        self.assertEqual(
+            cached_description,
+            self.computer._get_all_computer_tools_signature_and_description(),
+        )
+        self.assertIn("\n".join(cached_description), self.computer.system_message)
+
 if __name__ == "__main__":
     testing = TestComputer()
     testing.setUp()
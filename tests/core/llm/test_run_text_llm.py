@@ -0,0 +1,47 @@
+import unittest
+
+from interpreter import OpenInterpreter
+from interpreter.core.llm.run_text_llm import run_text_llm
+
+
+class TestRunTextLlm(unittest.TestCase):
+    def stream(self, reply, size=1):
+        def completions(**params):
+            for i in range(0, len(reply), size):
+                yield {"choices": [{"delta": {"content": reply[i : i + size]}}]}
+
+        interpreter = OpenInterpreter(disable_telemetry=True)
+        interpreter.llm.completions = completions
+        interpreter.llm.execution_instructions = False
+        return list(run_text_llm(interpreter.llm, {"messages": []}))
+
+    def joined(self, chunks, type):
+        return "".join(c["content"] for c in chunks if c["type"] == type)
+
+    def test_code_block_split_across_tokens(self):
+        reply = "Use `ls`:\n```python\nprint('python')\nx = '``'\n```\nNot sent"
+        for size in (1, 2, 3, 7, len(reply)):
+            chunks = self.stream(reply, size)
+            self.assertEqual(self.joined(chunks, "message"), "Use `ls`:\n")
+            # The language's name is left alone inside the code
+            self.assertEqual(self.joined(chunks, "code"), "print('python')\nx = '``'\n")
+            self.assertEqual(
+                {c["format"] for c in chunks if c["type"] == "code"}, {"python"}
+            )
+
+    def test_unlabeled_and_unfinished_blocks(self):
+        chunks = self.stream("```\n1 + 1", 4)
+        self.assertEqual(self.joined(chunks, "code"), "1 + 1")
+        self.assertEqual({c.get("format") for c in chunks}, {"python"})
+
+        # A block that isn't run doesn't end the reply
+        chunks = self.stream("a\n```123\nnotes\n```\nb\n```shell\nls\n```", 3)
+        self.assertEqual(self.joined(chunks, "message"), "a\n\nb\n")
+        self.assertEqual(self.joined(chunks, "code"), "ls\n")
+        self.assertEqual(
+            {c.get("format") for c in chunks if c["type"] == "code"}, {"shell"}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
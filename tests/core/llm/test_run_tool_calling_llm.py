@@ -0,0 +1,50 @@
+import json
+import unittest
+from types import SimpleNamespace
+
+from interpreter import OpenInterpreter
+from interpreter.core.llm.run_tool_calling_llm import run_tool_calling_llm
+
+
+class TestRunToolCallingLlm(unittest.TestCase):
+    def stream(self, name, arguments, size=3):
+        def completions(**params):
+            for i in range(0, len(arguments), size):
+                tool_call = SimpleNamespace(
+                    index=0,
+                    id="call_1",
+                    function=SimpleNamespace(
+                        name=name if i == 0 else None,
+                        arguments=arguments[i : i + size],
+                    ),
+                )
+                yield {"choices": [{"delta": {"tool_calls": [tool_call]}}]}
+
+        interpreter = OpenInterpreter(disable_telemetry=True)
+        interpreter.llm.completions = completions
+        return list(run_tool_calling_llm(interpreter.llm, {"messages": []}))
+
+    def test_code_is_streamed_once_the_language_is_known(self):
+        # Code sent before the language is held back, then sent along with what follows
+        arguments = json.dumps({"code": "print('a')\nprint('b')", "language": "python"})
+        chunks = self.stream("execute", arguments)
+
+        self.assertEqual({chunk["format"] for chunk in chunks}, {"python"})
+        self.assertEqual({chunk["tool_call_id"] for chunk in chunks}, {"call_1"})
+        self.assertEqual(
+            "".join(c["content"] for c in chunks), "print('a')\nprint('b')"
+        )
+
+        chunks = self.stream(
+            "execute", json.dumps({"language": "shell", "code": "ls"}), 1
+        )
+        self.assertEqual([c["content"] for c in chunks], ["l", "s"])
+
+    def test_direct_python_call(self):
+        chunks = self.stream("python", "print('hi')")
+        self.assertEqual("".join(c["content"] for c in chunks), "print('hi')")
+        self.assertEqual({chunk["format"] for chunk in chunks}, {"python"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import tempfile
+import threading
+import unittest
+
+from litellm.types.utils import ModelResponseStream
+
+from interpreter import OpenInterpreter
+from interpreter.core.llm.utils.completion_cache import (
+    CompletionCache,
+    CompletionCacheMiss,
+)
+
+
+def chunk(content):
+    return {"choices": [{"delta": {"content": content}}]}
+
+
+class TestCompletionCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = CompletionCache(tempfile.mkdtemp())
+        self.calls = []
+
+    def completions(self, **params):
+        self.calls.append(params)
+        yield chunk("Hello")
+        yield chunk(" there")
+
+    def stream(self, mode="on", **params):
+        params = dict({"model": "gpt-4o", "messages": [], "temperature": 0}, **params)
+        return list(self.cache.stream(self.completions, params, mode))
+
+    def test_deterministic_requests_are_replayed(self):
+        self.assertEqual(self.stream(), [chunk("Hello"), chunk(" there")])
+        # The same request, with a different API key
+        self.assertEqual(
+            self.stream(temperature=0.0, api_key="x"),
+            [chunk("Hello"), chunk(" there")],
+        )
+        self.assertEqual(len(self.calls), 1)
+
+        self.stream(messages=[{"role": "user", "content": "Hi"}])
+        self.stream(temperature=0.7)
+        self.stream(temperature=0.7)
+        self.assertEqual(len(self.calls), 4)
+
+    def test_record_and_replay(self):
+        with self.assertRaises(CompletionCacheMiss):
+            self.stream("replay")
+        self.stream("record", temperature=0.7)
+        self.stream("record", temperature=0.7)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.stream("replay", temperature=0.7)[1], chunk(" there"))
+        self.assertEqual(len(self.calls), 2)
+
+        # Without a temperature, the provider's default (often 1) is used
+        self.stream(temperature=None)
+        self.stream(temperature=None)
+        self.assertEqual(len(self.calls), 4)
+
+    def test_streams_closed_early_are_incomplete(self):
+        params = {"model": "gpt-4o", "messages": [], "temperature": 0}
+        stream = self.cache.stream(self.completions, params)
+        self.assertEqual(next(stream), chunk("Hello"))
+        stream.close()
+
+        # "replay" only has what was read, "on" asks again
+        replay = self.cache.stream(self.completions, params, "replay")
+        self.assertEqual(next(replay), chunk("Hello"))
+        with self.assertRaises(CompletionCacheMiss):
+            next(replay)
+        self.assertEqual(self.stream(), [chunk("Hello"), chunk(" there")])
+        self.assertEqual(self.stream(), [chunk("Hello"), chunk(" there")])
+        self.assertEqual(len(self.calls), 2)
+
+    def test_litellm_chunks_are_rebuilt(self):
+        tool_call = {"index": 0, "id": "call_1", "type": "function"}
+        tool_call["function"] = {"name": "execute", "arguments": "{}"}
+
+        def completions(**params):
+            yield ModelResponseStream(
+                choices=[{"index": 0, "delta": {"tool_calls": [tool_call]}}]
+            )
+
+        params = {"model": "gpt-4o", "messages": [], "temperature": 0}
+        list(self.cache.stream(completions, params))
+        (replayed,) = self.cache.stream(completions, params, "replay")
+        replayed_call = replayed["choices"][0]["delta"]["tool_calls"][0]
+        self.assertEqual(replayed_call.function.name, "execute")
+        self.assertEqual(replayed_call.id, "call_1")
+
+    def test_identical_requests_in_flight_are_coalesced(self):
+        release = threading.Event()
+
+        def completions(**params):
+            self.calls.append(params)
+            yield chunk("Hello")
+            release.wait()
+            yield chunk(" there")
+
+        params = {"model": "gpt-4o", "messages": [], "temperature": 0}
+        results = []
+        leader = self.cache.stream(completions, params)
+        self.assertEqual(next(leader), chunk("Hello"))
+
+        def follow():
+            results.append(list(self.cache.stream(completions, params)))
+
+        follower = threading.Thread(target=follow)
+        follower.start()
+        release.set()
+        self.assertEqual(list(leader), [chunk(" there")])
+        follower.join(10)
+
+        self.assertEqual(results, [[chunk("Hello"), chunk(" there")]])
+        self.assertEqual(len(self.calls), 1)
+
+    def test_followers_finish_a_stream_the_leader_closed(self):
+        params = {"model": "gpt-4o", "messages": [], "temperature": 0}
+        leader = self.cache.stream(self.completions, params)
+        self.assertEqual(next(leader), chunk("Hello"))
+        follower = self.cache.stream(self.completions, params)
+        self.assertEqual(next(follower), chunk("Hello"))
+        leader.close()
+
+        self.assertEqual(list(follower), [chunk(" there")])
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(
+            list(self.cache.stream(self.completions, params, "replay")),
+            [chunk("Hello"), chunk(" there")],
+        )
+
+    def test_llm_completions_go_through_the_cache(self):
+        interpreter = OpenInterpreter(disable_telemetry=True)
+        interpreter.llm.completions = self.completions
+        interpreter.llm.supports_functions = False
+        interpreter.llm.completion_cache = "on"
+        interpreter.llm.completion_cache_path = self.cache.path
+
+        for _ in range(2):
+            interpreter.messages = []
+            interpreter.chat("Hi", display=False)
+            self.assertEqual(interpreter.messages[-1]["content"], "Hello there")
+        self.assertEqual(len(self.calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
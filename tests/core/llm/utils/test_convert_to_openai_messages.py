@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from interpreter import OpenInterpreter
+from interpreter.core.llm.utils import convert_to_openai_messages as convert_module
+from interpreter.core.llm.utils.convert_to_openai_messages import (
+    convert_to_openai_messages,
+)
+
+
+class TestConvertToOpenaiMessages(unittest.TestCase):
+    def setUp(self):
+        self.interpreter = OpenInterpreter(disable_telemetry=True)
+        self.interpreter.user_message_template = "<{content}>"
+
+    def convert(self, messages, cache):
+        return convert_to_openai_messages(
+            messages,
+            function_calling=True,
+            vision=True,
+            interpreter=self.interpreter,
+            cache=cache,
+        )
+
+    def test_unchanged_messages_are_not_converted_again(self):
+        image = Image.new("RGB", (8, 8), "red")
+        path = os.path.join(tempfile.mkdtemp(), "red.png")
+        image.save(path)
+
+        messages = [
+            {"role": "user", "type": "message", "content": "first"},
+            {"role": "user", "type": "image", "format": "path", "content": path},
+            {"role": "assistant", "type": "message", "content": "reply"},
+            {"role": "user", "type": "message", "content": "second"},
+        ]
+        cache = {}
+        uncached = self.convert(messages, None)
+        self.assertEqual(self.convert(messages, cache), uncached)
+
+        with mock.patch.object(
+            convert_module, "_convert_message", wraps=convert_module._convert_message
+        ) as convert_message:
+            self.assertEqual(self.convert(messages, cache), uncached)
+            self.assertEqual(convert_message.call_count, 0)
+
+            # Only the new and changed messages are converted
+            messages[2]["content"] += " (edited)"
+            messages.append({"role": "user", "type": "message", "content": "third"})
+            converted = self.convert(messages, cache)
+            self.assertEqual(convert_message.call_count, 2)
+
+        # The template moves to the new last user message
+        self.assertEqual(
+            [m["content"] for m in converted if isinstance(m["content"], str)],
+            ["first", "reply (edited)", "second", "<third>"],
+        )
+        self.assertEqual(len(cache), len(messages))
+
+    def test_returned_messages_can_be_changed(self):
+        messages = [{"role": "user", "type": "message", "content": "hi"}]
+        cache = {}
+        self.convert(messages, cache)[0]["content"] = "changed"
+        self.assertEqual(self.convert(messages, cache)[0]["content"], "<hi>")
+
+
+if __name__ == "__main__":
+    unittest.main()
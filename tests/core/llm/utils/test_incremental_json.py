@@ -0,0 +1,52 @@
+import json
+import unittest
+
+from interpreter.core.llm.utils.incremental_json import IncrementalJsonParser
+
+
+def feed_in_pieces(text, size):
+    parser = IncrementalJsonParser()
+    streamed = {}
+    for i in range(0, len(text), size):
+        for key, new in parser.feed(text[i : i + size]).items():
+            streamed[key] = streamed.get(key, "") + new
+    return parser, streamed
+
+
+class TestIncrementalJsonParser(unittest.TestCase):
+    def test_matches_json_loads_however_it_is_split(self):
+        arguments = {
+            "language": "python",
+            "code": 'print("hi\\\\there")\n\tx = "é😀"',
+            "timeout": 1.5,
+            "options": {"a": [1, "}", {"b": None}]},
+        }
+        for text in [json.dumps(arguments), json.dumps(arguments, indent=2)]:
+            for size in [1, 2, 3, 7, len(text)]:
+                parser, streamed = feed_in_pieces(text, size)
+                self.assertFalse(parser.failed)
+                self.assertEqual(parser.complete, arguments)
+                self.assertEqual(streamed["code"], arguments["code"])
+                self.assertEqual(streamed["language"], "python")
+
+    def test_partial_values(self):
+        parser = IncrementalJsonParser()
+        self.assertEqual(parser.feed('{"language": "pyt'), {"language": "pyt"})
+        self.assertNotIn("language", parser.complete)
+
+        # Raw newlines are allowed, like LLMs send them
+        new = parser.feed('hon", "code": "a = 1\nb = \\u00')
+        self.assertEqual(new, {"language": "hon", "code": "a = 1\nb = "})
+        self.assertEqual(parser.complete, {"language": "python"})
+        self.assertEqual(parser.feed("e9"), {"code": "é"})
+        self.assertEqual(parser.get("code"), "a = 1\nb = é")
+
+    def test_not_an_object(self):
+        parser = IncrementalJsonParser()
+        parser.feed("print('hi')")
+        self.assertTrue(parser.failed)
+        self.assertEqual(parser.feed('{"code": "x"}'), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
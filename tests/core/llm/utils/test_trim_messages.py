@@ -0,0 +1,111 @@
+import unittest
+from unittest import mock
+
+from interpreter.core.llm.utils import trim_messages as trim_module
+from interpreter.core.llm.utils.trim_messages import OUTPUT_REMOVED, trim_messages
+
+
+class WordEncoder:
+    """
+    Stands in for tiktoken (which needs to download its files): one token per word.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, text, disallowed_special=()):
+        self.calls += 1
+        return text.split()
+
+
+class TestTrimMessages(unittest.TestCase):
+    def setUp(self):
+        self.encoder = WordEncoder()
+        self.models = []
+
+        def get_encoder(model):
+            self.models.append(model)
+            return self.encoder
+
+        patcher = mock.patch.object(trim_module, "get_encoder", get_encoder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        trim_module._counts.clear()
+
+    def test_only_new_messages_are_tokenized(self):
+        messages = [
+            {"role": "user", "content": f"message number {i}"} for i in range(100)
+        ]
+        trim_messages(messages, "system", 100000)
+        calls = self.encoder.calls
+
+        messages.append({"role": "assistant", "content": "a reply"})
+        self.assertEqual(len(trim_messages(messages, "system", 100000)), 102)
+        # Role and content of the new message
+        self.assertEqual(self.encoder.calls - calls, 2)
+
+    def test_counts_are_per_model(self):
+        messages = [{"role": "user", "content": "a question"}]
+        trim_messages(messages, "system", 100000, model="claude-3-opus")
+        self.assertEqual(set(self.models), {"claude-3-opus"})
+        calls = self.encoder.calls
+
+        trim_messages(messages, "system", 100000, model="claude-3-opus")
+        self.assertEqual(self.encoder.calls, calls)
+        trim_messages(messages, "system", 100000, model="gpt-4o")
+        self.assertGreater(self.encoder.calls, calls)
+        self.assertIn("gpt-4o", self.models)
+
+    def test_known_system_tokens_are_not_counted_again(self):
+        messages = [{"role": "user", "content": "word " * 10}]
+        trimmed = trim_messages(messages, "a system message", 30, system_tokens=5)
+        self.assertEqual(self.encoder.calls, 2)  # Only the user message
+        self.assertEqual(trimmed[1:], messages)
+
+        trimmed = trim_messages(messages, "a system message", 30, system_tokens=20)
+        self.assertLess(len(trimmed[1]["content"]), len(messages[0]["content"]))
+
+    def test_images_then_outputs_then_oldest_messages_go(self):
+        image = {
+            "role": "user",
+            "content": [{"type": "image_url", "image_url": {"url": "data:..."}}],
+        }
+        output = {"role": "user", "content": "Code output: " + "word " * 50}
+        messages = [
+            {"role": "user", "content": "first question"},
+            image,
+            output,
+            {"role": "assistant", "content": "an answer"},
+            {"role": "user", "content": "last question"},
+        ]
+        full = trim_messages(messages, "system", 100000, ["Code output: "])
+        self.assertEqual(full[1:], messages)
+
+        # Dropping the image is enough
+        trimmed = trim_messages(messages, "system", 120, ["Code output: "])
+        self.assertNotIn(image, trimmed)
+        self.assertIn(output, trimmed)
+
+        # Then the output is emptied, before any dialogue goes
+        trimmed = trim_messages(messages, "system", 60, ["Code output: "])
+        self.assertEqual(trimmed[2]["content"], OUTPUT_REMOVED)
+        self.assertEqual(trimmed[1]["content"], "first question")
+        self.assertTrue(output["content"].startswith("Code output: word"))
+
+        # Then the oldest messages
+        trimmed = trim_messages(messages, "system", 25, ["Code output: "])
+        self.assertEqual(trimmed[-1]["content"], "last question")
+        self.assertNotIn("first question", [m["content"] for m in trimmed])
+
+    def test_tool_outputs_go_with_their_call(self):
+        messages = [
+            {"role": "assistant", "content": "", "tool_calls": [{"id": "1"}]},
+            {"role": "tool", "tool_call_id": "1", "content": "done"},
+            {"role": "user", "content": "word " * 20},
+        ]
+        trimmed = trim_messages(messages, "system", 40)
+        self.assertEqual([m["role"] for m in trimmed], ["system", "user"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,6 @@
 import os
+import threading
+import time
 from unittest import TestCase, mock
 
 from interpreter.core.async_core import AsyncInterpreter, Server
@@ -52,3 +54,156 @@ class TestServerConstruction(TestCase):
             s = Server(AsyncInterpreter())
             self.assertEqual(s.host, fake_host)
             self.assertEqual(s.port, fake_port)
+
+
+class TestSessions(TestCase):
+    def setUp(self):
+        self.interpreter = AsyncInterpreter(disable_telemetry=True)
+        self.interpreter.conversation_history = False
+        self.interpreter.llm.supports_functions = False
+
+        def completions(**params):
+            reply = "You said " + params["messages"][-1]["content"]
+            yield {"choices": [{"delta": {"content": reply}}]}
+
+        self.interpreter.llm.completions = completions
+
+    def test_sessions_have_their_own_interpreters(self):
+        from starlette.testclient import TestClient
+
+        server = Server(self.interpreter)
+        server.sessions.pool_size = 1
+        environment = {"INTERPRETER_REQUIRE_AUTH": "False"}
+
+        # One client, so every connection is on the same event loop (like on a real server)
+        with TestClient(server.app) as client, mock.patch.dict(os.environ, environment):
+            for session_id, text in (("a", "hi"), ("b", "hello"), ("a", "bye")):
+                with client.websocket_connect(
+                    "/", headers={"X-Session-ID": session_id}
+                ) as websocket:
+                    websocket.send_json({"role": "user", "start": True})
+                    websocket.send_json(
+                        {"role": "user", "type": "message", "content": text}
+                    )
+                    websocket.send_json({"role": "user", "end": True})
+                    while websocket.receive_json().get("content") != "complete":
+                        pass
+
+            # Settings are per session too
+            client.post(
+                "/settings", json={"auto_run": True}, headers={"X-Session-ID": "b"}
+            )
+
+            def contents(session_id):
+                messages = server.sessions.get(session_id).interpreter.messages
+                return [message["content"] for message in messages]
+
+            self.assertEqual(
+                contents("a"), ["hi", "You said hi", "bye", "You said bye"]
+            )
+            self.assertEqual(contents("b"), ["hello", "You said hello"])
+            self.assertEqual(self.interpreter.messages, [])
+            self.assertTrue(server.sessions.get("b").interpreter.auto_run)
+            self.assertFalse(server.sessions.get("a").interpreter.auto_run)
+
+        # Shutting down closes them
+        self.assertIsNone(server.sessions.get("a"))
+
+    def test_warm_languages(self):
+        self.assertEqual(Server(self.interpreter).sessions.warm_languages, ["python"])
+        with mock.patch.dict(
+            os.environ, {"INTERPRETER_SESSION_WARM_LANGUAGES": "python, shell"}
+        ):
+            self.assertEqual(
+                Server(self.interpreter).sessions.warm_languages, ["python", "shell"]
+            )
+        with mock.patch.dict(os.environ, {"INTERPRETER_SESSION_WARM_LANGUAGES": ""}):
+            self.assertEqual(Server(self.interpreter).sessions.warm_languages, [])
+
+        from interpreter.core.utils.session_manager import SessionManager
+
+        interpreters = []
+
+        def factory():
+            interpreters.append(mock.Mock())
+            return interpreters[-1]
+
+        sessions = SessionManager(factory, pool_size=1, warm_languages=["python"])
+        sessions.open("a")
+        for _ in range(100):
+            if len(interpreters) == 2:
+                break
+            time.sleep(0.01)
+        time.sleep(0.05)
+
+        # The spare's languages are started before it's used
+        interpreters[1].computer.terminal.warm_up.assert_called_once_with("python")
+        sessions.close_all()
+        for interpreter in interpreters:
+            interpreter.computer.terminate.assert_called_once()
+
+    def test_concurrency_limits_and_eviction(self):
+        from interpreter.core.utils.session_manager import SessionBusy, SessionManager
+
+        sessions = SessionManager(
+            self.interpreter.new_session, pool_size=0, idle_timeout=0.05
+        )
+        session = sessions.open("a")
+        self.assertIs(
+            session.interpreter.llm.completions, self.interpreter.llm.completions
+        )
+        with self.assertRaises(SessionBusy):
+            sessions.open("a")
+
+        # Sessions that are in use aren't evicted
+        time.sleep(0.1)
+        sessions.evict_idle()
+        self.assertIs(sessions.get("a"), session)
+
+        sessions.release(session)
+        time.sleep(0.1)
+        sessions.evict_idle()
+        self.assertIsNone(sessions.get("a"))
+
+
+class TestNonBlockingHandlers(TestCase):
+    def test_heartbeat_during_a_long_generation(self):
+        from starlette.testclient import TestClient
+
+        interpreter = AsyncInterpreter(disable_telemetry=True)
+        interpreter.conversation_history = False
+        interpreter.llm.supports_functions = False
+        started = threading.Event()
+
+        def completions(**params):
+            started.set()
+            for word in ["A ", "slow ", "reply."]:
+                time.sleep(0.5)  # Like waiting for a slow LLM
+                yield {"choices": [{"delta": {"content": word}}]}
+
+        interpreter.llm.completions = completions
+        server = Server(interpreter)
+
+        with TestClient(server.app) as client:
+            for stream in (False, True):
+                started.clear()
+                body = {"messages": [{"role": "user", "content": "Hi"}]}
+                body["stream"] = stream
+                generation = threading.Thread(
+                    target=client.post,
+                    args=("/openai/chat/completions",),
+                    kwargs={"json": body},
+                )
+                generation.start()
+                self.assertTrue(started.wait(10))
+
+                latencies = []
+                while generation.is_alive():
+                    start = time.perf_counter()
+                    self.assertEqual(client.get("/heartbeat").status_code, 200)
+                    latencies.append(time.perf_counter() - start)
+                    time.sleep(0.05)
+                generation.join()
+
+                self.assertGreater(len(latencies), 5)
+                self.assertLess(max(latencies), 0.3)
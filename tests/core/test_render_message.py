@@ -0,0 +1,97 @@
+import contextlib
+import io
+import unittest
+from unittest import mock
+
+from interpreter.core.core import OpenInterpreter
+from interpreter.core.render_message import RenderCache, render_message
+
+
+class TestRenderMessage(unittest.TestCase):
+    def setUp(self):
+        self.interpreter = mock.Mock()
+        self.interpreter.render_cache = RenderCache()
+        self.interpreter.render_evaluator = "kernel"
+        self.interpreter.computer.run.return_value = [
+            {"type": "console", "format": "output", "content": "rendered"}
+        ]
+
+    def test_blocks_are_cached_until_invalidated(self):
+        message = "Before {{print('x')}} after"
+
+        self.assertEqual(
+            render_message(self.interpreter, message), "Before rendered after"
+        )
+        self.assertEqual(
+            render_message(self.interpreter, message), "Before rendered after"
+        )
+        self.assertEqual(self.interpreter.computer.run.call_count, 1)
+
+        self.interpreter.render_cache.invalidate()
+        render_message(self.interpreter, message)
+        self.assertEqual(self.interpreter.computer.run.call_count, 2)
+
+    def test_zero_ttl_is_never_cached(self):
+        message = "{{\n# render_ttl: 0\nprint('x')\n}}"
+
+        render_message(self.interpreter, message)
+        render_message(self.interpreter, message)
+        self.assertEqual(self.interpreter.computer.run.call_count, 2)
+
+    def test_expired_ttl(self):
+        message = "{{\n# render_ttl: 5\nprint('x')\n}}"
+
+        with mock.patch("interpreter.core.render_message.time.time", return_value=100):
+            render_message(self.interpreter, message)
+        with mock.patch("interpreter.core.render_message.time.time", return_value=103):
+            render_message(self.interpreter, message)
+        self.assertEqual(self.interpreter.computer.run.call_count, 1)
+        with mock.patch("interpreter.core.render_message.time.time", return_value=106):
+            render_message(self.interpreter, message)
+        self.assertEqual(self.interpreter.computer.run.call_count, 2)
+
+    def test_local_evaluator(self):
+        self.interpreter.render_evaluator = "local"
+        self.interpreter.computer.name = "my computer"
+
+        rendered = render_message(
+            self.interpreter, "{{print('a')\nx = 1}} and {{computer.name}} {{x + 1}}"
+        )
+
+        self.assertEqual(rendered, "a\n and 'my computer'\n 2")
+        self.interpreter.computer.run.assert_not_called()
+
+    def test_local_evaluator_only_captures_its_own_prints(self):
+        self.interpreter.render_evaluator = "local"
+        stdout = io.StringIO()
+
+        with contextlib.redirect_stdout(stdout):
+            rendered = render_message(
+                self.interpreter,
+                "{{print('mine')\nimport sys\n_ = sys.stdout.write('other')}}",
+            )
+
+        self.assertEqual(rendered, "mine")
+        self.assertEqual(stdout.getvalue(), "other")
+        self.assertNotIn("print", self.interpreter.render_cache.namespace)
+
+    def test_each_turn_renders_again(self):
+        interpreter = OpenInterpreter(disable_telemetry=True)
+        interpreter.conversation_history = False
+        interpreter.llm.supports_functions = False
+        interpreter.render_evaluator = "local"
+        interpreter.render_cache.namespace["renders"] = []
+        interpreter.system_message = "{{renders.append(1)}}"
+
+        def completions(**params):
+            yield {"choices": [{"delta": {"content": "Hi"}}]}
+
+        interpreter.llm.completions = completions
+        interpreter.chat("Hello", display=False)
+        interpreter.chat("Hello again", display=False)
+
+        self.assertEqual(interpreter.render_cache.namespace["renders"], [1, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
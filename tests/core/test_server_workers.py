@@ -0,0 +1,113 @@
+import json
+import sys
+import time
+import unittest
+
+from fastapi.testclient import TestClient
+
+from interpreter.core.server_workers import (
+    WorkerPool,
+    create_worker_router,
+    worker_command,
+)
+
+# A stand-in for a worker, which says which worker (port) and session it got
+ECHO_WORKER = """
+import os
+
+import uvicorn
+from fastapi import FastAPI, Request, WebSocket
+
+port = os.environ["INTERPRETER_WORKER_PORT"]
+app = FastAPI()
+
+
+@app.get("/heartbeat")
+async def heartbeat():
+    return {"status": "alive"}
+
+
+@app.post("/echo")
+async def echo(request: Request):
+    return {"port": port, "session": request.headers.get("X-Session-ID")}
+
+
+@app.websocket("/")
+async def echo_websocket(websocket: WebSocket):
+    await websocket.accept()
+    while True:
+        text = await websocket.receive_text()
+        await websocket.send_text(port + " " + websocket.query_params["session"] + " " + text)
+
+
+uvicorn.run(app, host="127.0.0.1", port=int(port), log_level="warning")
+"""
+
+
+class TestServerWorkers(unittest.TestCase):
+    def setUp(self):
+        self.pool = WorkerPool(2, [sys.executable, "-c", ECHO_WORKER])
+        self.pool.start()
+        self.assertTrue(self.pool.wait_until_ready(60))
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def test_worker_command(self):
+        command = worker_command(["interpreter", "--server", "--workers", "4", "-y"])
+        self.assertEqual(command[-2:], ["--server", "-y"])
+        command = worker_command(["interpreter", "--workers=4", "--server"])
+        self.assertEqual(command[-1:], ["--server"])
+
+    def test_sessions_are_pinned_to_workers(self):
+        sessions = [f"user-{i}" for i in range(20)]
+        ports = {self.pool.worker_for(session).port for session in sessions}
+        self.assertEqual(len(ports), 2)
+
+        with TestClient(create_worker_router(self.pool)) as client:
+            for session in sessions[:4]:
+                for _ in range(2):
+                    response = client.post("/echo", headers={"X-Session-ID": session})
+                    self.assertEqual(
+                        response.json(),
+                        {
+                            "port": str(self.pool.worker_for(session).port),
+                            "session": session,
+                        },
+                    )
+
+            # The session is in the auth message
+            with client.websocket_connect("/") as websocket:
+                websocket.send_text(json.dumps({"auth": "key", "session": "alice"}))
+                port = self.pool.worker_for("alice").port
+                self.assertTrue(websocket.receive_text().startswith(f"{port} alice "))
+
+    def test_crashed_workers_are_restarted(self):
+        first, second = self.pool.workers
+        session = next(
+            f"user-{i}"
+            for i in range(100)
+            if self.pool.worker_for(f"user-{i}") is second
+        )
+
+        with TestClient(create_worker_router(self.pool)) as client:
+            with client.websocket_connect(f"/?session={session}") as websocket:
+                websocket.send_text("before")
+                self.assertTrue(websocket.receive_text().endswith("before"))
+
+                crashed = first.process
+                crashed.kill()
+                crashed.wait()
+
+                # The other worker's sessions carry on
+                websocket.send_text("during")
+                self.assertTrue(websocket.receive_text().endswith("during"))
+
+            # The crashed worker's requests wait for it to come back
+            response = client.post("/echo")
+            self.assertEqual(response.json()["port"], str(first.port))
+            self.assertIsNot(first.process, crashed)
+
+
+if __name__ == "__main__":
+    unittest.main()
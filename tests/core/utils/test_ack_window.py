@@ -0,0 +1,90 @@
+import asyncio
+import os
+import unittest
+from unittest import mock
+
+from interpreter.core.async_core import AsyncInterpreter, Server
+from interpreter.core.utils.ack_window import AckWindow
+
+
+class TestAckWindow(unittest.TestCase):
+    def test_window(self):
+        async def run():
+            sent = []
+
+            async def transmit(frame):
+                sent.append(frame)
+
+            window = AckWindow(transmit, size=2, timeout=0.05)
+            first = await window.send("a", {"id": "a"})
+            await window.send("b", {"id": "b"})
+
+            # The window is full until something is acknowledged
+            third = asyncio.ensure_future(window.send("c", {"id": "c"}))
+            await asyncio.sleep(0.01)
+            self.assertFalse(third.done())
+            self.assertTrue(window.acknowledge("a"))
+            self.assertFalse(window.acknowledge("a"))
+            self.assertTrue(first.result())
+            await third
+            self.assertEqual([frame["id"] for frame in sent], ["a", "b", "c"])
+
+            # Unacknowledged frames are sent again, and handed back at the end
+            await asyncio.sleep(0.08)
+            self.assertEqual([frame["id"] for frame in sent[3:]], ["b", "c"])
+            self.assertEqual(window.close(), [{"id": "b"}, {"id": "c"}])
+            self.assertEqual(len(window), 0)
+
+        asyncio.run(run())
+
+    def test_acknowledged_websocket_output(self):
+        from starlette.testclient import TestClient
+
+        interpreter = AsyncInterpreter(disable_telemetry=True)
+        interpreter.conversation_history = False
+        interpreter.llm.supports_functions = False
+        interpreter.require_acknowledge = True
+        interpreter.acknowledge_timeout = 0.2
+
+        def completions(**params):
+            for word in ["One ", "two ", "three."]:
+                yield {"choices": [{"delta": {"content": word}}]}
+
+        interpreter.llm.completions = completions
+        environment = {"INTERPRETER_REQUIRE_AUTH": "False"}
+
+        with TestClient(Server(interpreter).app) as client, mock.patch.dict(
+            os.environ, environment
+        ):
+            with client.websocket_connect("/") as websocket:
+                websocket.send_json({"role": "user", "start": True})
+                websocket.send_json(
+                    {"role": "user", "type": "message", "content": "Hi"}
+                )
+                websocket.send_json({"role": "user", "end": True})
+
+                received = []
+                seen = set()
+                while True:
+                    output = websocket.receive_json()
+                    # The first output isn't acknowledged until it's sent again
+                    if output["id"] in seen or received:
+                        websocket.send_json({"ack": output["id"]})
+                    if output["id"] in seen:
+                        continue
+                    seen.add(output["id"])
+                    received.append(output)
+                    if output.get("content") == "complete":
+                        break
+
+        content = "".join(
+            output.get("content", "")
+            for output in received
+            if output.get("type") == "message"
+        )
+        self.assertEqual(content, "One two three.")
+        self.assertEqual(len(seen), len(received))
+
+
+if __name__ == "__main__":
+    unittest.main()
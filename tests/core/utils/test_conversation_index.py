@@ -0,0 +1,129 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from interpreter.core.utils.conversation_index import INDEX_FILENAME, ConversationIndex
+from interpreter.core.utils.conversation_journal import ConversationJournal
+
+
+class TestConversationIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.index = ConversationIndex(self.directory.name)
+
+    def tearDown(self):
+        self.index.close()
+        self.directory.cleanup()
+
+    def save(self, name, messages):
+        journal = ConversationJournal(os.path.join(self.directory.name, name))
+        changed, truncated_to = journal.save(messages)
+        journal.close()
+        self.index.update(name + "l", messages, changed, truncated_to)
+
+    @mock.patch(
+        "interpreter.core.utils.conversation_index.count_tokens",
+        lambda text: len(text.split()),
+    )
+    def test_update_and_search(self):
+        self.save(
+            "Plot_some__October_17.json",
+            [
+                {"role": "user", "type": "message", "content": "Plot the sales data"},
+                {
+                    "role": "assistant",
+                    "type": "code",
+                    "format": "python",
+                    "content": "import matplotlib",
+                },
+                {
+                    "role": "computer",
+                    "type": "image",
+                    "format": "base64.png",
+                    "content": "iVBORw0",
+                },
+            ],
+        )
+        self.save(
+            "Hello__October_16.json",
+            [{"role": "user", "type": "message", "content": "Hello there"}],
+        )
+
+        self.assertEqual(self.index.count(), 2)
+        [result] = self.index.search("matplotlib")
+        self.assertEqual(result["filename"], "Plot_some__October_17.jsonl")
+        self.assertEqual(result["title"], "Plot some")
+        self.assertEqual(result["message_count"], 3)
+        self.assertEqual(result["token_count"], 6)
+        self.assertEqual(self.index.search("iVBORw0"), [])
+        self.assertEqual(self.index.count("hello"), 1)
+
+    @mock.patch(
+        "interpreter.core.utils.conversation_index.count_tokens",
+        lambda text: len(text.split()),
+    )
+    def test_edits_and_truncation_keep_the_total(self):
+        name = "Edits__October_17.json"
+        messages = [
+            {"role": "user", "type": "message", "content": "one two"},
+            {"role": "assistant", "type": "message", "content": "three"},
+            {"role": "user", "type": "message", "content": "four five six"},
+        ]
+        self.save(name, messages)
+        self.assertEqual(self.index.list()[0]["token_count"], 6)
+
+        messages[1] = dict(messages[1], content="seven eight")
+        self.save(name, messages)
+        self.assertEqual(self.index.list()[0]["token_count"], 7)
+        self.assertEqual(self.index.count("three"), 0)
+        self.assertEqual(self.index.count("eight"), 1)
+
+        self.save(name, messages[:1])
+        self.assertEqual(self.index.list()[0]["token_count"], 2)
+        self.assertEqual(self.index.count("six"), 0)
+
+        # Looked up by key, rather than by scanning the full-text table
+        plan = self.index._connection.execute(
+            "EXPLAIN QUERY PLAN SELECT message_rowid FROM message_rows WHERE filename = ? AND position = ?",
+            (name, 0),
+        ).fetchall()
+        self.assertIn("PRIMARY KEY", str(plan))
+
+    def test_index_from_an_older_version_is_rebuilt(self):
+        self.index.close()
+        with sqlite3.connect(os.path.join(self.directory.name, INDEX_FILENAME)) as db:
+            db.execute("PRAGMA user_version = 0")
+        with open(os.path.join(self.directory.name, "Old__May_1.json"), "w") as f:
+            json.dump([{"role": "user", "type": "message", "content": "kept"}], f)
+
+        self.index = ConversationIndex(self.directory.name)
+        self.index.refresh()
+        self.assertEqual(self.index.count("kept"), 1)
+
+    def test_refresh_picks_up_outside_changes(self):
+        with open(os.path.join(self.directory.name, "Old__May_1.json"), "w") as f:
+            json.dump(
+                [{"role": "user", "type": "message", "content": "legacy file"}], f
+            )
+
+        self.index.refresh()
+        self.assertEqual(self.index.search("legacy")[0]["filename"], "Old__May_1.json")
+
+        os.remove(os.path.join(self.directory.name, "Old__May_1.json"))
+        self.index.refresh()
+        self.assertEqual(self.index.count(), 0)
+
+    def test_search_with_fts_syntax_characters(self):
+        self.save(
+            "Dash__October_17.json",
+            [{"role": "user", "type": "message", "content": "run ls -la: please"}],
+        )
+
+        self.assertEqual(self.index.count("-la:"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+
+from interpreter.core.utils.conversation_journal import (
+    ConversationJournal,
+    load_conversation,
+)
+
+
+class TestConversationJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "Hello__October_17.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def count_records(self):
+        with open(self.path + "l") as f:
+            return len(f.readlines())
+
+    def test_only_changes_are_appended(self):
+        journal = ConversationJournal(self.path)
+        messages = [
+            {"role": "user", "type": "message", "content": "Hi"},
+            {"role": "assistant", "type": "message", "content": "Hello"},
+        ]
+        journal.save(messages)
+        self.assertEqual(self.count_records(), 2)
+
+        messages.append({"role": "user", "type": "message", "content": "Bye"})
+        messages[1]["content"] += "!"
+        journal.save(messages)
+        self.assertEqual(self.count_records(), 4)
+
+        journal.save(messages)
+        self.assertEqual(self.count_records(), 4)
+
+        del messages[1:]
+        journal.save(messages)
+        journal.close()
+
+        self.assertEqual(load_conversation(self.path), messages)
+
+    def test_compaction(self):
+        journal = ConversationJournal(self.path, compact_min_records=10)
+        messages = [{"role": "user", "type": "message", "content": ""}]
+        for i in range(30):
+            messages[0]["content"] += str(i)
+            journal.save(messages)
+        journal._compaction_thread.join()
+        journal.close()
+
+        self.assertLess(self.count_records(), 12)
+        self.assertEqual(load_conversation(self.path), messages)
+
+    def test_resumed_conversation_is_rewritten(self):
+        messages = [{"role": "user", "type": "message", "content": "Hi"}]
+        ConversationJournal(self.path).save(messages)
+
+        # A new journal doesn't know what's in the file, so it starts over
+        messages.append({"role": "assistant", "type": "message", "content": "Hey"})
+        journal = ConversationJournal(self.path)
+        journal.save(messages)
+        journal.close()
+
+        self.assertEqual(self.count_records(), 2)
+        self.assertEqual(load_conversation(self.path), messages)
+
+    def test_partial_last_line_is_ignored(self):
+        journal = ConversationJournal(self.path)
+        messages = [{"role": "user", "type": "message", "content": "Hi"}]
+        journal.save(messages)
+        journal.close()
+        with open(self.path + "l", "a") as f:
+            f.write('{"op": "set", "ind')
+
+        self.assertEqual(load_conversation(self.path), messages)
+
+
+if __name__ == "__main__":
+    unittest.main()
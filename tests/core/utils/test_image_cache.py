@@ -0,0 +1,63 @@
+import base64
+import io
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from interpreter.core.utils.image_cache import ImageCache
+
+
+class TestImageCache(unittest.TestCase):
+    def test_images_are_encoded_once(self):
+        cache = ImageCache()
+        image = Image.new("RGB", (64, 32), "blue")
+
+        with mock.patch.object(
+            Image.Image, "save", autospec=True, side_effect=Image.Image.save
+        ) as save:
+            png = cache.encode(image)
+            self.assertEqual(
+                cache.encode(image, as_base64=True), base64.b64encode(png).decode()
+            )
+            # Same pixels in another image object
+            self.assertIs(cache.encode(Image.new("RGB", (64, 32), "blue")), png)
+            self.assertEqual(save.call_count, 1)
+
+            small = cache.encode(image, "jpg", size=(16, 8))
+            self.assertIs(cache.encode(image, "JPEG", size=(16, 8)), small)
+            self.assertEqual(save.call_count, 2)
+
+        self.assertEqual(Image.open(io.BytesIO(small)).size, (16, 8))
+        self.assertEqual(Image.open(io.BytesIO(png)).format, "PNG")
+
+        with mock.patch.object(Image, "open", side_effect=Image.open) as open_:
+            decoded = cache.open_base64(base64.b64encode(png).decode())
+            # Drawing on one copy doesn't change the next
+            decoded.paste("red", (0, 0, 64, 32))
+            again = cache.open_base64(base64.b64encode(png).decode())
+            self.assertEqual(open_.call_count, 1)
+        self.assertEqual(again.size, (64, 32))
+        self.assertEqual(again.getpixel((0, 0)), (0, 0, 255))
+
+    def test_least_recently_used_are_evicted(self):
+        cache = ImageCache()
+        images = [Image.effect_noise((64, 64), 100 + i) for i in range(3)]
+        sizes = [len(cache.encode(image)) for image in images]
+        cache.clear()
+
+        cache.max_bytes = sizes[0] + sizes[1] + sizes[2] // 2
+        first = cache.encode(images[0])
+        cache.encode(images[1])
+        cache.encode(images[0])
+        cache.encode(images[2])
+        # The second was used least recently
+        self.assertIs(cache.encode(images[0]), first)
+        keys = [
+            ("encoded", cache.digest(image), "PNG", None, False) for image in images
+        ]
+        self.assertEqual([key in cache._entries for key in keys], [True, False, True])
+
+
+if __name__ == "__main__":
+    unittest.main()
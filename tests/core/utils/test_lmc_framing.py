@@ -0,0 +1,97 @@
+import base64
+import json
+import os
+import unittest
+from unittest import mock
+
+from interpreter.core.async_core import AsyncInterpreter, Server
+from interpreter.core.utils.lmc_framing import (
+    SUBPROTOCOL,
+    decode_image,
+    encode_frame,
+    frames,
+    unbatch,
+)
+
+
+def token(content, type="message"):
+    return {"role": "assistant", "type": type, "content": content}
+
+
+class TestLmcFraming(unittest.TestCase):
+    def test_frames(self):
+        image = {
+            "role": "computer",
+            "type": "image",
+            "format": "base64.png",
+            "content": base64.b64encode(b"\x89PNG...").decode(),
+        }
+        outputs = [
+            {"role": "assistant", "type": "message", "start": True},
+            token("Hello"),
+            token(" there"),
+            {"role": "assistant", "type": "message", "end": True},
+            token("print(1)", "code"),
+            image,
+            {"role": "server", "type": "status", "content": "complete"},
+        ]
+
+        batch, image_frame, last = frames(outputs)
+        self.assertEqual(
+            batch["batch"],
+            [outputs[0], token("Hello there"), outputs[3], outputs[4]],
+        )
+        self.assertEqual(last, {"batch": [outputs[-1]]})
+        self.assertEqual(unbatch([batch, image_frame, last])[-2:], outputs[-2:])
+
+        # The image goes as bytes
+        data = encode_frame(image_frame)
+        self.assertIsInstance(data, bytes)
+        self.assertIn(b"\x89PNG...", data)
+        self.assertEqual(decode_image(data), image)
+        self.assertEqual(json.loads(encode_frame(batch)), batch)
+
+    def test_compact_websocket(self):
+        from starlette.testclient import TestClient
+
+        interpreter = AsyncInterpreter(disable_telemetry=True)
+        interpreter.conversation_history = False
+        interpreter.llm.supports_functions = False
+        words = [f"word{i} " for i in range(50)]
+
+        def completions(**params):
+            for word in words:
+                yield {"choices": [{"delta": {"content": word}}]}
+
+        interpreter.llm.completions = completions
+        environment = {"INTERPRETER_REQUIRE_AUTH": "False"}
+
+        with TestClient(Server(interpreter).app) as client, mock.patch.dict(
+            os.environ, environment
+        ):
+            with client.websocket_connect("/", subprotocols=[SUBPROTOCOL]) as websocket:
+                self.assertEqual(websocket.accepted_subprotocol, SUBPROTOCOL)
+                websocket.send_json({"role": "user", "start": True})
+                websocket.send_json(
+                    {"role": "user", "type": "message", "content": "Hi"}
+                )
+                websocket.send_json({"role": "user", "end": True})
+
+                batches = []
+                while not batches or batches[-1][-1].get("content") != "complete":
+                    batches.append(websocket.receive_json()["batch"])
+
+        outputs = [output for batch in batches for output in batch]
+        content = "".join(
+            output.get("content", "")
+            for output in outputs
+            if output.get("type") == "message"
+        )
+        self.assertEqual(content, "".join(words))
+        self.assertTrue(any("start" in output for output in outputs))
+        self.assertTrue(any("end" in output for output in outputs))
+        self.assertLess(len(outputs), len(words))
+
+
+if __name__ == "__main__":
+    unittest.main()
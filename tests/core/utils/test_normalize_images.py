@@ -0,0 +1,128 @@
+import base64
+import io
+import unittest
+
+from PIL import Image, ImageDraw
+
+from interpreter import OpenInterpreter
+from interpreter.core.llm.utils.convert_to_openai_messages import (
+    convert_to_openai_messages,
+)
+from interpreter.core.utils.normalize_images import (
+    REFERENCE_FORMAT,
+    ingest_image,
+    resolve_image_references,
+)
+
+
+def image_message(image, format="PNG"):
+    buffered = io.BytesIO()
+    image.save(buffered, format=format)
+    return {
+        "role": "user",
+        "type": "image",
+        "format": "base64." + format.lower(),
+        "content": base64.b64encode(buffered.getvalue()).decode(),
+    }
+
+
+def decode(message):
+    return Image.open(io.BytesIO(base64.b64decode(message["content"])))
+
+
+class TestNormalizeImages(unittest.TestCase):
+    def setUp(self):
+        self.interpreter = OpenInterpreter(disable_telemetry=True)
+        self.interpreter.llm.model = "gpt-4o"
+
+    def test_images_are_downscaled_and_reencoded(self):
+        self.interpreter.llm.max_image_size = 500
+        message = image_message(Image.effect_noise((1000, 400), 50).convert("RGB"))
+
+        ingested = ingest_image(message, [], self.interpreter.llm)
+        self.assertEqual(ingested["format"], "base64.jpeg")
+        self.assertEqual(decode(ingested).size, (500, 200))
+        self.assertLess(len(ingested["content"]), len(message["content"]))
+        # Ingested images are left alone
+        self.assertIs(ingest_image(ingested, [], self.interpreter.llm), ingested)
+
+        # Transparency is kept
+        transparent = image_message(Image.new("RGBA", (1000, 10), (0, 0, 0, 0)))
+        ingested = ingest_image(transparent, [], self.interpreter.llm)
+        self.assertEqual(ingested["format"], "base64.png")
+        self.assertEqual(decode(ingested).mode, "RGBA")
+
+    def test_repeats_are_references(self):
+        image = Image.linear_gradient("L").convert("RGB")
+        ImageDraw.Draw(image).ellipse((20, 40, 120, 200), fill="red")
+        first = ingest_image(image_message(image), [], self.interpreter.llm)
+        # The same pixels, encoded differently
+        repeat = ingest_image(
+            image_message(image.convert("RGBA"), "TIFF"),
+            [first],
+            self.interpreter.llm,
+        )
+        self.assertEqual(repeat["format"], REFERENCE_FORMAT)
+        self.assertEqual(repeat["content"], first["image_hash"])
+
+        different = ingest_image(
+            image_message(image.rotate(90)), [first], self.interpreter.llm
+        )
+        self.assertNotEqual(different["format"], REFERENCE_FORMAT)
+
+        # The original comes back if it was trimmed out
+        self.assertEqual(resolve_image_references([repeat], [first, repeat]), [first])
+        self.assertEqual(
+            resolve_image_references([first, repeat], [first, repeat]),
+            [first, repeat],
+        )
+
+    def test_screenshots_that_differ_by_a_line_are_both_kept(self):
+        screenshot = Image.new("RGB", (1920, 1080), "white")
+        draw = ImageDraw.Draw(screenshot)
+        draw.rectangle((100, 100, 1800, 900), outline="gray")
+        with_error = screenshot.copy()
+        ImageDraw.Draw(with_error).text(
+            (110, 110), "ERROR: permission denied", fill="black"
+        )
+
+        first = ingest_image(image_message(screenshot), [], self.interpreter.llm)
+        second = ingest_image(image_message(with_error), [first], self.interpreter.llm)
+        self.assertNotEqual(second["format"], REFERENCE_FORMAT)
+        self.assertNotEqual(second["image_hash"], first["image_hash"])
+
+    def test_references_are_sent_as_notes(self):
+        image = Image.linear_gradient("L").convert("RGB")
+        self.interpreter.llm.supports_vision = True
+        self.interpreter.llm.supports_functions = False
+        self.interpreter.llm.execution_instructions = False
+        sent = []
+
+        def completions(**params):
+            sent.extend(params["messages"])
+            yield {"choices": [{"delta": {"content": "Same image."}}]}
+
+        self.interpreter.llm.completions = completions
+        question = {"role": "user", "type": "message", "content": "Same?"}
+        self.interpreter.chat(
+            [image_message(image), image_message(image), question], display=False
+        )
+
+        self.assertEqual(self.interpreter.messages[1]["format"], REFERENCE_FORMAT)
+        (note,) = convert_to_openai_messages(self.interpreter.messages[1:2])
+        self.assertEqual(
+            note["content"],
+            "(This image is the same as an earlier one, so it isn't sent again.)",
+        )
+        images = [
+            part
+            for message in sent
+            if isinstance(message["content"], list)
+            for part in message["content"]
+            if part["type"] == "image_url"
+        ]
+        self.assertEqual(len(images), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+from interpreter.core.utils.output_spool import OutputSpool
+
+
+class SmallBlockSpool(OutputSpool):
+    BLOCK_CHARS = 7
+
+
+class TestOutputSpool(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "output.txt")
+        self.text = "".join(f"línea {i} ✓\n" for i in range(500))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_spool(self):
+        spool = SmallBlockSpool(self.path)
+        for line in self.text.splitlines(keepends=True):
+            spool.write(line)
+        return spool
+
+    def test_read_matches_slicing(self):
+        spool = self.write_spool()
+
+        for start, end in [
+            (0, None),
+            (0, 10),
+            (5, 100),
+            (123, 4567),
+            (-50, None),
+            (3, 3),
+        ]:
+            self.assertEqual(spool.read(start, end), self.text[start:end])
+        self.assertEqual(len(spool), len(self.text))
+
+    def test_open_closed_spool(self):
+        self.write_spool().close()
+
+        spool = SmallBlockSpool.open(self.path)
+        self.assertEqual(spool.read(), self.text)
+        self.assertEqual(spool.read(1000, 1100), self.text[1000:1100])
+
+    def test_delete(self):
+        spool = self.write_spool()
+        spool.delete()
+
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.path + ".idx"))
+
+    def test_empty_spool(self):
+        spool = OutputSpool(self.path)
+        spool.close()
+
+        self.assertEqual(spool.read(), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
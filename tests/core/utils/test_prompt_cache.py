@@ -0,0 +1,75 @@
+import unittest
+from unittest import mock
+
+from interpreter import OpenInterpreter
+from interpreter.core.utils import prompt_cache
+from interpreter.core.utils.prompt_cache import (
+    cached,
+    static_system_message,
+    static_system_message_tokens,
+)
+
+
+class TestPromptCache(unittest.TestCase):
+    def test_memory_is_bounded(self):
+        with mock.patch.object(prompt_cache, "MAX_MEMORY_ENTRIES", 3):
+            prompt_cache._memory.clear()
+            for i in range(5):
+                cached("test", i, lambda: i)
+            cached("test", 2, lambda: None)  # Used, so kept
+            cached("test", 5, lambda: 5)
+            self.assertEqual([key for _, key in prompt_cache._memory], [4, 2, 5])
+        prompt_cache._memory.clear()
+
+    def test_static_system_message_is_built_when_settings_change(self):
+        interpreter = OpenInterpreter(disable_telemetry=True)
+        interpreter.system_message = "You are a test."
+
+        first = static_system_message(interpreter)
+        self.assertTrue(first.startswith("You are a test."))
+        self.assertIs(static_system_message(interpreter), first)
+
+        interpreter.custom_instructions = "Be brief."
+        self.assertTrue(static_system_message(interpreter).endswith("Be brief."))
+
+        with mock.patch(
+            "interpreter.core.llm.utils.trim_messages.count_message_tokens",
+            return_value=42,
+        ) as count:
+            self.assertEqual(static_system_message_tokens(interpreter, "gpt-4"), 42)
+            self.assertEqual(static_system_message_tokens(interpreter, "gpt-4"), 42)
+            self.assertEqual(count.call_count, 1)
+
+    @mock.patch(
+        "interpreter.core.llm.utils.trim_messages.get_encoder",
+        lambda model: mock.Mock(encode=lambda text, **kwargs: text.split()),
+    )
+    def test_trimming_gets_the_system_message_tokens(self):
+        interpreter = OpenInterpreter(disable_telemetry=True)
+        interpreter.conversation_history = False
+        interpreter.llm.supports_functions = False
+        interpreter.llm.context_window = 100000
+        interpreter.llm.max_tokens = 1000
+        interpreter.system_message = "You are a test."
+
+        def completions(**params):
+            yield {"choices": [{"delta": {"content": "Hi"}}]}
+
+        interpreter.llm.completions = completions
+        with mock.patch(
+            "interpreter.core.llm.llm.trim_messages",
+            side_effect=lambda messages, system_message, **kwargs: [
+                {"role": "system", "content": system_message}
+            ]
+            + messages,
+        ) as trim:
+            interpreter.chat("Hello", display=False)
+
+        self.assertEqual(
+            trim.call_args.kwargs["system_tokens"],
+            static_system_message_tokens(interpreter),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
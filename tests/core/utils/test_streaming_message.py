@@ -0,0 +1,63 @@
+import copy
+import json
+import unittest
+
+from interpreter.core.utils.streaming_message import StreamingMessage
+from interpreter.core.utils.truncate_output import OutputTruncator, truncate_output
+
+
+class TestStreamingMessage(unittest.TestCase):
+    def test_content_is_joined_on_read(self):
+        message = StreamingMessage(
+            {"role": "assistant", "type": "message", "content": "Hello"}
+        )
+        message.append(", ")
+        message.append("world")
+
+        self.assertEqual(message["content"], "Hello, world")
+        self.assertEqual(message.get("content"), "Hello, world")
+        self.assertEqual({**message}["content"], "Hello, world")
+        self.assertEqual(json.loads(json.dumps(message))["content"], "Hello, world")
+
+    def test_finalize_returns_plain_dict(self):
+        message = StreamingMessage({"role": "user", "type": "message", "content": "a"})
+        message.append("b")
+
+        for finalized in [message.finalize(), message.copy(), copy.deepcopy(message)]:
+            self.assertIs(type(finalized), dict)
+            self.assertEqual(
+                finalized, {"role": "user", "type": "message", "content": "ab"}
+            )
+
+    def test_setting_content_replaces_buffer(self):
+        message = StreamingMessage(
+            {"role": "assistant", "type": "code", "content": "1"}
+        )
+        message.append("2")
+        message["content"] = "print(3)"
+        message.append("\n")
+
+        self.assertEqual(message["content"], "print(3)\n")
+
+    def test_truncated_output_matches_truncate_output(self):
+        data = "".join(f"line {i}\n" for i in range(2000))
+        truncator = OutputTruncator(max_output_chars=500)
+        message = StreamingMessage(
+            {"role": "computer", "type": "console", "format": "output", "content": ""},
+            truncator=truncator,
+        )
+        for line in data.splitlines(keepends=True):
+            message.append(line)
+
+        self.assertEqual(message["content"], truncate_output(data, 500))
+
+    def test_short_output_is_not_truncated(self):
+        truncator = OutputTruncator(max_output_chars=500)
+        truncator.write("short")
+        truncator.write(" output")
+
+        self.assertEqual(truncator.getvalue(), "short output")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+import threading
+import unittest
+from types import SimpleNamespace
+
+from interpreter import OpenInterpreter
+from interpreter.core.computer.terminal.base_language import BaseLanguage
+from interpreter.core.llm.run_tool_calling_llm import (
+    process_messages,
+    run_tool_calling_llm,
+)
+from interpreter.core.llm.utils.convert_to_openai_messages import (
+    convert_to_openai_messages,
+)
+
+
+class Echo(BaseLanguage):
+    """
+    Prints its code, and which instance ran it. Waits at `barrier` (if set) so tests can tell calls ran concurrently.
+    """
+
+    name = "echo"
+    barrier = None
+
+    def __init__(self, computer):
+        self.computer = computer
+
+    def run(self, code):
+        if Echo.barrier is not None:
+            Echo.barrier.wait()
+        yield {
+            "type": "console",
+            "format": "output",
+            "content": f"{code} on {id(self)}",
+        }
+
+    def stop(self):
+        pass
+
+    def terminate(self):
+        pass
+
+
+def fake_llm_run(messages):
+    if messages[-1]["type"] == "console":
+        yield {"type": "message", "content": "Done."}
+        return
+    yield {"type": "message", "content": "Running two things."}
+    yield {"type": "code", "format": "echo", "content": "fir", "tool_call_id": "call_1"}
+    yield {"type": "code", "format": "echo", "content": "sec", "tool_call_id": "call_2"}
+    yield {"type": "code", "format": "echo", "content": "st", "tool_call_id": "call_1"}
+    yield {"type": "code", "format": "echo", "content": "ond", "tool_call_id": "call_2"}
+
+
+def tool_call_chunk(index, id=None, name=None, arguments=None):
+    function = SimpleNamespace(name=name, arguments=arguments)
+    tool_call = SimpleNamespace(index=index, id=id, function=function)
+    return {"choices": [{"delta": {"tool_calls": [tool_call]}}]}
+
+
+class TestToolCalls(unittest.TestCase):
+    def setUp(self):
+        self.interpreter = OpenInterpreter(
+            auto_run=True, disable_telemetry=True, conversation_history=False
+        )
+        self.interpreter.computer.languages = [Echo]
+        self.interpreter.llm.run = fake_llm_run
+        Echo.barrier = None
+
+    def tearDown(self):
+        Echo.barrier = None
+        self.interpreter.computer.terminate()
+
+    def outputs(self):
+        return {
+            m["tool_call_id"]: m["content"]
+            for m in self.interpreter.messages
+            if m["type"] == "console"
+        }
+
+    def test_tool_calls_run_in_order_in_one_turn(self):
+        self.interpreter.chat("Go", display=False)
+
+        self.assertEqual(
+            [(m["type"], m.get("tool_call_id")) for m in self.interpreter.messages],
+            [
+                ("message", None),
+                ("message", None),
+                ("code", "call_1"),
+                ("console", "call_1"),
+                ("code", "call_2"),
+                ("console", "call_2"),
+                ("message", None),
+            ],
+        )
+        outputs = self.outputs()
+        self.assertTrue(outputs["call_1"].startswith("first on "))
+        self.assertTrue(outputs["call_2"].startswith("second on "))
+        # Ordered calls share the language instance
+        self.assertEqual(outputs["call_1"].split()[-1], outputs["call_2"].split()[-1])
+
+    def test_parallel_tool_calls_run_concurrently(self):
+        self.interpreter.parallel_tool_calls = True
+        Echo.barrier = threading.Barrier(2, timeout=10)
+
+        self.interpreter.chat("Go", display=False)
+
+        outputs = self.outputs()
+        self.assertTrue(outputs["call_1"].startswith("first on "))
+        self.assertTrue(outputs["call_2"].startswith("second on "))
+        self.assertNotEqual(
+            outputs["call_1"].split()[-1], outputs["call_2"].split()[-1]
+        )
+        self.assertEqual(self.interpreter.computer.terminal._sessions, {})
+
+    def test_run_tool_calling_llm_yields_every_call(self):
+        chunks = [
+            tool_call_chunk(0, "call_a", "execute", '{"language": "echo", '),
+            tool_call_chunk(0, None, None, '"code": "one"}'),
+            tool_call_chunk(1, "call_b", "execute", '{"language": "echo", "code": "tw'),
+            tool_call_chunk(1, None, None, 'o"}'),
+        ]
+        llm = SimpleNamespace(
+            interpreter=self.interpreter, completions=lambda **params: iter(chunks)
+        )
+
+        code = {}
+        for chunk in run_tool_calling_llm(llm, {"messages": []}):
+            self.assertEqual(chunk["type"], "code")
+            code[chunk["tool_call_id"]] = (
+                code.get(chunk["tool_call_id"], "") + chunk["content"]
+            )
+
+        self.assertEqual(code, {"call_a": "one", "call_b": "two"})
+
+    def test_tool_call_ids_reach_the_llm(self):
+        messages = [
+            {
+                "role": "assistant",
+                "type": "code",
+                "format": "echo",
+                "content": "one",
+                "tool_call_id": "call_a",
+            },
+            {
+                "role": "computer",
+                "type": "console",
+                "format": "output",
+                "content": "1",
+                "tool_call_id": "call_a",
+            },
+            {
+                "role": "assistant",
+                "type": "code",
+                "format": "echo",
+                "content": "two",
+                "tool_call_id": "call_b",
+            },
+        ]
+        messages = process_messages(
+            convert_to_openai_messages(messages, interpreter=self.interpreter)
+        )
+
+        self.assertEqual(
+            [(m["role"], m.get("tool_call_id")) for m in messages],
+            [
+                ("assistant", None),
+                ("tool", "call_a"),
+                ("assistant", None),
+                ("tool", "call_b"),
+            ],
+        )
+        self.assertEqual(messages[0]["tool_calls"][0]["id"], "call_a")
+        self.assertEqual(messages[2]["tool_calls"][0]["id"], "call_b")
+        self.assertEqual(messages[3]["content"], "")
+
+
+if __name__ == "__main__":
+    unittest.main()